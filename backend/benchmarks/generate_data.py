@@ -0,0 +1,188 @@
+"""
+Deterministic synthetic transaction generator.
+
+Produces realistic-looking data for benchmarks: Zipf-skewed product
+popularity, weekly and yearly seasonality with mild growth, pending/failed/
+refunded orders and a mix of timestamp formats (as real exports have).
+Rows are generated in chunks, so 10M rows never sit in memory at once.
+
+    python benchmarks/generate_data.py --rows 100000 --csv /tmp/tx_100k.csv
+    python benchmarks/generate_data.py --rows 1000000 --mongo mongodb://localhost:27017 --db revenue_bench
+"""
+import argparse
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 200_000
+
+STATUSES = np.array(['completed', 'pending', 'failed', 'refunded', 'cancelled'])
+STATUS_P = [0.84, 0.05, 0.04, 0.05, 0.02]
+CHANNELS = np.array(['web', 'mobile', 'api', 'partner', 'email'])
+CHANNEL_P = [0.45, 0.35, 0.1, 0.07, 0.03]
+REGIONS = np.array(['NA', 'EU', 'APAC', 'LATAM', 'MEA'])
+REGION_P = [0.4, 0.3, 0.18, 0.08, 0.04]
+CAMPAIGNS = np.array(['', 'spring_sale', 'black_friday', 'newsletter', 'affiliate', 'retargeting'])
+CAMPAIGN_P = [0.55, 0.1, 0.08, 0.12, 0.08, 0.07]
+
+# Timestamp formats seen in real exports; dateutil parses all of them
+DATE_FORMATS = ['%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M', '%Y-%m-%dT%H:%M:%S+00:00']
+DATE_FORMAT_P = [0.55, 0.25, 0.1, 0.1]
+
+
+class TransactionGenerator:
+    """Same seed and parameters always yield the same rows."""
+
+    def __init__(self, rows: int, seed: int = 42, days: int = 365, end: Optional[date] = None,
+                 products: int = 2_000, users: Optional[int] = None):
+        self.rows = rows
+        self.seed = seed
+        self.days = days
+        self.end = end or datetime.now(timezone.utc).date()
+        self.products = products
+        self.users = users or max(100, rows // 8)
+
+        rng = np.random.default_rng(seed)
+        # Zipf-like product popularity and per-product price level
+        ranks = np.arange(1, products + 1)
+        self.product_p = 1.0 / ranks ** 1.1
+        self.product_p /= self.product_p.sum()
+        self.product_price = np.round(rng.lognormal(mean=3.6, sigma=0.8, size=products), 2)
+
+        # Daily volume: weekday pattern x yearly season x growth
+        day_dates = pd.date_range(end=pd.Timestamp(self.end), periods=days, freq='D')
+        weekday = np.array([1.05, 1.0, 1.0, 1.05, 1.15, 0.8, 0.7])[day_dates.dayofweek]
+        season = 1 + 0.25 * np.sin(2 * np.pi * (day_dates.dayofyear.to_numpy() - 80) / 365.25)
+        season += 0.6 * ((day_dates.month == 11) & (day_dates.day >= 24)).astype(float)  # holiday peak
+        growth = np.linspace(0.8, 1.2, days)
+        weights = weekday * season * growth
+        self.day_p = weights / weights.sum()
+        self.day_start = day_dates.values.astype('datetime64[s]')
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        """Yield DataFrames with the import CSV columns, CHUNK_ROWS at a time."""
+        for chunk_index, offset in enumerate(range(0, self.rows, CHUNK_ROWS)):
+            n = min(CHUNK_ROWS, self.rows - offset)
+            rng = np.random.default_rng([self.seed, chunk_index])
+            yield self._chunk(rng, offset, n)
+
+    def _chunk(self, rng: np.random.Generator, offset: int, n: int) -> pd.DataFrame:
+        day_index = rng.choice(self.days, size=n, p=self.day_p)
+        seconds = rng.integers(0, 86_400, size=n)
+        created = self.day_start[day_index] + seconds.astype('timedelta64[s]')
+        # Most orders are paid within minutes
+        paid = created + rng.exponential(180, size=n).astype('timedelta64[s]')
+
+        product = rng.choice(self.products, size=n, p=self.product_p)
+        amount = np.round(self.product_price[product] * rng.lognormal(0, 0.25, size=n), 2)
+        status = rng.choice(STATUSES, size=n, p=STATUS_P)
+        refunded = status == 'refunded'
+        unpaid = np.isin(status, ['pending', 'failed', 'cancelled'])
+
+        frame = pd.DataFrame({
+            'order_id': np.char.add('ORD-', (np.arange(offset, offset + n)).astype(str)),
+            'user_id': np.char.add('U', rng.integers(0, self.users, size=n).astype(str)),
+            'product_id': np.char.add('SKU-', product.astype(str)),
+            'amount': amount,
+            'currency': 'USD',
+            'status': status,
+            'channel': rng.choice(CHANNELS, size=n, p=CHANNEL_P),
+            'created_at': self._format_dates(rng, created),
+            'paid_at': self._format_dates(rng, paid),
+            'refunded': np.where(refunded, 'true', 'false'),
+            'refund_amount': np.where(refunded, amount, 0.0),
+            'region': rng.choice(REGIONS, size=n, p=REGION_P),
+            'attribution_campaign': rng.choice(CAMPAIGNS, size=n, p=CAMPAIGN_P),
+        })
+        frame.loc[unpaid, 'paid_at'] = ''
+        return frame
+
+    def _format_dates(self, rng: np.random.Generator, values: np.ndarray) -> np.ndarray:
+        series = pd.Series(pd.to_datetime(values))
+        fmt = rng.choice(len(DATE_FORMATS), size=len(values), p=DATE_FORMAT_P)
+        out = np.empty(len(values), dtype=object)
+        for i, pattern in enumerate(DATE_FORMATS):
+            mask = fmt == i
+            if mask.any():
+                out[mask] = series[mask].dt.strftime(pattern).values
+        return out
+
+    def documents(self, chunk: pd.DataFrame) -> List[Dict]:
+        """Shape a chunk like ImportService output (ISO strings plus revenue_date)."""
+        created = pd.to_datetime(chunk['created_at'], format='mixed', utc=True)
+        paid = pd.to_datetime(chunk['paid_at'].replace('', None), format='mixed', utc=True)
+        revenue_date = paid.fillna(created).dt.tz_localize(None)
+        docs = chunk.assign(
+            id=chunk['order_id'],
+            created_at=created.dt.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+            paid_at=paid.dt.strftime('%Y-%m-%dT%H:%M:%S+00:00').astype(object).where(paid.notna(), None),
+            refunded=chunk['refunded'] == 'true',
+            revenue_date=revenue_date,
+        ).to_dict('records')
+        for doc in docs:
+            doc['revenue_date'] = doc['revenue_date'].to_pydatetime()
+        return docs
+
+
+def write_csv(generator: TransactionGenerator, path: Path) -> None:
+    for i, chunk in enumerate(generator.chunks()):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+
+def write_xlsx(generator: TransactionGenerator, path: Path) -> None:
+    if generator.rows > 1_048_575:
+        raise ValueError('XLSX sheets hold at most 1,048,576 rows')
+    pd.concat(generator.chunks(), ignore_index=True).to_excel(path, index=False)
+
+
+def load_mongo(generator: TransactionGenerator, mongo_url: str, db_name: str,
+               collection: str = 'transactions', drop: bool = True) -> int:
+    """Bulk-load documents directly (bypassing the import soft limit)."""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo_url)
+    try:
+        coll = client[db_name][collection]
+        if drop:
+            coll.drop()
+        inserted = 0
+        for chunk in generator.chunks():
+            docs = generator.documents(chunk)
+            for i in range(0, len(docs), 20_000):
+                inserted += len(coll.insert_many(docs[i:i + 20_000], ordered=False).inserted_ids)
+        return inserted
+    finally:
+        client.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--end', type=date.fromisoformat, help='last day of data (default: today UTC)')
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--csv', type=Path)
+    parser.add_argument('--xlsx', type=Path)
+    parser.add_argument('--mongo', help='MongoDB URL to load into')
+    parser.add_argument('--db', default='revenue_bench')
+    args = parser.parse_args()
+
+    generator = TransactionGenerator(args.rows, args.seed, args.days, args.end, args.products)
+    if args.csv:
+        write_csv(generator, args.csv)
+    if args.xlsx:
+        write_xlsx(generator, args.xlsx)
+    if args.mongo:
+        print(f"inserted {load_mongo(generator, args.mongo, args.db)} documents into {args.db}.transactions")
+    if not (args.csv or args.xlsx or args.mongo):
+        parser.error('choose at least one of --csv, --xlsx, --mongo')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+HTTP load harness for the FastAPI app with latency-percentile regression gates.
+
+Virtual clients replay dashboard page loads (each page fires its API calls
+concurrently, like React Query does on mount) against the ASGI app in-process
+(default) or a running server (--url). Reports p50/p95/p99 and throughput per
+route. In-process, the app shares the harness's event loop, so it also
+reports event-loop lag, which exposes handlers that block the loop; against
+--url that lag would only be the load generator's own, so it is left out.
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=revenue_load \\
+        python benchmarks/load_test.py --seed-rows 100000 --clients 50 --duration 30 \\
+        --mix overview=3,timeline=2 --save benchmarks/results/load.json
+    ... --baseline benchmarks/results/load.json --tolerance 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Requests each dashboard page issues on mount
+PAGES: Dict[str, List[str]] = {
+    'overview': ['/api/v1/insights/revenue/summary', '/api/v1/transactions?limit=100&offset=0'],
+    'timeline': ['/api/v1/insights/dashboard?sections=daily,anomalies'],
+    'products': ['/api/v1/insights/revenue/by-product?days=30'],
+    'anomalies': ['/api/v1/insights/anomalies?lookback_days=90'],
+}
+LOOP_LAG_INTERVAL_S = 0.01
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(','):
+        page, _, weight = part.partition('=')
+        if page not in PAGES:
+            raise argparse.ArgumentTypeError(f"unknown page '{page}' (choose from {', '.join(PAGES)})")
+        mix[page] = float(weight or 1)
+    return mix
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    """Sleep in small steps and record how late the loop wakes us (blocking handlers show up here)."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL_S)
+        samples.append(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL_S))
+
+
+async def _virtual_client(http: httpx.AsyncClient, mix: Dict[str, float], deadline: float,
+                          latencies: Dict[str, List[float]], errors: Dict[str, int], rng: random.Random,
+                          think_time: float) -> None:
+    pages, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        page = rng.choices(pages, weights)[0]
+
+        async def call(path: str) -> None:
+            route = path.split('?')[0]
+            started = time.perf_counter()
+            try:
+                response = await http.get(path)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies[route].append(time.perf_counter() - started)
+            if not ok:
+                errors[route] += 1
+
+        await asyncio.gather(*(call(path) for path in PAGES[page]))
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, think_time))
+
+
+async def run(args) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lag: List[float] = []
+
+    async def drive(http: httpx.AsyncClient, monitor_lag: bool) -> float:
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(_monitor_loop_lag(lag, stop)) if monitor_lag else None
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            _virtual_client(http, args.mix, deadline, latencies, errors, random.Random(args.seed + i),
+                            args.think_time)
+            for i in range(args.clients)
+        ))
+        stop.set()
+        if monitor:
+            await monitor
+        return time.perf_counter() - started
+
+    limits = httpx.Limits(max_connections=args.clients * 2)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as http:
+            elapsed = await drive(http, monitor_lag=False)
+    else:
+        os.environ.setdefault('PREWARM_DELAY_SECONDS', '0')
+        import server
+        if args.seed_rows:
+            from generate_data import TransactionGenerator
+            from service_benchmark import load_dataset
+            await load_dataset(server.db, TransactionGenerator(args.seed_rows, seed=args.seed, end=args.end))
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=60) as http:
+                elapsed = await drive(http, monitor_lag=True)
+
+    routes = {}
+    for route, samples in sorted(latencies.items()):
+        ordered = sorted(samples)
+        routes[route] = {
+            'requests': len(ordered),
+            'errors': errors[route],
+            'rps': round(len(ordered) / elapsed, 2),
+            'p50_ms': round(_percentile(ordered, 0.50) * 1000, 2),
+            'p95_ms': round(_percentile(ordered, 0.95) * 1000, 2),
+            'p99_ms': round(_percentile(ordered, 0.99) * 1000, 2),
+            'max_ms': round(ordered[-1] * 1000, 2),
+        }
+    lag_sorted = sorted(lag)
+    result = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'target': args.url or 'in-process',
+            'clients': args.clients,
+            'duration_s': round(elapsed, 2),
+            'mix': args.mix,
+            'seed_rows': args.seed_rows,
+        },
+        'total_rps': round(sum(len(s) for s in latencies.values()) / elapsed, 2),
+        'routes': routes,
+    }
+    if not args.url:
+        # The server's loop only when it runs in this process
+        result['loop_lag_ms'] = {
+            'p50': round(_percentile(lag_sorted, 0.50) * 1000, 2),
+            'p99': round(_percentile(lag_sorted, 0.99) * 1000, 2),
+            'max': round((lag_sorted[-1] if lag_sorted else 0.0) * 1000, 2),
+        }
+    return result
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Flag routes whose p95/p99 grew, or throughput dropped, by more than tolerance."""
+    regressions = []
+    for route, stats in current['routes'].items():
+        before = baseline['routes'].get(route)
+        if not before:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            if before[key] and stats[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{route} {key} {before[key]} -> {stats[key]}")
+        if before['rps'] and stats['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append(f"{route} rps {before['rps']} -> {stats['rps']}")
+        if stats['errors'] > before['errors']:
+            regressions.append(f"{route} errors {before['errors']} -> {stats['errors']}")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"{'route':<42} {'req':>7} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, s in result['routes'].items():
+        print(f"{route:<42} {s['requests']:>7} {s['errors']:>5} {s['rps']:>8.1f} "
+              f"{s['p50_ms']:>8.1f}ms {s['p95_ms']:>8.1f}ms {s['p99_ms']:>8.1f}ms")
+    lag = result.get('loop_lag_ms')
+    if lag:
+        print(f"total {result['total_rps']} req/s; event-loop lag p50 {lag['p50']}ms p99 {lag['p99']}ms max {lag['max']}ms")
+    else:
+        print(f"total {result['total_rps']} req/s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='target a running server instead of the in-process app')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('overview=3,timeline=2'),
+                        help=f"weighted pages, e.g. overview=3,timeline=2 (pages: {', '.join(PAGES)})")
+    parser.add_argument('--think-time', type=float, default=0.0, help='max random pause between page loads (s)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--seed-rows', type=int, default=0,
+                        help='in-process only: load this many synthetic rows into DB_NAME first')
+    parser.add_argument('--end', type=date.fromisoformat, default=datetime.now(timezone.utc).date())
+    parser.add_argument('--save', type=Path)
+    parser.add_argument('--baseline', type=Path)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    if args.url and args.seed_rows:
+        parser.error("--seed-rows loads the in-process app's database; it cannot be combined with --url")
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        regressions = compare(result, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
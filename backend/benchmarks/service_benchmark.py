@@ -0,0 +1,210 @@
+"""
+Service-level benchmark suite against a local mongod.
+
+For each data size it loads a deterministic synthetic dataset (see
+generate_data.py) into its own database, creates the declared indexes and
+times ImportService.import_from_file, every public AnalyticsService method and
+ExportService.export_to_csv. Results can be saved as a baseline and later runs
+compared against it; a slowdown beyond --tolerance exits non-zero.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/service_benchmark.py \\
+        --sizes 1000 10000 100000 --save benchmarks/results/services.json
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/service_benchmark.py \\
+        --sizes 1000 10000 100000 --baseline benchmarks/results/services.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from generate_data import TransactionGenerator  # noqa: E402
+from services.analytics_service import AnalyticsService  # noqa: E402
+from services.export_service import ExportService  # noqa: E402
+from services.forecast_service import ForecastService  # noqa: E402
+from services.import_service import ImportService, MAX_ROWS_SOFT_LIMIT  # noqa: E402
+from services.index_service import IndexService  # noqa: E402
+from services.storage_service import StorageService, add_meta, transactions_collection  # noqa: E402
+from services.version_service import VersionService  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+# Imports above this size are timed on a sample (the endpoint rejects larger files)
+IMPORT_SAMPLE_ROWS = min(MAX_ROWS_SOFT_LIMIT, 100_000)
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'runs': len(ordered),
+    }
+
+
+async def _time(fn: Callable[[], Awaitable[Any]], repeat: int, before: Callable[[], Any] = None) -> Dict[str, float]:
+    await fn()  # warm-up: connection pool, plan cache, lazy imports
+    samples = []
+    for _ in range(repeat):
+        if before:
+            result = before()
+            if asyncio.iscoroutine(result):
+                await result
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    return _stats(samples)
+
+
+async def reset_transactions(db) -> None:
+    """Drop the transactions collection, recreating it as time-series if that layout is active."""
+    await transactions_collection(db).drop()
+    await StorageService(db).ensure_collection()
+
+
+async def load_dataset(db, generator: TransactionGenerator) -> None:
+    await reset_transactions(db)
+    collection = transactions_collection(db)
+    for chunk in generator.chunks():
+        docs = [add_meta(doc) for doc in generator.documents(chunk)]
+        for i in range(0, len(docs), 20_000):
+            await collection.insert_many(docs[i:i + 20_000], ordered=False)
+    await IndexService(db).ensure_indexes()
+    # Loaded behind the API's back: publish a new dataset version for ETags/caches
+    await VersionService(db).bump()
+
+
+async def bench_size(client, size: int, repeat: int, seed: int, end: date) -> Dict[str, Any]:
+    db = client[f'revenue_bench_{size}']
+    generator = TransactionGenerator(size, seed=seed, end=end)
+
+    load_started = time.perf_counter()
+    await load_dataset(db, generator)
+    results: Dict[str, Any] = {'load_s': round(time.perf_counter() - load_started, 2)}
+
+    analytics = AnalyticsService(db)
+    export = ExportService(db)
+    # No VersionService: every run fits from scratch
+    forecast = ForecastService(analytics)
+    sample_order = (await analytics.collection.find_one({}, {'order_id': 1}))['order_id']
+
+    timings = {
+        'analytics.get_transactions': await _time(lambda: analytics.get_transactions(100, 0), repeat),
+        'analytics.get_transaction': await _time(lambda: analytics.get_transaction(sample_order), repeat),
+        'analytics.get_daily_revenue': await _time(lambda: analytics.get_daily_revenue(), repeat),
+        'analytics.get_top_products': await _time(lambda: analytics.get_top_products(30), repeat),
+        'analytics.detect_anomalies': await _time(lambda: analytics.detect_anomalies(90), repeat),
+        'analytics.detect_series_anomalies': await _time(lambda: analytics.detect_series_anomalies(), repeat),
+        # Cache dropped before each run so the full computation is measured
+        'analytics.get_revenue_summary': await _time(
+            lambda: analytics.get_revenue_summary(), repeat, before=analytics.invalidate_cache
+        ),
+        'analytics.get_dashboard': await _time(lambda: analytics.get_dashboard(), repeat),
+        'forecast.get_forecast': await _time(lambda: forecast.get_forecast(), repeat),
+        'export.export_to_csv': await _time(lambda: export.export_to_csv(5000), repeat),
+    }
+
+    # Import into a scratch database so the analytics dataset stays fixed
+    import_rows = min(size, IMPORT_SAMPLE_ROWS)
+    import_csv = next(TransactionGenerator(import_rows, seed=seed, end=end).chunks()).to_csv(index=False).encode()
+    scratch = client[f'revenue_bench_{size}_import']
+    importer = ImportService(scratch)
+    timings['import.import_from_file'] = await _time(
+        lambda: importer.import_from_file(import_csv, 'csv'), max(1, repeat // 2),
+        before=lambda: reset_transactions(scratch)
+    )
+    timings['import.import_from_file']['rows'] = import_rows
+    timings['import.import_from_file']['rows_per_s'] = round(
+        import_rows / (timings['import.import_from_file']['median_ms'] / 1000), 1
+    )
+    await client.drop_database(scratch.name)
+
+    results['timings'] = timings
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return human-readable regressions (median slower than baseline by > tolerance)."""
+    regressions = []
+    for size, result in current['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if not base:
+            continue
+        for name, stats in result['timings'].items():
+            before = base['timings'].get(name)
+            if not before or not before['median_ms']:
+                continue
+            ratio = stats['median_ms'] / before['median_ms']
+            marker = 'REGRESSION' if ratio > 1 + tolerance else ''
+            print(f"{size:>10} {name:<36} {before['median_ms']:>10.1f} -> {stats['median_ms']:>10.1f} ms "
+                  f"({ratio - 1:+.1%}) {marker}")
+            if marker:
+                regressions.append(f"{name}@{size}: {ratio - 1:+.1%}")
+    return regressions
+
+
+async def run(args) -> Dict[str, Any]:
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        sizes = {}
+        for size in args.sizes:
+            print(f"benchmarking {size} rows...", file=sys.stderr)
+            sizes[str(size)] = await bench_size(client, size, args.repeat, args.seed, args.end)
+            if not args.keep:
+                await client.drop_database(f'revenue_bench_{size}')
+        return {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'seed': args.seed,
+                'end': args.end.isoformat(),
+                'repeat': args.repeat,
+                'python': sys.version.split()[0],
+            },
+            'sizes': sizes,
+        }
+    finally:
+        client.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end', type=date.fromisoformat, default=datetime.now(timezone.utc).date(),
+                        help='last day of generated data (pin it when comparing runs)')
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark databases')
+    parser.add_argument('--save', type=Path, help='write results JSON (use as a baseline)')
+    parser.add_argument('--baseline', type=Path, help='compare against a saved results JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed median slowdown')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        regressions = compare(result, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        return 0
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Cold-start benchmark: import time of `server` broken down by top-level module.
+
+Runs `python -X importtime -c "import server"` in fresh interpreters, keeps the
+median per module, and optionally compares against a stored baseline.
+
+    python benchmarks/startup_benchmark.py --runs 5 --save benchmarks/results/startup.json
+    python benchmarks/startup_benchmark.py --baseline benchmarks/results/startup.json --max-regression 0.25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from warmup import HEAVY_MODULES  # noqa: E402
+
+
+_PROBE = (
+    "import json, sys, server; "
+    f"print(json.dumps([m for m in {list(HEAVY_MODULES)!r} if m in sys.modules]))"
+)
+
+
+def _run_once() -> Tuple[Dict[str, float], List[str]]:
+    """
+    Import server in a fresh interpreter. Returns self-time per top-level
+    module in ms (plus total wall time) and which heavy modules got loaded.
+    """
+    env = dict(os.environ)
+    env.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    env.setdefault('DB_NAME', 'startup_benchmark')
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    per_module = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _cumulative, name = (part.strip() for part in line.split(':', 1)[1].split('|'))
+        per_module[name.split('.')[0]] += int(self_us) / 1000
+    per_module['__total_wall__'] = wall_ms
+    return per_module, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(runs: int) -> Dict[str, object]:
+    samples, loaded = zip(*(_run_once() for _ in range(runs)))
+    modules = set().union(*samples)
+    medians = {m: round(statistics.median(s.get(m, 0.0) for s in samples), 2) for m in modules}
+    by_module = dict(sorted(
+        ((m, v) for m, v in medians.items() if m != '__total_wall__'),
+        key=lambda item: item[1], reverse=True
+    ))
+    return {
+        'runs': runs,
+        'python': sys.version.split()[0],
+        'total_wall_ms': medians['__total_wall__'],
+        'heavy_modules_loaded': sorted(set().union(*loaded)),
+        'modules_ms': by_module,
+    }
+
+
+def compare(result: Dict[str, object], baseline: Dict[str, object], max_regression: float) -> bool:
+    """Print the delta against baseline; return False if total time regressed too much."""
+    base_total = baseline['total_wall_ms']
+    total = result['total_wall_ms']
+    change = (total - base_total) / base_total if base_total else 0.0
+    print(f"total: {total:.1f} ms (baseline {base_total:.1f} ms, {change:+.1%})")
+    if result['heavy_modules_loaded']:
+        print(f"heavy modules imported at startup: {result['heavy_modules_loaded']}")
+    for module, ms in list(result['modules_ms'].items())[:15]:
+        before = baseline['modules_ms'].get(module, 0.0)
+        print(f"  {module:<30} {ms:8.1f} ms  ({ms - before:+.1f})")
+    return change <= max_regression
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', type=Path, help='write results JSON here')
+    parser.add_argument('--baseline', type=Path, help='compare against this results JSON')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed relative increase of total import time')
+    args = parser.parse_args()
+
+    result = run(args.runs)
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, indent=2))
+    if args.baseline:
+        return 0 if compare(result, json.loads(args.baseline.read_text()), args.max_regression) else 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
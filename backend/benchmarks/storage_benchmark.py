@@ -0,0 +1,135 @@
+"""
+Storage-layout comparison: regular collection vs time-series collection.
+
+Loads the same deterministic dataset (see generate_data.py) once per layout
+(TRANSACTIONS_STORAGE=collection|timeseries, see services/storage_service.py)
+into its own database, then reports the on-disk footprint ($collStats) and
+times the windowed aggregations analytics runs (daily revenue over several
+windows, top products, the dashboard pass) plus the point and sort queries
+that a bucketed layout can make slower (order lookup, newest-first export).
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/storage_benchmark.py \\
+        --rows 1000000 --end 2026-06-30 --save benchmarks/results/storage.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from generate_data import TransactionGenerator  # noqa: E402
+from service_benchmark import _time, load_dataset  # noqa: E402
+from services import storage_service  # noqa: E402
+from services.analytics_service import AnalyticsService  # noqa: E402
+from services.export_service import ExportService  # noqa: E402
+
+DEFAULT_WINDOWS = [1, 7, 30, 90, 365]
+
+
+async def bench_layout(client, layout: str, args) -> Dict[str, Any]:
+    # Services resolve the collection when constructed, so switch the layout first
+    storage_service.TRANSACTIONS_STORAGE = layout
+    db = client[f'revenue_storage_{layout}']
+    generator = TransactionGenerator(args.rows, seed=args.seed, end=args.end)
+
+    load_started = time.perf_counter()
+    await load_dataset(db, generator)
+    results: Dict[str, Any] = {
+        'load_s': round(time.perf_counter() - load_started, 2),
+        'storage': await storage_service.StorageService(db).stats(),
+    }
+
+    analytics = AnalyticsService(db)
+    export = ExportService(db)
+    sample_order = (await analytics.collection.find_one({}, {'order_id': 1}))['order_id']
+    last_day = datetime.combine(args.end, datetime.min.time())
+
+    timings = {}
+    for days in args.windows:
+        start = (last_day - timedelta(days=days - 1)).isoformat()
+        end = (last_day + timedelta(days=1)).isoformat()
+        timings[f'daily_revenue.{days}d'] = await _time(
+            lambda start=start, end=end: analytics.get_daily_revenue(start, end), args.repeat
+        )
+    timings['top_products.30d'] = await _time(lambda: analytics.get_top_products(30), args.repeat)
+    timings['dashboard'] = await _time(
+        lambda: analytics.get_dashboard(), args.repeat, before=analytics.invalidate_cache
+    )
+    timings['get_transaction'] = await _time(lambda: analytics.get_transaction(sample_order), args.repeat)
+    timings['export_to_csv'] = await _time(lambda: export.export_to_csv(5000), args.repeat)
+    results['timings'] = timings
+    return results
+
+
+def print_report(layouts: Dict[str, Dict[str, Any]]) -> None:
+    base, other = layouts['collection'], layouts['timeseries']
+    print(f"{'metric':<28} {'collection':>14} {'timeseries':>14} {'ratio':>8}")
+
+    def row(name: str, a: float, b: float, unit: str) -> None:
+        ratio = f"{b / a:.2f}x" if a else '-'
+        print(f"{name:<28} {a:>12.1f}{unit} {b:>12.1f}{unit} {ratio:>8}")
+
+    row('load', base['load_s'], other['load_s'], ' s')
+    for key in ('storage_bytes', 'index_bytes'):
+        row(key.replace('_bytes', ''), base['storage'][key] / 2 ** 20, other['storage'][key] / 2 ** 20, 'MB')
+    for name, stats in base['timings'].items():
+        row(name, stats['median_ms'], other['timings'][name]['median_ms'], 'ms')
+
+
+async def run(args) -> Dict[str, Any]:
+    client = AsyncIOMotorClient(args.mongo_url)
+    try:
+        layouts = {}
+        for layout in storage_service.STORAGE_LAYOUTS:
+            print(f"benchmarking {layout} layout with {args.rows} rows...", file=sys.stderr)
+            layouts[layout] = await bench_layout(client, layout, args)
+            if not args.keep:
+                await client.drop_database(f'revenue_storage_{layout}')
+        return {
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'rows': args.rows,
+                'seed': args.seed,
+                'end': args.end.isoformat(),
+                'repeat': args.repeat,
+                'granularity': storage_service.TIMESERIES_GRANULARITY,
+            },
+            'layouts': layouts,
+        }
+    finally:
+        client.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--windows', type=int, nargs='+', default=DEFAULT_WINDOWS, help='window lengths in days')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end', type=date.fromisoformat, default=datetime.now(timezone.utc).date(),
+                        help='last day of generated data (pin it when comparing runs)')
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark databases')
+    parser.add_argument('--save', type=Path, help='write results JSON')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result['layouts'])
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+HTTP caching helpers: conditional GET and response compression.
+
+ETags are weak (they identify the JSON, not the gzip bytes) and derive from
+the dataset version plus the method, path and sorted query string, so they
+can be checked before a handler runs. Endpoints whose window is relative to
+"now" (no explicit `end`) also mix in a clock bucket of
+ETAG_TIME_BUCKET_SECONDS, so a rolling window is recomputed at most that
+often even when no data changed.
+"""
+import hashlib
+import os
+import time
+from typing import Iterable, Optional
+
+from starlette.middleware.gzip import GZipMiddleware
+
+ETAG_TIME_BUCKET_SECONDS = int(os.environ.get('ETAG_TIME_BUCKET_SECONDS', '60'))
+GZIP_MINIMUM_SIZE = int(os.environ.get('GZIP_MINIMUM_SIZE', '1024'))
+
+# Revalidate on every use: browsers send If-None-Match and reuse the body on 304
+CACHE_CONTROL = 'private, no-cache'
+
+
+def make_etag(version: int, method: str, path: str, query_items: Iterable, time_relative: bool = True) -> str:
+    query = '&'.join(f'{k}={v}' for k, v in sorted(query_items))
+    parts = [str(version), method, path, query]
+    if time_relative:
+        parts.append(str(int(time.time()) // ETAG_TIME_BUCKET_SECONDS))
+    digest = hashlib.blake2b('|'.join(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match header (list or `*`)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZip for bodies over GZIP_MINIMUM_SIZE, skipping streaming paths (SSE must not be buffered)."""
+
+    def __init__(self, app, exclude_paths: Iterable[str] = (), minimum_size: int = GZIP_MINIMUM_SIZE,
+                 compresslevel: int = 6):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,204 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms are thread-safe (pymongo invokes command
+listeners from its own threads) and cost a dict lookup plus a bisect per
+observation. server.py exposes them on GET /metrics.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+import bson
+from pymongo import monitoring
+
+# Seconds; tuned for API latencies from ~1ms to tens of seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTES_BUCKETS = (256, 1_024, 16_384, 131_072, 1_048_576, 8_388_608, 16_777_216)
+
+_REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = 'le="%s"' % ('+Inf' if bound == float('inf') else repr(bound))
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {total[0]}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def render() -> str:
+    """Text exposition of every registered metric."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ------------------ Application metrics ------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template.',
+    ('method', 'route', 'status'))
+
+MONGO_COMMAND_SECONDS = Histogram(
+    'mongo_command_duration_seconds', 'MongoDB command round-trip time.', ('command', 'collection'))
+MONGO_COMMAND_DOCUMENTS = Histogram(
+    'mongo_command_documents_returned', 'Documents returned per MongoDB command.',
+    ('command', 'collection'), buckets=SIZE_BUCKETS)
+MONGO_COMMAND_BYTES = Histogram(
+    'mongo_command_reply_bytes', 'BSON size of MongoDB command replies.',
+    ('command', 'collection'), buckets=BYTES_BUCKETS)
+MONGO_COMMAND_FAILURES = Counter(
+    'mongo_command_failures_total', 'Failed MongoDB commands.', ('command', 'collection'))
+
+IMPORT_ROWS = Counter('import_rows_total', 'Rows processed by file imports.', ('outcome',))
+IMPORT_SECONDS = Histogram('import_duration_seconds', 'Wall time of file imports.', ('stage',))
+IMPORT_ROWS_PER_SECOND = Gauge('import_rows_per_second', 'Throughput of the most recent import.')
+
+INGEST_ROWS = Counter('ingest_rows_total', 'Rows through the ingest endpoints.', ('outcome',))
+INGEST_PENDING = Gauge('ingest_pending_rows', 'Rows buffered and not yet written.')
+INGEST_BATCH_ROWS = Histogram('ingest_batch_rows', 'Rows per coalesced ingest insert.', buckets=SIZE_BUCKETS)
+INGEST_FLUSH_SECONDS = Histogram('ingest_flush_duration_seconds', 'insert_many time per ingest batch.')
+ARCHIVE_ROWS = Counter('archive_rows_total', 'Transactions moved to cold storage by compaction.')
+
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+CACHE_FILL_SECONDS = Histogram('cache_fill_duration_seconds', 'Time to compute a cache miss.', ('cache',))
+SHARED_STATE_BYTES = Gauge('shared_state_bytes', 'Size of each shared-state entry this worker maps.', ('name',))
+
+LIVE_CONNECTIONS = Gauge('live_connections', 'Open live-update (SSE) connections.')
+LIVE_EVENTS = Counter('live_events_total', 'Dataset-change events broadcast to live connections.')
+
+LLM_SECONDS = Histogram('llm_request_duration_seconds', 'LLM narrative latency.', ('mode', 'outcome'))
+LLM_FIRST_TOKEN_SECONDS = Histogram('llm_first_token_seconds', 'Time to first streamed narrative chunk.')
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo listener recording duration, documents returned and reply size per command."""
+
+    def __init__(self, record_bytes: bool = True):
+        self.record_bytes = record_bytes
+        self._collections: Dict[Tuple[int, str], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else event.command.get('collection', '')
+        with self._lock:
+            self._collections[(event.request_id, event.command_name)] = collection
+
+    def _pop_collection(self, event) -> str:
+        with self._lock:
+            return self._collections.pop((event.request_id, event.command_name), '')
+
+    def succeeded(self, event):
+        labels = {'command': event.command_name, 'collection': self._pop_collection(event)}
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, **labels)
+        reply = event.reply or {}
+        cursor = reply.get('cursor')
+        if cursor is not None:
+            batch = cursor.get('firstBatch', cursor.get('nextBatch', ()))
+            MONGO_COMMAND_DOCUMENTS.observe(len(batch), **labels)
+        elif 'n' in reply:
+            MONGO_COMMAND_DOCUMENTS.observe(reply['n'], **labels)
+        if self.record_bytes:
+            MONGO_COMMAND_BYTES.observe(len(bson.encode(reply)), **labels)
+
+    def failed(self, event):
+        labels = {'command': event.command_name, 'collection': self._pop_collection(event)}
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, **labels)
+        MONGO_COMMAND_FAILURES.inc(**labels)
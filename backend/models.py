@@ -23,13 +23,92 @@ class Transaction(TransactionCreate):
     created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
 
 class TransactionResponse(Transaction):
-    pass
+    # amount converted to the reporting currency at write time (None: no FX rate)
+    amount_base: Optional[float] = None
+
+class TransactionSearchResult(BaseModel):
+    items: list[TransactionResponse]
+    # Opaque keyset cursor for the next page (None on the last page)
+    next_cursor: Optional[str] = None
 
 class DailyRevenue(BaseModel):
+    # Bucket start: YYYY-MM-DD, or an ISO timestamp with offset for hourly series
     day: str
     revenue: float
     orders: int
 
+class BreakdownRow(BaseModel):
+    # Dimension -> value for this row ("Unknown" when unattributed); empty for the total
+    key: dict[str, str]
+    revenue: float
+    orders: int
+    refund_rate: float
+    average_order_value: float
+
+class RevenueBreakdown(BaseModel):
+    start: str
+    end: str
+    total: BreakdownRow
+    # "channel" for a split, "channel:region" for a cross-tab
+    groups: dict[str, list[BreakdownRow]]
+
+class CustomerRow(BaseModel):
+    # Day, product_id or channel when split; approximate (see CustomerStats)
+    key: Optional[str] = None
+    orders: int
+    unique_users: int
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+
+class CustomerStats(BaseModel):
+    start: str
+    end: str
+    # Relative standard error of unique_users; relative error bound of the percentiles
+    unique_users_error: float
+    value_accuracy: float
+    total: CustomerRow
+    rows: list[CustomerRow]
+
+class CohortRow(BaseModel):
+    cohort: str  # acquisition month, YYYY-MM
+    customers: int
+    repeat_rate: float
+    # Per month after acquisition: retention share or cumulative revenue per customer (null: not yet observed)
+    values: list[Optional[float]]
+
+class CohortReport(BaseModel):
+    metric: Literal['retention', 'ltv']
+    months: int
+    cohorts: list[CohortRow]
+    # Cohort-size weighted, over the cohorts that reached each month
+    average: list[Optional[float]]
+
+class ForecastHorizon(BaseModel):
+    days: int
+    revenue: float
+    lower: float
+    upper: float
+    # Actual revenue of the `days` days before the forecast starts
+    previous: float
+
+class SeriesForecast(BaseModel):
+    product_id: Optional[str] = None  # None for the total
+    horizons: list[ForecastHorizon]
+
+class ForecastPoint(BaseModel):
+    day: str
+    revenue: float
+    lower: float
+    upper: float
+
+class RevenueForecast(BaseModel):
+    as_of: str  # last complete day of history
+    interval: float
+    total: SeriesForecast
+    daily: list[ForecastPoint]
+    products: list[SeriesForecast]
+
 class Product(BaseModel):
     product_id: str
     name: str
@@ -41,9 +120,20 @@ class Anomaly(BaseModel):
     day: str
     revenue: float
     z: float
+    # Baseline mean the day was scored against
+    expected: Optional[float] = None
     direction: Literal['spike', 'drop']
     possible_causes: list[str]
 
+class SeriesAnomaly(BaseModel):
+    dimension: Literal['product_id', 'channel', 'region']
+    value: str
+    day: str
+    revenue: float
+    expected: float
+    z: float
+    direction: Literal['spike', 'drop']
+
 class RevenueSummary(BaseModel):
     today: float
     mtd: float
@@ -51,4 +141,12 @@ class RevenueSummary(BaseModel):
     rhi: float
     top_products: list[Product]
     anomalies: list[Anomaly]
-    narrative: str
+    narrative: Optional[str] = None
+
+class Dashboard(BaseModel):
+    # Only the requested sections are present in the response
+    summary: Optional[RevenueSummary] = None
+    daily: Optional[list[DailyRevenue]] = None
+    products: Optional[list[Product]] = None
+    anomalies: Optional[list[Anomaly]] = None
+    transactions: Optional[list[TransactionResponse]] = None
@@ -0,0 +1,158 @@
+"""
+Opt-in, per-request profiling.
+
+Enabled only when PROFILING_ENABLED=1. A request then asks for a profile with
+the `X-Profile` header or `?profile=` query flag (both must equal
+PROFILING_TOKEN when one is configured). The middleware in server.py runs the
+request under cProfile (or pyinstrument's sampler with PROFILING_MODE=sampling,
+if installed) while `span()` blocks in the services record named timings. The
+report is stored under an id returned in `X-Profile-Id` and fetched from
+GET /api/v1/debug/profiles/{id}; span timings are also sent as `Server-Timing`.
+
+When no profile is active `span()` returns a shared no-op context manager, so
+instrumented code pays a single ContextVar lookup.
+"""
+import cProfile
+import io
+import os
+import pstats
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+    SAMPLING_AVAILABLE = True
+except ImportError:
+    SAMPLING_AVAILABLE = False
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile')
+PROFILING_MAX_STORED = int(os.environ.get('PROFILING_MAX_STORED', '50'))
+PROFILING_TOP_FUNCTIONS = 40
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar('request_profile', default=None)
+_NOOP = nullcontext()
+_reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_profiler_busy = False
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.spans: List[Dict[str, Any]] = []
+        self._depth = 0
+        self._origin = time.perf_counter()
+        self._sampling = PROFILING_MODE == 'sampling' and SAMPLING_AVAILABLE
+        self._profiler = SamplingProfiler(async_mode='enabled') if self._sampling else cProfile.Profile()
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        depth = self._depth
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.spans.append({
+                'name': name,
+                'depth': depth,
+                'start_ms': round((started - self._origin) * 1000, 3),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+    def start(self) -> None:
+        global _profiler_busy
+        # Only one function-level profiler can be attached to the thread;
+        # overlapping profiled requests fall back to spans only.
+        if _profiler_busy:
+            self._profiler = None
+            return
+        _profiler_busy = True
+        if self._sampling:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        global _profiler_busy
+        if self._profiler is None:
+            return
+        if self._sampling:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        _profiler_busy = False
+
+    def server_timing(self) -> str:
+        """Top-level spans in Server-Timing header syntax."""
+        return ', '.join(
+            f"{s['name'].replace(' ', '_')};dur={s['duration_ms']}" for s in self.spans if s['depth'] == 0
+        )
+
+    def report(self) -> Dict[str, Any]:
+        if self._profiler is None:
+            profile_text = 'function profile unavailable: another profiled request was running'
+        elif self._sampling:
+            profile_text = self._profiler.output_text(unicode=False, color=False)
+        else:
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(PROFILING_TOP_FUNCTIONS)
+            profile_text = out.getvalue()
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'total_ms': round((time.perf_counter() - self._origin) * 1000, 3),
+            'mode': 'sampling' if self._sampling else 'cprofile',
+            'spans': sorted(self.spans, key=lambda s: s['start_ms']),
+            'profile': profile_text,
+        }
+
+
+def requested(headers, query_params) -> bool:
+    """True if profiling is enabled and this request opted in (with the token, if configured)."""
+    if not PROFILING_ENABLED:
+        return False
+    flag = headers.get('x-profile') or query_params.get('profile')
+    if not flag:
+        return False
+    return flag == PROFILING_TOKEN if PROFILING_TOKEN else flag not in ('0', 'false')
+
+
+@contextmanager
+def profile_request(method: str, path: str):
+    """
+    Profile the enclosed request. Note that cProfile sees the whole event-loop
+    thread, so concurrent requests show up in the function stats (spans are exact).
+    """
+    profile = RequestProfile(method, path)
+    token = _current.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _current.reset(token)
+        _reports[profile.id] = profile.report()
+        while len(_reports) > PROFILING_MAX_STORED:
+            _reports.popitem(last=False)
+
+
+def span(name: str):
+    """Time a block under the active request profile; a no-op otherwise."""
+    profile = _current.get()
+    if profile is None:
+        return _NOOP
+    return profile.span(name)
+
+
+def get_report(profile_id: str) -> Optional[Dict[str, Any]]:
+    return _reports.get(profile_id)
@@ -1,29 +1,55 @@
 from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import Request, Response, Depends
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 import io
+import json
+
+ROOT_DIR = Path(__file__).parent
+# First: the modules below read their settings (PROFILING_*, INGEST_*, ...) from the environment on import
+load_dotenv(ROOT_DIR / '.env')
 
 from models import (
-    Transaction, TransactionCreate, TransactionResponse,
-    DailyRevenue, RevenueSummary, Product, Anomaly
+    Transaction, TransactionCreate, TransactionResponse, TransactionSearchResult,
+    DailyRevenue, RevenueBreakdown, RevenueSummary, CustomerStats, CohortReport, RevenueForecast, Product, Anomaly, SeriesAnomaly, Dashboard
 )
 from services.import_service import ImportService
-from services.analytics_service import AnalyticsService
+from services.analytics_service import AnalyticsService, DASHBOARD_SECTIONS
 from services.export_service import ExportService
 from services.narrative_service import NarrativeService
+from services.health_service import HealthService
+from services.index_service import IndexService
+from services.storage_service import StorageService
+from services.archive_service import ArchiveService
+from services.sketch_service import SketchService
+from services.cohort_service import CohortService
+from services.forecast_service import ForecastService
+from services.version_service import VersionService
+from services.live_service import LiveService, LIVE_HEARTBEAT_SECONDS
+from services.ingest_service import IngestService, IngestError, INGEST_ACK, INGEST_BATCH_SIZE, to_document
+import http_cache
+import metrics
+import profiling
+import warmup
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
+# MongoDB connection (command timings feed /metrics; METRICS_ENABLED=0 disables)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[
+        metrics.MongoCommandMetrics(record_bytes=os.environ.get('METRICS_MONGO_BYTES', '1') != '0')
+    ] if METRICS_ENABLED else []
+)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -33,10 +59,118 @@ app = FastAPI(title="Revenue Analytics API")
 api_router = APIRouter(prefix="/api")
 
 # Initialize services
-import_service = ImportService(db)
-analytics_service = AnalyticsService(db)
+version_service = VersionService(db)
+sketch_service = SketchService(db)
+import_service = ImportService(db, sketch_service)
+archive_service = ArchiveService(db)
+analytics_service = AnalyticsService(db, version_service, archive_service)
+# Per-version analytics arrays built once per host and mapped by every worker (opt-in)
+SHARED_STATE_DIR = os.environ.get('SHARED_STATE_DIR', '')
+if SHARED_STATE_DIR:
+    from services.shared_state_service import SharedStateService
+    shared_state = SharedStateService(SHARED_STATE_DIR)
+else:
+    shared_state = None
+cohort_service = CohortService(db, version_service, archive_service, shared_state)
+forecast_service = ForecastService(analytics_service, version_service, shared_state)
 export_service = ExportService(db)
 narrative_service = NarrativeService()
+health_service = HealthService(db)
+index_service = IndexService(db)
+storage_service = StorageService(db)
+live_service = LiveService(version_service, analytics_service)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Per-route latency histogram, labelled by route template to keep cardinality bounded."""
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, 'path', 'unmatched'),
+            status=status
+        )
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Opt-in single-request profiling (see profiling.py); a flag check otherwise."""
+    if not profiling.requested(request.headers, request.query_params):
+        return await call_next(request)
+    with profiling.profile_request(request.method, request.url.path) as profile:
+        response = await call_next(request)
+    response.headers['X-Profile-Id'] = profile.id
+    response.headers['Server-Timing'] = profile.server_timing()
+    return response
+
+async def data_changed():
+    """Call after any write to transactions: new ETags everywhere, cached summaries dropped."""
+    analytics_service.invalidate_cache()
+    await version_service.bump()
+    live_service.notify()
+
+def ingest_started():
+    analytics_service.begin_write()
+
+async def transactions_ingested(docs):
+    """Ingest flush hook: fold the written rows into cached aggregates instead of recomputing them."""
+    version = None
+    try:
+        if docs:
+            try:
+                await sketch_service.add(docs)
+            except Exception as e:
+                # Derived data: the rows are written, a --rebuild catches the sketches up
+                logger.error(f"Sketch update failed: {str(e)}", exc_info=True)
+            version = await version_service.bump()
+            live_service.notify()
+    finally:
+        analytics_service.finish_write(docs, version)
+
+ingest_service = IngestService(db, before_flush=ingest_started, on_flush=transactions_ingested)
+
+ACK_PATTERN = "^(accepted|written|durable)$"
+# Ingest chunks a bulk request may have waiting on the buffer before reading more of the body
+BULK_MAX_CHUNKS_IN_FLIGHT = 8
+BULK_MAX_REPORTED_ERRORS = 100
+
+def conditional_get(time_relative: bool = True, end_anchors: bool = True):
+    """
+    Route dependency: answer If-None-Match with 304 before the handler runs,
+    otherwise tag the response. See http_cache for how ETags are derived.
+    `end_anchors`: an `end` query parameter fixes the response in time (not
+    so for cohorts, whose `end` month may still be open).
+    """
+    async def dependency(request: Request, response: Response):
+        etag = http_cache.make_etag(
+            await version_service.current(),
+            request.method,
+            request.url.path,
+            request.query_params.multi_items(),
+            time_relative=time_relative and not (end_anchors and 'end' in request.query_params)
+        )
+        headers = {"ETag": etag, "Cache-Control": http_cache.CACHE_CONTROL}
+        if http_cache.etag_matches(request.headers.get('if-none-match'), etag):
+            metrics.CACHE_REQUESTS.inc(cache='etag', result='hit')
+            raise HTTPException(status_code=304, headers=headers)
+        metrics.CACHE_REQUESTS.inc(cache='etag', result='miss')
+        response.headers.update(headers)
+    return Depends(dependency)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus text exposition of process metrics."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Health check
 @api_router.get("/")
@@ -45,37 +179,46 @@ async def root():
 
 # Debug endpoint to check database state
 @api_router.get("/v1/debug/data-count")
-async def data_count():
+async def data_count(
+    products_limit: int = Query(50, ge=1, le=500),
+    products_offset: int = Query(0, ge=0)
+):
     """Debug endpoint: returns count of transactions in database"""
-    count = await db.transactions.count_documents({})
-    first_doc = await db.transactions.find_one()
-    
-    # Count transactions by status
-    status_counts = {}
-    for status in ['completed', 'pending', 'failed', 'refunded', '']:
-        status_counts[status] = await db.transactions.count_documents({'status': status})
-    
-    # Count products
-    pipeline = [
-        {'$group': {'_id': '$product_id', 'count': {'$sum': 1}}}
-    ]
-    product_cursor = db.transactions.aggregate(pipeline)
-    products = await product_cursor.to_list(length=None)
-    
-    return {
-        "transaction_count": count,
-        "has_data": count > 0,
-        "status_breakdown": status_counts,
-        "product_count": len(products),
-        "products": [{'product_id': p['_id'], 'count': p['count']} for p in products],
-        "sample_transaction": first_doc if first_doc else None
-    }
+    health = await health_service.get_data_health(products_limit, products_offset)
+    health["sample_transaction"] = await storage_service.collection.find_one({}, {'_id': 0, 'meta': 0})
+    return health
+
+@api_router.get("/v1/debug/data-health")
+async def data_health(
+    mode: str = Query("full", pattern="^(full|live)$"),
+    products_limit: int = Query(50, ge=1, le=500),
+    products_offset: int = Query(0, ge=0)
+):
+    """
+    Data health in one aggregation pass.
+    mode=live skips the scan entirely (ping + estimated count) for liveness probes.
+    """
+    if mode == "live":
+        return await health_service.liveness()
+    return await health_service.get_data_health(products_limit, products_offset)
+
+@api_router.get("/v1/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Debug endpoint: fetch a stored request profile by the id from X-Profile-Id"""
+    report = profiling.get_report(profile_id) if profiling.PROFILING_ENABLED else None
+    if not report:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
 
 # Debug endpoint to clear all transactions
 @api_router.delete("/v1/debug/clear-all")
 async def clear_all():
     """Debug endpoint: CLEARS ALL TRANSACTIONS FROM DATABASE"""
-    result = await db.transactions.delete_many({})
+    result = await storage_service.collection.delete_many({})
+    await archive_service.clear()
+    await analytics_service.anomalies.clear()
+    await sketch_service.clear()
+    await data_changed()
     return {
         "deleted": result.deleted_count,
         "message": f"Deleted {result.deleted_count} transactions"
@@ -102,9 +245,110 @@ async def import_transactions(file: UploadFile = File(...), preview: bool = Quer
     content = await file.read()
     # pass preview flag to import service; when preview=True the service will not insert
     result = await import_service.import_from_file(content, file_ext, preview=preview)
+    if not preview and result.get('imported'):
+        await data_changed()
     return result
 
-@api_router.get("/v1/transactions", response_model=list[TransactionResponse])
+def _validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc']) or 'body'}: {e['msg']}" for e in error.errors()
+        )
+    return str(error)
+
+@api_router.post("/v1/transactions", response_model=TransactionResponse, status_code=201)
+async def create_transaction(
+    transaction: TransactionCreate,
+    response: Response,
+    ack: Optional[str] = Query(None, pattern=ACK_PATTERN)
+):
+    """
+    Ingest a single transaction. Writes from concurrent requests are coalesced
+    into batched inserts; `ack` (default INGEST_ACK) decides when this returns:
+    accepted (202 once buffered), written (primary acknowledged the batch) or
+    durable (batch journaled on a majority).
+    """
+    ack = ack or INGEST_ACK
+    try:
+        doc = to_document(transaction)
+    except (ValueError, OverflowError) as e:
+        raise HTTPException(status_code=422, detail=f"paid_at: {str(e)}")
+    try:
+        await ingest_service.submit([doc], ack)
+    except IngestError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if ack == 'accepted':
+        response.status_code = 202
+    return doc
+
+@api_router.post("/v1/transactions/bulk")
+async def bulk_ingest_transactions(request: Request, ack: Optional[str] = Query(None, pattern=ACK_PATTERN)):
+    """
+    Ingest newline-delimited JSON, one TransactionCreate per line. The body is
+    read as a stream and valid rows go to the write buffer in chunks as they
+    arrive; invalid lines are reported by line number without failing the rest.
+    """
+    ack = ack or INGEST_ACK
+    accepted = rejected = failed = 0
+    errors = []
+    chunk = []
+    in_flight = []
+
+    async def settle(task, rows):
+        nonlocal failed
+        try:
+            await task
+        except IngestError:
+            failed += rows
+
+    async def submit_chunk():
+        nonlocal chunk
+        in_flight.append((asyncio.create_task(ingest_service.submit(chunk, ack)), len(chunk)))
+        chunk = []
+        if len(in_flight) > BULK_MAX_CHUNKS_IN_FLIGHT:
+            await settle(*in_flight.pop(0))
+
+    def parse_line(line_number, raw):
+        nonlocal accepted, rejected
+        if not raw.strip():
+            return
+        try:
+            chunk.append(to_document(TransactionCreate.model_validate_json(raw)))
+            accepted += 1
+        except (ValidationError, ValueError, OverflowError) as e:
+            rejected += 1
+            if len(errors) < BULK_MAX_REPORTED_ERRORS:
+                errors.append({"line": line_number, "error": _validation_message(e)})
+
+    line_number = 0
+    tail = b""
+    async for data in request.stream():
+        lines = (tail + data).split(b"\n")
+        tail = lines.pop()
+        for raw in lines:
+            line_number += 1
+            parse_line(line_number, raw)
+            if len(chunk) >= INGEST_BATCH_SIZE:
+                await submit_chunk()
+    if tail:
+        parse_line(line_number + 1, tail)
+    if chunk:
+        await submit_chunk()
+    for task, rows in in_flight:
+        await settle(task, rows)
+
+    metrics.INGEST_ROWS.inc(rejected, outcome='rejected')
+    return {
+        "success": failed == 0,
+        "ack": ack,
+        "accepted": accepted - failed,
+        "rejected": rejected,
+        "failed": failed,
+        "errors": errors,
+    }
+
+@api_router.get("/v1/transactions", response_model=list[TransactionResponse],
+                dependencies=[conditional_get(time_relative=False)])
 async def get_transactions(
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0)
@@ -115,6 +359,53 @@ async def get_transactions(
     transactions = await analytics_service.get_transactions(limit, offset)
     return transactions
 
+def _csv(value: Optional[str]) -> Optional[list[str]]:
+    return [part.strip() for part in value.split(',') if part.strip()] if value else None
+
+# Declared before /v1/transactions/{order_id} so "search" is not read as an order ID
+@api_router.get("/v1/transactions/search", response_model=TransactionSearchResult,
+                dependencies=[conditional_get(time_relative=False)])
+async def search_transactions(
+    status: Optional[str] = None,
+    channel: Optional[str] = None,
+    region: Optional[str] = None,
+    product_id: Optional[str] = None,
+    campaign: Optional[str] = None,
+    order_id: Optional[str] = Query(None, description="order ID prefix"),
+    user_id: Optional[str] = Query(None, description="user ID prefix"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    sort: Literal['date', 'amount'] = 'date',
+    order: Literal['asc', 'desc'] = 'desc',
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """
+    Search transactions. Comma-separated values match any of them; order_id
+    and user_id match by prefix. A prefix, or a range on the field not sorted
+    by, must match at most 5,000 rows (400 otherwise). Pass `next_cursor`
+    back as `cursor` for the next page.
+    """
+    filters = {
+        "status": _csv(status),
+        "channel": _csv(channel),
+        "region": _csv(region),
+        "product_id": _csv(product_id),
+        "attribution_campaign": _csv(campaign),
+        "order_id": order_id,
+        "user_id": user_id,
+        "start": start,
+        "end": end,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+    }
+    try:
+        return await analytics_service.search_transactions(filters, sort, order == 'desc', limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @api_router.get("/v1/transactions/{order_id}", response_model=TransactionResponse)
 async def get_transaction(order_id: str):
     """
@@ -127,19 +418,114 @@ async def get_transaction(order_id: str):
 
 # ============ Insights Endpoints ============
 
-@api_router.get("/v1/insights/revenue/daily", response_model=list[DailyRevenue])
+@api_router.get("/v1/insights/revenue/daily", response_model=list[DailyRevenue],
+                dependencies=[conditional_get()])
 async def get_daily_revenue(
     start: Optional[str] = None,
-    end: Optional[str] = None
+    end: Optional[str] = None,
+    granularity: Literal['hour', 'day', 'week', 'month'] = 'day',
+    tz: str = Query('UTC', description="IANA timezone for buckets and naive bounds, e.g. Europe/Berlin")
+):
+    """
+    Get revenue aggregated per hour, day, week (from Monday) or month.
+    Returns the last 90 days by default; `day` is each bucket's start.
+    """
+    try:
+        return await analytics_service.get_daily_revenue(start, end, granularity, tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/v1/insights/revenue/breakdown", response_model=RevenueBreakdown,
+                dependencies=[conditional_get()])
+async def get_revenue_breakdown(
+    dimensions: str = Query("channel,region,attribution_campaign", description="comma-separated splits"),
+    crosstabs: Optional[str] = Query(None, description="comma-separated cross-tabs, e.g. channel:region"),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000)
 ):
     """
-    Get daily revenue aggregation.
-    Returns last 90 days by default.
+    Revenue, orders, refund rate and average order value per channel,
+    region, campaign or product (and cross-tabs of them) for one period.
+    Defaults to the last 30 days.
     """
-    return await analytics_service.get_daily_revenue(start, end)
+    groups = [[d] for d in _csv(dimensions) or []] + [cross.split(':') for cross in _csv(crosstabs) or []]
+    try:
+        return await analytics_service.get_breakdown(groups, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@api_router.get("/v1/insights/revenue/summary", response_model=RevenueSummary)
-async def get_revenue_summary():
+@api_router.get("/v1/insights/customers", response_model=CustomerStats,
+                dependencies=[conditional_get()])
+async def get_customer_stats(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    product_id: Optional[str] = None,
+    channel: Optional[str] = None,
+    by: Optional[Literal['day', 'product_id', 'channel']] = None
+):
+    """
+    Approximate unique paying users and p50/p90/p99 order value for any
+    date range (UTC days, default last 30) and product/channel filter,
+    merged from per-day sketches; `by` splits the result.
+    """
+    try:
+        return await sketch_service.get_customer_stats(start, end, product_id, channel, by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/v1/insights/forecast", response_model=RevenueForecast,
+                dependencies=[conditional_get()])
+async def get_forecast(
+    products: int = Query(20, ge=0, le=1000),
+    interval: float = Query(0.9, gt=0.5, lt=1)
+):
+    """
+    30/60/90-day revenue forecasts (weekday-seasonal Holt-Winters) with
+    prediction intervals, in total and for the top `products` products,
+    plus the total's daily forecast for the next 90 days.
+    """
+    return await forecast_service.get_forecast(products, interval)
+
+@api_router.get("/v1/insights/cohorts/retention", response_model=CohortReport,
+                dependencies=[conditional_get(end_anchors=False)])
+async def get_cohort_retention(
+    start: Optional[str] = Query(None, description="first acquisition month, YYYY-MM"),
+    end: Optional[str] = Query(None, description="last acquisition month, YYYY-MM"),
+    months: int = Query(12, ge=0, le=120)
+):
+    """
+    Monthly acquisition cohorts (default: the last 12) and the share of each
+    still buying 0..`months` months later, plus repeat-purchase rates.
+    """
+    try:
+        return await cohort_service.get_retention(start, end, months)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/v1/insights/cohorts/ltv", response_model=CohortReport,
+                dependencies=[conditional_get(end_anchors=False)])
+async def get_cohort_ltv(
+    start: Optional[str] = Query(None, description="first acquisition month, YYYY-MM"),
+    end: Optional[str] = Query(None, description="last acquisition month, YYYY-MM"),
+    months: int = Query(12, ge=0, le=120)
+):
+    """
+    Lifetime value curves: cumulative revenue per customer of each monthly
+    cohort 0..`months` months after acquisition.
+    """
+    try:
+        return await cohort_service.get_ltv(start, end, months)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/v1/insights/revenue/summary", response_model=RevenueSummary,
+                dependencies=[conditional_get()])
+async def get_revenue_summary(
+    include_narrative: bool = Query(True),
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
     """
     Get comprehensive revenue summary including:
     - Today's revenue
@@ -148,38 +534,105 @@ async def get_revenue_summary():
     - Revenue Health Index
     - Top products
     - Recent anomalies
-    - AI-generated narrative
+    - AI-generated narrative (skip with include_narrative=false and
+      stream it from /v1/insights/narrative/stream instead)
     """
-    summary = await analytics_service.get_revenue_summary()
+    try:
+        with profiling.span('summary'):
+            summary = await analytics_service.get_revenue_summary(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Generate AI narrative
-    narrative = await narrative_service.generate_narrative(
-        today=summary['today'],
-        mtd=summary['mtd'],
-        ytd=summary['ytd'],
-        rhi=summary['rhi'],
-        top_products=summary['top_products'],
-        anomalies=summary['anomalies']
-    )
-    summary['narrative'] = narrative
+    if include_narrative:
+        # Generate AI narrative
+        with profiling.span('narrative'):
+            summary['narrative'] = await narrative_service.generate_narrative(
+                today=summary['today'],
+                mtd=summary['mtd'],
+                ytd=summary['ytd'],
+                rhi=summary['rhi'],
+                top_products=summary['top_products'],
+                anomalies=summary['anomalies']
+            )
     
     return summary
 
-@api_router.get("/v1/insights/revenue/by-product", response_model=list[Product])
+@api_router.get("/v1/insights/revenue/by-product", response_model=list[Product],
+                dependencies=[conditional_get()])
 async def get_top_products(days: int = Query(30, ge=1, le=365)):
     """
     Get top products by revenue for the specified period.
     """
     return await analytics_service.get_top_products(days)
 
-@api_router.get("/v1/insights/anomalies", response_model=list[Anomaly])
+@api_router.get("/v1/insights/anomalies", response_model=list[Anomaly],
+                dependencies=[conditional_get()])
 async def get_anomalies(lookback_days: int = Query(90, ge=7, le=365)):
     """
-    Detect revenue anomalies using statistical analysis (z-score method).
-    Returns days with |z-score| > 2.5
+    Detect revenue anomalies: days whose z-score against a rolling, EWMA or
+    weekday-seasonal baseline (ANOMALY_BASELINE) exceeds 2.5.
     """
     return await analytics_service.detect_anomalies(lookback_days)
 
+@api_router.get("/v1/insights/anomalies/series", response_model=list[SeriesAnomaly],
+                dependencies=[conditional_get()])
+async def get_series_anomalies(
+    dimensions: str = Query("product_id,channel,region", description="comma-separated dimensions"),
+    lookback_days: int = Query(30, ge=7, le=365),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """
+    Most anomalous days across every product, channel and region series,
+    scored together in one pass (highest |z| first).
+    """
+    try:
+        return await analytics_service.detect_series_anomalies(_csv(dimensions) or [], lookback_days, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/v1/insights/dashboard", response_model=Dashboard, response_model_exclude_unset=True,
+                dependencies=[conditional_get()])
+async def get_dashboard(
+    sections: str = Query(",".join(DASHBOARD_SECTIONS)),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    include_narrative: bool = Query(False),
+    transactions_limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Several dashboard sections in one request, computed from a single pass
+    over the data. `sections` is a comma-separated subset of
+    summary, daily, products, anomalies, transactions.
+    """
+    requested = [s.strip() for s in sections.split(",") if s.strip()]
+    unknown = sorted(set(requested) - set(DASHBOARD_SECTIONS))
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sections: {', '.join(unknown) or '(none requested)'}. "
+                   f"Choose from {', '.join(DASHBOARD_SECTIONS)}."
+        )
+
+    try:
+        with profiling.span('dashboard'):
+            dashboard = await analytics_service.get_dashboard(requested, start, end, transactions_limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    summary = dashboard.get('summary')
+    if summary and include_narrative:
+        with profiling.span('narrative'):
+            summary['narrative'] = await narrative_service.generate_narrative(
+                today=summary['today'],
+                mtd=summary['mtd'],
+                ytd=summary['ytd'],
+                rhi=summary['rhi'],
+                top_products=summary['top_products'],
+                anomalies=summary['anomalies']
+            )
+
+    return dashboard
+
 @api_router.get("/v1/insights/narrative")
 async def get_narrative(
     start: Optional[str] = None,
@@ -187,8 +640,12 @@ async def get_narrative(
 ):
     """
     Get AI-generated narrative for a specific period.
+    Reuses the cached summary for the period when available.
     """
-    summary = await analytics_service.get_revenue_summary()
+    try:
+        summary = await analytics_service.get_revenue_summary(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     narrative = await narrative_service.generate_narrative(
         today=summary['today'],
         mtd=summary['mtd'],
@@ -199,6 +656,79 @@ async def get_narrative(
     )
     return {"narrative": narrative}
 
+@api_router.get("/v1/insights/narrative/stream")
+async def stream_narrative(
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Stream the AI-generated narrative for a period as server-sent events.
+    Each chunk is sent as a `data:` event; a final `done` event closes the stream.
+    """
+    try:
+        summary = await analytics_service.get_revenue_summary(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def event_stream():
+        async for chunk in narrative_service.stream_narrative(
+            today=summary['today'],
+            mtd=summary['mtd'],
+            ytd=summary['ytd'],
+            rhi=summary['rhi'],
+            top_products=summary['top_products'],
+            anomalies=summary['anomalies']
+        ):
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/v1/insights/live")
+async def live_updates(request: Request):
+    """
+    Server-sent events pushed when the dataset changes. Each `update` event
+    carries the dataset version (as the event id), the headline KPIs and
+    which summary fields changed, so clients refetch only those. The current
+    state is sent on connect unless Last-Event-ID already names it.
+    """
+    if live_service.full:
+        raise HTTPException(status_code=503, detail="Too many live connections")
+    last_event_id = request.headers.get('last-event-id', '')
+
+    def format_event(event):
+        return f"id: {event['version']}\nevent: update\ndata: {json.dumps(event)}\n\n"
+
+    async def event_stream():
+        queue = live_service.subscribe()
+        try:
+            sent = int(last_event_id) if last_event_id.isdigit() else None
+            snapshot = await live_service.snapshot()
+            if snapshot['version'] != sent:
+                sent = snapshot['version']
+                yield format_event(snapshot)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event['version'] != sent:
+                    sent = event['version']
+                    yield format_event(event)
+        finally:
+            live_service.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ============ Export Endpoints ============
 
 @api_router.get("/v1/export/csv")
@@ -219,6 +749,12 @@ async def export_csv(limit: int = Query(5000, ge=1, le=10000)):
 # Include the router in the main app
 app.include_router(api_router)
 
+# Gzip large JSON/CSV bodies; SSE streams are left unbuffered
+app.add_middleware(
+    http_cache.CompressionMiddleware,
+    exclude_paths=["/api/v1/insights/narrative/stream", "/api/v1/insights/live"]
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -234,6 +770,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    """Create the indexes services declare (ENSURE_INDEXES=0 disables; VERIFY_QUERY_PLANS=1 also explains them)."""
+    try:
+        # The time-series collection must exist before the first insert would create a regular one
+        await storage_service.ensure_collection()
+        if os.environ.get('ENSURE_INDEXES', '1') == '0':
+            return
+        await index_service.ensure_indexes()
+        await sketch_service.ensure_indexes()
+        if os.environ.get('VERIFY_QUERY_PLANS') == '1':
+            await index_service.verify_query_plans(strict=False)
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+@app.on_event("startup")
+async def schedule_prewarm():
+    """Import heavy modules in a worker thread once the app is serving (PREWARM_IMPORTS=0 disables)."""
+    if os.environ.get('PREWARM_IMPORTS', '1') == '0':
+        return
+
+    async def _prewarm():
+        await asyncio.sleep(float(os.environ.get('PREWARM_DELAY_SECONDS', '1')))
+        await asyncio.to_thread(warmup.prewarm)
+
+    app.state.prewarm_task = asyncio.create_task(_prewarm())
+
+@app.on_event("startup")
+async def start_background_services():
+    ingest_service.start()
+    live_service.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Buffered ingest rows are written before the client closes
+    await ingest_service.stop()
+    await live_service.stop()
     client.close()
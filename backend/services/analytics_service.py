@@ -1,11 +1,141 @@
-from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Dict, Any
-import numpy as np
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Optional, List, Dict, Any, Sequence, Set, Tuple
+import base64
+import json
+import os
+import re
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from bson import ObjectId
+
+import metrics
+import profiling
+from services.anomaly_service import AnomalyService, warmup_days
+from services.fx_service import AMOUNT_BASE_EXPR, base_amount
+from services.storage_service import transactions_collection
+
+# How long computed dashboard aggregates may be reused (summary, narrative, dashboard)
+SUMMARY_CACHE_TTL_SECONDS = float(os.environ.get('SUMMARY_CACHE_TTL_SECONDS', '60'))
+
+# Statuses counted as revenue (None matches imports without a status column)
+REVENUE_STATUSES = ['completed', 'refunded', 'pending', '', None]
+
+# Sections get_dashboard can compute from its shared pass
+DASHBOARD_SECTIONS = ('summary', 'daily', 'products', 'anomalies', 'transactions')
+# Per-product totals kept from the shared pass (top 10 are shown; the rest let ingest deltas re-rank them)
+PRODUCT_CANDIDATES = 5000
+
+# Transaction search: sort keys, exact-match filters, prefix filters, and the
+# fields that lead their own (field, sort key, _id) indexes, in planning priority
+SEARCH_SORTS = {'date': 'revenue_date', 'amount': 'amount'}
+SEARCH_EQUALITY_FIELDS = ('status', 'channel', 'region', 'product_id', 'attribution_campaign')
+SEARCH_PREFIX_FIELDS = ('order_id', 'user_id')
+SEARCH_LEADING_FIELDS = ('product_id', 'attribution_campaign')
+SEARCH_MIN_PREFIX = 3
+# Most matches a search may sort in memory when its index can't return them in order
+SEARCH_SORT_MAX_ROWS = 5_000
+
+# Dimensions a revenue breakdown can split (and cross-tabulate) by
+BREAKDOWN_DIMENSIONS = ('channel', 'region', 'attribution_campaign', 'product_id')
+# Groups (splits or cross-tabs) one breakdown request may ask for
+MAX_BREAKDOWN_GROUPS = 8
+
+# Revenue series buckets (pandas frequencies for gap filling; weeks start on Monday)
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+BUCKET_FREQ = {'hour': 'h', 'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+# Most buckets one series request may return (over a year of hours)
+MAX_SERIES_BUCKETS = 10_000
+
+# Dimensions whose every value gets its own series in the batch anomaly scan
+SERIES_DIMENSIONS = ('product_id', 'channel', 'region')
+
+
+def series_group_stages(dimensions: Sequence[str], day: Any, revenue: Any) -> List[Dict[str, Any]]:
+    """
+    Stages turning rows with a `day` string and `revenue` into one document
+    per (dimension, value) with parallel `days`/`revenue` arrays, so the
+    scan returns one row per series instead of one per series x day.
+    """
+    return [
+        {"$project": {
+            "day": day,
+            "revenue": revenue,
+            # [{k: dimension, v: value}, ...]: one copy of the row per dimension after the unwind
+            "keys": {"$objectToArray": {dimension: f"${dimension}" for dimension in dimensions}},
+        }},
+        {"$unwind": "$keys"},
+        {"$group": {"_id": {"d": "$keys.k", "v": "$keys.v", "day": "$day"}, "revenue": {"$sum": "$revenue"}}},
+        {"$group": {
+            "_id": {"d": "$_id.d", "v": "$_id.v"},
+            "days": {"$push": "$_id.day"},
+            "revenue": {"$push": "$revenue"},
+        }},
+    ]
+
+
+def _parse_bound(value: Optional[str], zone: tzinfo = timezone.utc, upper: bool = False) -> Optional[datetime]:
+    """
+    Parse an ISO date/datetime query bound into an aware datetime (naive
+    values are in `zone`). A date-only `upper` bound is the end of that day,
+    so e.g. end=2025-01-31 includes the 31st.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}' (use an ISO date or datetime, e.g. 2025-01-31 or 2025-01-31T12:00:00Z)")
+    if upper and 'T' not in value and ' ' not in value:
+        parsed += timedelta(days=1, microseconds=-1)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=zone)
+    return parsed
+
+
+def _zone(tz: str) -> tzinfo:
+    try:
+        return timezone.utc if tz == 'UTC' else ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{tz}'")
+
 
 class AnalyticsService:
-    def __init__(self, db):
+    # Indexes backing the query shapes below (created by IndexService at startup)
+    INDEXES = [
+        [("order_id", 1)],
+        [("created_at", -1)],
+        [("revenue_date", 1), ("status", 1)],
+        # Transaction search (see _search_index)
+        [("revenue_date", 1), ("_id", 1)],
+        [("amount", 1), ("_id", 1)],
+        [("user_id", 1), ("revenue_date", 1), ("_id", 1)],
+        [("product_id", 1), ("revenue_date", 1), ("_id", 1)],
+        [("product_id", 1), ("amount", 1), ("_id", 1)],
+        [("attribution_campaign", 1), ("revenue_date", 1), ("_id", 1)],
+        [("attribution_campaign", 1), ("amount", 1), ("_id", 1)],
+    ]
+
+    def __init__(self, db, versions=None, archive=None):
         self.db = db
-        self.collection = db.transactions
+        # db=None: offline use (services/offline_service.py), which folds rows itself
+        self.collection = transactions_collection(db) if db is not None else None
+        # Optional VersionService: keys the summary cache so other workers' imports invalidate it
+        self.versions = versions
+        # Optional ArchiveService: windows reaching compacted history add its summaries to the hot totals
+        self.archive = archive
+        # Running anomaly baselines, advanced a day at a time
+        self.anomalies = AnomalyService(db)
+        # (dataset version, start, end) -> (computed_at, dashboard intermediate)
+        self._cache: Dict[Tuple[Optional[int], Optional[str], Optional[str]], Tuple[float, Dict[str, Any]]] = {}
+        # Incremental writes in progress, and a counter bumped at each write's start/end:
+        # aggregates computed while rows were landing may already contain them, so they aren't cached
+        self._writes_in_flight = 0
+        self._write_epoch = 0
+
+    def invalidate_cache(self) -> None:
+        """Drop cached aggregates, e.g. after an import or a clear."""
+        self._cache.clear()
 
     def _normalize_tx(self, tx: Dict[str, Any]) -> Dict[str, Any]:
         """Normalize a transaction document to conform to API schema."""
@@ -38,280 +168,558 @@ class AnalyticsService:
     async def get_transaction(self, order_id: str) -> Optional[Dict]:
         """Get a specific transaction by order ID."""
         tx = await self.collection.find_one({"order_id": order_id})
+        if not tx and self.archive:
+            tx = await self.archive.find(order_id)
         return self._normalize_tx(tx) if tx else None
     
-    async def get_daily_revenue(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    async def search_transactions(
+        self,
+        filters: Dict[str, Any],
+        sort: str = 'date',
+        descending: bool = True,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Get daily revenue aggregation.
-        Default: last 90 days
+        Filtered transaction search with keyset pagination.
+
+        `filters` keys: status/channel/region/product_id/attribution_campaign
+        (value or list), order_id/user_id (prefix), start/end (revenue_date,
+        ISO) and min_amount/max_amount. Results are ordered by the sort key
+        then _id; `cursor` is the `next_cursor` of the previous page.
+        Raises ValueError for an unusable filter or cursor, or one that
+        matches too many rows to sort (see _search_index).
         """
-        from datetime import datetime, timedelta, timezone
-        
-        # Default to last 90 days
-        if not end:
-            end_date = datetime.now(timezone.utc)
-        else:
-            end_date = datetime.fromisoformat(end.replace('Z', '+00:00'))
-            # Ensure timezone-aware
-            if end_date.tzinfo is None:
-                end_date = end_date.replace(tzinfo=timezone.utc)
-        
-        if not start:
-            start_date = end_date - timedelta(days=90)
-        else:
-            start_date = datetime.fromisoformat(start.replace('Z', '+00:00'))
-            # Ensure timezone-aware
-            if start_date.tzinfo is None:
-                start_date = start_date.replace(tzinfo=timezone.utc)
-        
-        # Fetch all transactions (simple approach)
-        cursor = self.collection.find()
-        transactions = await cursor.to_list(length=None)
-        
-        # Process in Python for robustness
-        daily_data = {}
-        count_in_range = 0
-        
-        for tx in transactions:
-            try:
-                # Try to parse paid_at, fall back to created_at
-                date_str = tx.get('paid_at') or tx.get('created_at')
-                if not date_str:
-                    continue
-                
-                # Parse ISO format date string
-                if isinstance(date_str, str):
-                    # Handle ISO 8601 strings
-                    date_str = date_str.replace('Z', '+00:00')
-                    try:
-                        tx_date = datetime.fromisoformat(date_str)
-                        # Ensure timezone-aware
-                        if tx_date.tzinfo is None:
-                            tx_date = tx_date.replace(tzinfo=timezone.utc)
-                    except:
-                        continue
-                else:
-                    tx_date = date_str
-                    # Ensure timezone-aware
-                    if isinstance(tx_date, datetime) and tx_date.tzinfo is None:
-                        tx_date = tx_date.replace(tzinfo=timezone.utc)
-                
-                # Check if in range
-                if tx_date < start_date or tx_date > end_date:
-                    continue
-                
-                # Only count completed/refunded/pending transactions (or empty status)
-                status = tx.get('status', '')
-                if status not in ['completed', 'refunded', 'pending', '']:
-                    continue
-                
-                day_str = tx_date.strftime('%Y-%m-%d')
-                if day_str not in daily_data:
-                    daily_data[day_str] = {'revenue': 0.0, 'orders': 0}
-                
-                daily_data[day_str]['revenue'] += float(tx.get('amount', 0))
-                daily_data[day_str]['orders'] += 1
-                count_in_range += 1
-            except Exception as e:
-                continue
-        # If no transactions fell within the requested range but there are transactions,
-        # fall back to using the full available date range so charts don't appear empty.
-        if count_in_range == 0 and transactions:
-            daily_data = {}
-            for tx in transactions:
-                try:
-                    date_str = tx.get('paid_at') or tx.get('created_at')
-                    if not date_str:
-                        continue
-                    if isinstance(date_str, str):
-                        date_str = date_str.replace('Z', '+00:00')
-                        try:
-                            tx_date = datetime.fromisoformat(date_str)
-                            # Ensure timezone-aware
-                            if tx_date.tzinfo is None:
-                                tx_date = tx_date.replace(tzinfo=timezone.utc)
-                        except:
-                            continue
-                    else:
-                        tx_date = date_str
-                        # Ensure timezone-aware
-                        if isinstance(tx_date, datetime) and tx_date.tzinfo is None:
-                            tx_date = tx_date.replace(tzinfo=timezone.utc)
-
-                    # Only count completed/refunded/pending transactions (or empty status)
-                    status = tx.get('status', '')
-                    if status not in ['completed', 'refunded', 'pending', '']:
-                        continue
-
-                    day_str = tx_date.strftime('%Y-%m-%d')
-                    if day_str not in daily_data:
-                        daily_data[day_str] = {'revenue': 0.0, 'orders': 0}
-
-                    daily_data[day_str]['revenue'] += float(tx.get('amount', 0))
-                    daily_data[day_str]['orders'] += 1
-                except Exception:
-                    continue
-        # Fill in missing days with zero revenue
-        filled_result = []
-        current_date = start_date
-        while current_date <= end_date:
-            day_str = current_date.strftime('%Y-%m-%d')
-            if day_str in daily_data:
-                filled_result.append({
-                    'day': day_str,
-                    'revenue': daily_data[day_str]['revenue'],
-                    'orders': daily_data[day_str]['orders']
-                })
-            else:
-                filled_result.append({
-                    'day': day_str,
-                    'revenue': 0.0,
-                    'orders': 0
-                })
-            current_date += timedelta(days=1)
-        
-        return filled_result
-    
-    async def get_revenue_summary(self) -> Dict[str, Any]:
+        query, index, sort_field, bound = self._search_query(filters, sort)
+        if bound is not None:
+            # Covered by the same index: reads at most SEARCH_SORT_MAX_ROWS + 1 keys
+            matches = await self.collection.count_documents(bound, hint=index, limit=SEARCH_SORT_MAX_ROWS + 1)
+            if matches > SEARCH_SORT_MAX_ROWS:
+                raise ValueError(
+                    f"The {'/'.join(bound)} filter matches more than {SEARCH_SORT_MAX_ROWS} transactions; "
+                    f"narrow it to sort by {sort}"
+                )
+        direction = -1 if descending else 1
+        if cursor:
+            value, last_id = self._decode_cursor(cursor)
+            # Bound on the sort key (an index range) minus the ties already returned
+            query = {'$and': [
+                query,
+                {sort_field: {'$lte' if descending else '$gte': value}},
+                {'$nor': [{sort_field: value, '_id': {'$gte' if descending else '$lte': last_id}}]},
+            ]}
+        rows = await self.collection.find(query).sort(
+            [(sort_field, direction), ('_id', direction)]
+        ).hint(index).limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = self._encode_cursor(rows[limit - 1].get(sort_field), rows[limit - 1]['_id']) \
+            if len(rows) > limit else None
+        return {'items': [self._normalize_tx(tx) for tx in rows[:limit]], 'next_cursor': next_cursor}
+
+    def _search_query(
+        self, filters: Dict[str, Any], sort: str
+    ) -> Tuple[Dict[str, Any], List, str, Optional[Dict[str, Any]]]:
+        """Filter, hinted index, sort field and sort bound (see _search_index) for a search."""
+        if sort not in SEARCH_SORTS:
+            raise ValueError(f"Unknown sort '{sort}' (choose from {', '.join(SEARCH_SORTS)})")
+        sort_field = SEARCH_SORTS[sort]
+        query: Dict[str, Any] = {}
+        for field in SEARCH_EQUALITY_FIELDS:
+            value = filters.get(field)
+            if value:
+                query[field] = {'$in': list(value)} if isinstance(value, (list, tuple)) else value
+        for field in SEARCH_PREFIX_FIELDS:
+            prefix = filters.get(field)
+            if prefix:
+                if len(prefix) < SEARCH_MIN_PREFIX:
+                    raise ValueError(f"{field} prefix needs at least {SEARCH_MIN_PREFIX} characters")
+                # Anchored, case-sensitive: becomes a tight index range
+                query[field] = {'$regex': f'^{re.escape(prefix)}'}
+        start, end = _parse_bound(filters.get('start')), _parse_bound(filters.get('end'), upper=True)
+        if start or end:
+            query['revenue_date'] = {
+                **({'$gte': start} if start else {}), **({'$lte': end} if end else {}), '$type': 'date'
+            }
+        if filters.get('min_amount') is not None or filters.get('max_amount') is not None:
+            query['amount'] = {
+                **({'$gte': filters['min_amount']} if filters.get('min_amount') is not None else {}),
+                **({'$lte': filters['max_amount']} if filters.get('max_amount') is not None else {}),
+            }
+        index, bound = self._search_index(query, sort_field)
+        return query, index, sort_field, bound
+
+    def _search_index(self, query: Dict[str, Any], sort_field: str) -> Tuple[List, Optional[Dict[str, Any]]]:
         """
-        Get comprehensive revenue summary.
+        The index a search walks, and the filter bounding the rows it sorts in memory
+        (None when the index returns them in sort order).
         """
-        now = datetime.utcnow()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Today's revenue
-        today_result = await self.collection.aggregate([
-            {
-                "$addFields": {
-                    "paid_date": {
-                        "$ifNull": [
-                            {"$dateFromString": {"dateString": "$paid_at", "onError": None}},
-                            {"$dateFromString": {"dateString": "$created_at", "onError": None}}
-                        ]
-                    }
-                }
-            },
-            {
-                "$match": {
-                    "paid_date": {"$gte": today_start},
-                    "status": {"$in": ["completed", "refunded", "pending", ""]}
-                }
-            },
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(length=1)
-        today_revenue = today_result[0]['total'] if today_result else 0.0
-        
-        # MTD revenue
-        mtd_result = await self.collection.aggregate([
-            {
-                "$addFields": {
-                    "paid_date": {
-                        "$ifNull": [
-                            {"$dateFromString": {"dateString": "$paid_at", "onError": None}},
-                            {"$dateFromString": {"dateString": "$created_at", "onError": None}}
-                        ]
-                    }
-                }
-            },
-            {
-                "$match": {
-                    "paid_date": {"$gte": month_start},
-                    "status": {"$in": ["completed", "refunded", "pending", ""]}
-                }
-            },
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(length=1)
-        mtd_revenue = mtd_result[0]['total'] if mtd_result else 0.0
-        
-        # YTD revenue
-        ytd_result = await self.collection.aggregate([
-            {
-                "$addFields": {
-                    "paid_date": {
-                        "$ifNull": [
-                            {"$dateFromString": {"dateString": "$paid_at", "onError": None}},
-                            {"$dateFromString": {"dateString": "$created_at", "onError": None}}
-                        ]
-                    }
-                }
-            },
+        for field in SEARCH_PREFIX_FIELDS:
+            if field in query:
+                index = [("order_id", 1)] if field == 'order_id' else [(field, 1), ("revenue_date", 1), ("_id", 1)]
+                return index, {key: query[key] for key, _ in index if key in query}
+        leading = [(field, 1) for field in SEARCH_LEADING_FIELDS if field in query][:1]
+        other = 'amount' if sort_field == 'revenue_date' else 'revenue_date'
+        if other in query:
+            index = leading + [(other, 1), ("_id", 1)]
+            return index, {key: query[key] for key, _ in index if key in query}
+        return leading + [(sort_field, 1), ("_id", 1)], None
+
+    def _encode_cursor(self, value: Any, last_id: Any) -> str:
+        payload = {
+            'v': value.isoformat() if isinstance(value, datetime) else value,
+            'd': isinstance(value, datetime),
+            'id': str(last_id),
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> Tuple[Any, Any]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = datetime.fromisoformat(payload['v']) if payload['d'] else payload['v']
+            last_id = ObjectId(payload['id']) if ObjectId.is_valid(payload['id']) else payload['id']
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {e}")
+        return value, last_id
+
+    async def get_breakdown(
+        self,
+        groups: Sequence[Sequence[str]],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Revenue, orders, refund rate and average order value per value of
+        each group of dimensions in [start, end] (default: last 30 days),
+        plus the period total. A group of one dimension is a split (by
+        channel); more make a cross-tab (channel x region), keyed by the
+        dimensions joined with ':'. Each group keeps its `limit` highest-
+        revenue rows. All groups come from one $facet pass. Archived history
+        has no campaign, so it counts as unattributed in campaign splits.
+        """
+        groups = [tuple(group) for group in groups]
+        unknown = sorted({d for group in groups for d in group if d not in BREAKDOWN_DIMENSIONS})
+        if unknown:
+            raise ValueError(f"Unknown dimension(s) {', '.join(unknown)} (choose from {', '.join(BREAKDOWN_DIMENSIONS)})")
+        if len(groups) > MAX_BREAKDOWN_GROUPS or any(len(set(group)) != len(group) for group in groups):
+            raise ValueError(f"Ask for at most {MAX_BREAKDOWN_GROUPS} groups, each naming a dimension once")
+        end_date = _parse_bound(end, upper=True) or datetime.now(timezone.utc)
+        start_date = _parse_bound(start) or end_date - timedelta(days=30)
+        since = start_date.astimezone(timezone.utc).replace(tzinfo=None)
+        until = end_date.astimezone(timezone.utc).replace(tzinfo=None)
+
+        # Both tiers are ranked separately, so merge over more candidates than are shown
+        archived = self.archive and await self.archive.covers(since)
+        candidates = max(limit, PRODUCT_CANDIDATES) if archived else limit
+        with profiling.span('breakdown.aggregate'):
+            rows = await self.collection.aggregate(
+                self._breakdown_pipeline(since, until, groups, candidates)
+            ).to_list(length=1)
+        facets = rows[0] if rows else {}
+        totals = {
+            name: self._keyed_rows(facets.get(name, []), group)
+            for name, group in [('total', ())] + [(':'.join(group), group) for group in groups]
+        }
+        if archived:
+            more = await self.archive.breakdown(since, until, groups, candidates)
+            for name, group in [('total', ())] + [(':'.join(group), group) for group in groups]:
+                self._add_totals(totals[name], self._keyed_rows(more.get(name, []), group))
+
+        def metrics_row(key: Dict[str, Any], row: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                'key': key,
+                'revenue': round(row['revenue'], 2),
+                'orders': row['orders'],
+                'refund_rate': round(row['refunded_orders'] / row['paid_orders'], 4) if row['paid_orders'] else 0.0,
+                'average_order_value': round(row['revenue'] / row['orders'], 2) if row['orders'] else 0.0,
+            }
+
+        empty = {'revenue': 0.0, 'orders': 0, 'paid_orders': 0, 'refunded_orders': 0}
+        result = {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'total': metrics_row({}, totals['total'].get((), empty)),
+            'groups': {},
+        }
+        for group in groups:
+            name = ':'.join(group)
+            ranked = sorted(totals[name].items(), key=lambda item: item[1]['revenue'], reverse=True)[:limit]
+            result['groups'][name] = [
+                metrics_row({d: v if v is not None else 'Unknown' for d, v in zip(group, values)}, row)
+                for values, row in ranked
+            ]
+        return result
+
+    def _keyed_rows(self, rows: List[Dict[str, Any]], group: Sequence[str]) -> Dict[tuple, Dict[str, Any]]:
+        """Facet rows keyed by their dimension values (missing and '' both unattributed), summing collisions."""
+        keyed: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = tuple(row['_id'].get(d) or None for d in group)
+            self._add_totals(keyed, {key: {k: v for k, v in row.items() if k != '_id'}})
+        return keyed
+
+    async def get_daily_revenue(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        granularity: str = 'day',
+        tz: str = 'UTC'
+    ) -> List[Dict]:
+        """
+        Revenue and orders per bucket, zero-filled, oldest first (default:
+        days of the last 90 days). `granularity` is hour/day/week/month in
+        timezone `tz`, which also applies to naive bounds; weeks start on
+        Monday. Buckets are labelled by their start (`day`): YYYY-MM-DD, or
+        an ISO timestamp with offset for hours. Archived history is kept per
+        UTC day, so each archived day counts toward the bucket holding that
+        date's local midnight. A window without any revenue falls back to the
+        full available date range, like get_top_products.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}' (choose from {', '.join(GRANULARITIES)})")
+        zone = _zone(tz)
+        end_date = _parse_bound(end, zone, upper=True) or datetime.now(timezone.utc)
+        start_date = _parse_bound(start, zone) or end_date - timedelta(days=90)
+
+        import pandas as pd
+        from services.time_buckets import bucket_labels, bucket_range, bucket_starts, localize
+
+        buckets = bucket_range(start_date, end_date, granularity, tz)
+        if len(buckets) > MAX_SERIES_BUCKETS:
+            raise ValueError(f"{len(buckets)} {granularity} buckets requested; narrow the range or use a coarser granularity")
+
+        rows, archived = await self._bucket_rows(start_date, end_date, granularity, tz)
+        # If nothing was found in the requested window, fall back to the full available
+        # date range so charts don't appear empty
+        if not rows and not archived:
+            span = await self._revenue_span()
+            if span is not None:
+                wide = bucket_range(*span, granularity, tz)
+                if len(wide) <= MAX_SERIES_BUCKETS:
+                    buckets = wide
+                    rows, archived = await self._bucket_rows(*span, granularity, tz)
+
+        frames = []
+        if rows:
+            frames.append(pd.DataFrame(
+                {'revenue': [row['revenue'] for row in rows], 'orders': [row['orders'] for row in rows]},
+                index=pd.DatetimeIndex([row['_id'] for row in rows]).tz_localize('UTC')
+            ))
+        if archived:
+            midnights = localize(pd.DatetimeIndex(list(archived)), tz)
+            frames.append(pd.DataFrame(
+                {'revenue': [row['revenue'] for row in archived.values()],
+                 'orders': [row['orders'] for row in archived.values()]},
+                index=bucket_starts(midnights, granularity, tz).tz_convert('UTC')
+            ))
+        totals = pd.concat(frames).groupby(level=0).sum() if frames \
+            else pd.DataFrame({'revenue': [], 'orders': []}, dtype=float)
+        totals = totals.reindex(buckets.tz_convert('UTC'), fill_value=0)
+
+        return [
+            {'day': label, 'revenue': float(revenue), 'orders': int(orders)}
+            for label, revenue, orders in zip(bucket_labels(buckets, granularity), totals['revenue'].tolist(), totals['orders'].tolist())
+        ]
+
+    async def _bucket_rows(
+        self, start_date: datetime, end_date: datetime, granularity: str, tz: str
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Hot revenue per bucket start, and archived revenue per UTC day, in [start_date, end_date]."""
+        # UTC days group like the dashboard pass; anything else is truncated by the database
+        utc_days = granularity == 'day' and tz == 'UTC'
+        pipeline = self._daily_pipeline(start_date, end_date) if utc_days \
+            else self._buckets_pipeline(start_date, end_date, granularity, tz)
+        with profiling.span('daily.aggregate'):
+            rows = await self.collection.aggregate(pipeline).to_list(length=None)
+        archived = await self.archive.daily(start_date, end_date) if self.archive else {}
+        return rows, archived
+
+    async def _revenue_span(self) -> Optional[Tuple[datetime, datetime]]:
+        """First and last revenue_date of revenue-bearing rows, hot or archived (None when there are none)."""
+        bounds: List[datetime] = []
+        for direction in (1, -1):
+            rows = await self.collection.find(self._revenue_match(None, None), {'revenue_date': 1}).sort(
+                [('revenue_date', direction), ('_id', direction)]
+            ).limit(1).to_list(length=1)
+            # Stored naive UTC
+            bounds += [row['revenue_date'].replace(tzinfo=timezone.utc) for row in rows]
+        if self.archive:
+            days = list(await self.archive.daily(None, None))
+            if days:
+                bounds += [_parse_bound(min(days)), _parse_bound(max(days), upper=True)]
+        return (min(bounds), max(bounds)) if bounds else None
+
+    def _fill_days(self, daily_data: Dict[str, Dict[str, Any]], start_date: datetime, end_date: datetime) -> List[Dict]:
+        """Fill in missing days with zero revenue."""
+        first = start_date.date()
+        days = [(first + timedelta(days=i)).isoformat() for i in range((end_date.date() - first).days + 1)]
+        return [
             {
-                "$match": {
-                    "paid_date": {"$gte": year_start},
-                    "status": {"$in": ["completed", "refunded", "pending", ""]}
-                }
-            },
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(length=1)
-        ytd_revenue = ytd_result[0]['total'] if ytd_result else 0.0
-        
-        # Calculate Revenue Health Index (0-100)
-        rhi = await self._calculate_rhi()
-        
-        # Get top products
-        top_products = await self.get_top_products(30)
-        
-        # Get recent anomalies
-        anomalies = await self.detect_anomalies(90)
-        recent_anomalies = sorted(anomalies, key=lambda x: x['day'], reverse=True)[:5]
-        
-        return {
-            "today": round(today_revenue, 2),
-            "mtd": round(mtd_revenue, 2),
-            "ytd": round(ytd_revenue, 2),
-            "rhi": round(rhi, 1),
-            "top_products": top_products,
-            "anomalies": recent_anomalies,
-            "narrative": ""  # Will be filled by narrative service
+                'day': day,
+                'revenue': float(daily_data[day]['revenue']) if day in daily_data else 0.0,
+                'orders': daily_data[day]['orders'] if day in daily_data else 0
+            }
+            for day in days
+        ]
+    
+    async def get_revenue_summary(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get comprehensive revenue summary (without narrative).
+        `end` anchors today/MTD/YTD (default: now); `start` sets the window
+        used for top products and anomalies (default: 30 and 90 days).
+        """
+        intermediate = await self._get_intermediate(start, end)
+        return (await self._build_sections(intermediate, {'summary'}))['summary']
+
+    async def get_dashboard(
+        self,
+        sections: Sequence[str] = DASHBOARD_SECTIONS,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        transactions_limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Several dashboard sections from one aggregation pass.
+        Period semantics match get_revenue_summary; `daily` covers
+        [start, end] (default: last 90 days) and `anomalies` the summary's
+        lookback. `transactions` is the latest page (a separate indexed find).
+        """
+        intermediate = await self._get_intermediate(start, end)
+        result = await self._build_sections(intermediate, set(sections))
+        if 'transactions' in sections:
+            result['transactions'] = await self.get_transactions(transactions_limit, 0)
+        return result
+
+    async def _get_intermediate(self, start: Optional[str], end: Optional[str]) -> Dict[str, Any]:
+        """
+        Per-day, per-product and RHI aggregates for a period, cached per
+        period and dataset version for SUMMARY_CACHE_TTL_SECONDS.
+        """
+        version = await self.versions.current() if self.versions else None
+        key = (version, start, end)
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < SUMMARY_CACHE_TTL_SECONDS:
+            metrics.CACHE_REQUESTS.inc(cache='dashboard', result='hit')
+            return cached[1]
+
+        metrics.CACHE_REQUESTS.inc(cache='dashboard', result='miss')
+        epoch = self._write_epoch
+        with metrics.CACHE_FILL_SECONDS.time(cache='dashboard'):
+            intermediate = await self._compute_intermediate(_parse_bound(start), _parse_bound(end, upper=True))
+        if self._writes_in_flight or epoch != self._write_epoch:
+            return intermediate
+        if any(k[0] != version for k in self._cache):
+            self._cache = {k: v for k, v in self._cache.items() if k[0] == version}
+        self._cache[key] = (time.monotonic(), intermediate)
+        return intermediate
+
+    def begin_write(self) -> None:
+        """Rows are about to be inserted; pair with finish_write()."""
+        self._writes_in_flight += 1
+        self._write_epoch += 1
+
+    def finish_write(self, docs: List[Dict[str, Any]], version: Optional[int]) -> None:
+        """
+        Fold the rows that were written into the cached aggregates instead of
+        dropping them, and re-key the entries under the new dataset `version`.
+        Only entries of the version just superseded are kept: anything older
+        means another worker wrote too. Without a version the cache is dropped.
+        """
+        self._writes_in_flight -= 1
+        self._write_epoch += 1
+        if not docs:
+            return
+        if version is None:
+            self._cache.clear()
+            return
+        updated = {}
+        for (cached_version, start, end), (computed_at, intermediate) in self._cache.items():
+            if cached_version != version - 1:
+                continue
+            for doc in docs:
+                self._fold_transaction(intermediate, doc)
+            updated[(version, start, end)] = (computed_at, intermediate)
+        self._cache = updated
+
+    def _dashboard_period(self, start_date: Optional[datetime], end_date: Optional[datetime]) -> Dict[str, Any]:
+        """Every window boundary the dashboard sections use, as naive UTC datetimes."""
+        now = (end_date or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+        start = start_date.astimezone(timezone.utc).replace(tzinfo=None) if start_date else None
+        window_days = max(1, (now - start).days) if start else None
+        rhi_start = now - timedelta(days=30)
+        period = {
+            "now": now,
+            "until": now if end_date else None,
+            "today_start": now.replace(hour=0, minute=0, second=0, microsecond=0),
+            "month_start": now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+            "year_start": now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0),
+            "daily_start": start or now - timedelta(days=90),
+            "product_start": now - timedelta(days=window_days or 30),
+            "anomaly_start": now - timedelta(days=max(7, window_days or 90)),
+            "rhi_start": rhi_start,
+            "rhi_mid": rhi_start + timedelta(days=15),
         }
+        # Whole days, so per-day buckets are never partial
+        period["since"] = min(
+            period[k] for k in ("year_start", "daily_start", "product_start", "anomaly_start", "rhi_start")
+        ).replace(hour=0, minute=0, second=0, microsecond=0)
+        return period
+
+    async def _compute_intermediate(self, start_date: Optional[datetime], end_date: Optional[datetime]) -> Dict[str, Any]:
+        period = self._dashboard_period(start_date, end_date)
+        with profiling.span('dashboard.aggregate'):
+            rows = await self.collection.aggregate(self._dashboard_pipeline(period)).to_list(length=1)
+        facets = rows[0] if rows else {}
+        intermediate = {
+            "period": period,
+            "days": {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']} for row in facets.get('days', [])},
+            "products": {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']}
+                         for row in facets.get('products', [])},
+            "rhi": {row['_id']: {k: v for k, v in row.items() if k != '_id'} for row in facets.get('rhi', [])},
+        }
+        archived = await self.archive.intermediate(period) if self.archive else None
+        if archived:
+            self._add_totals(intermediate['days'], archived['days'])
+            self._add_totals(intermediate['products'], archived['products'])
+            self._add_totals(intermediate['rhi'], archived['rhi'])
+        return intermediate
+
+    def _add_totals(self, totals: Dict[Any, Dict[str, Any]], more: Dict[Any, Dict[str, Any]]) -> None:
+        """Sum per-key counters from another tier into `totals` (in place)."""
+        for key, counters in more.items():
+            row = totals.get(key)
+            if row is None:
+                totals[key] = dict(counters)
+                continue
+            for field, value in counters.items():
+                row[field] = row.get(field, 0) + value
+
+    def _fold_transaction(self, intermediate: Dict[str, Any], doc: Dict[str, Any]) -> None:
+        """Add one transaction to an intermediate, mirroring the facet matches."""
+        period = intermediate['period']
+        revenue_date = doc.get('revenue_date')
+        if not isinstance(revenue_date, datetime) or revenue_date < period['since']:
+            return
+        # Periods relative to now (no explicit end) keep accepting new rows
+        if period['until'] is not None and revenue_date > period['now']:
+            return
+        amount = base_amount(doc)
+        status = doc.get('status')
+
+        if status in REVENUE_STATUSES:
+            day = intermediate['days'].setdefault(revenue_date.strftime('%Y-%m-%d'), {'revenue': 0.0, 'orders': 0})
+            day['revenue'] += amount
+            day['orders'] += 1
+            if revenue_date >= period['product_start']:
+                product = intermediate['products'].setdefault(doc.get('product_id'), {'revenue': 0.0, 'orders': 0})
+                product['revenue'] += amount
+                product['orders'] += 1
+
+        paid_at = doc.get('paid_at')
+        if isinstance(paid_at, str) and paid_at and revenue_date >= period['rhi_start']:
+            half = intermediate['rhi'].setdefault(revenue_date < period['rhi_mid'], {
+                'orders': 0, 'completed_orders': 0, 'completed_revenue': 0.0, 'refunded_orders': 0
+            })
+            half['orders'] += 1
+            if status == 'completed':
+                half['completed_orders'] += 1
+                half['completed_revenue'] += amount
+            if doc.get('refunded') is True:
+                half['refunded_orders'] += 1
+
+    # ------------------ Offline ------------------
+    # services/offline_service.py builds dashboards from exported files: rows
+    # are folded with the twin that keeps cached dashboards current, partial
+    # results are merged, and the sections come from _build_sections as here.
+
+    def offline_intermediate(self, start: Optional[str], end: str) -> Dict[str, Any]:
+        """
+        An empty intermediate for the dashboard period of [start, end]
+        (`end` is required: nothing is scored live). It also covers the
+        anomaly baseline's warm-up and keeps all-time product totals, so
+        building its sections never queries.
+        """
+        period = self._dashboard_period(_parse_bound(start), _parse_bound(end, upper=True))
+        warmup_start = period['anomaly_start'] - timedelta(days=warmup_days(self.anomalies.config))
+        period['since'] = min(period['since'], warmup_start.replace(hour=0, minute=0, second=0, microsecond=0))
+        return {'period': period, 'days': {}, 'products': {}, 'rhi': {}, 'all_products': {}}
+
+    def fold_offline(self, intermediate: Dict[str, Any], docs: List[Dict[str, Any]]) -> None:
+        """Add transactions to an offline intermediate (in place)."""
+        all_products = intermediate['all_products']
+        for doc in docs:
+            self._fold_transaction(intermediate, doc)
+            # _top_products(None, None): every revenue row, whatever its date
+            if doc.get('status') in REVENUE_STATUSES and isinstance(doc.get('revenue_date'), datetime):
+                product = all_products.setdefault(doc.get('product_id'), {'revenue': 0.0, 'orders': 0})
+                product['revenue'] += base_amount(doc)
+                product['orders'] += 1
+
+    def merge_offline(self, intermediate: Dict[str, Any], other: Dict[str, Any]) -> None:
+        """Add another offline intermediate of the same period (e.g. another file's) into `intermediate`."""
+        for key in ('days', 'products', 'rhi', 'all_products'):
+            self._add_totals(intermediate[key], other[key])
+
+    async def offline_sections(self, intermediate: Dict[str, Any],
+                               sections: Sequence[str] = ('summary', 'daily', 'products', 'anomalies')) -> Dict[str, Any]:
+        """Dashboard sections of an offline intermediate (no `transactions`: there is no collection to page)."""
+        return await self._build_sections(intermediate, set(sections) - {'transactions'})
+
+    async def _build_sections(self, intermediate: Dict[str, Any], sections: Set[str]) -> Dict[str, Any]:
+        period = intermediate['period']
+        daily_data = intermediate['days']
+        result: Dict[str, Any] = {}
+
+        if sections & {'summary', 'products'}:
+            products = self._ranked(intermediate['products'])
+            # If nothing was found in the window, fall back to all transactions
+            if not products:
+                products = (self._ranked(intermediate['all_products']) if 'all_products' in intermediate
+                            else await self._top_products(None, None))
+            top_products = self._format_products(products)
+            if 'products' in sections:
+                result['products'] = top_products
+
+        if sections & {'summary', 'anomalies'}:
+            anomalies = await self._detect_anomalies(
+                (period['now'] - period['anomaly_start']).days, period['now'],
+                live=period['until'] is None, known=daily_data, known_since=period['since']
+            )
+            if 'anomalies' in sections:
+                result['anomalies'] = anomalies
+
+        if 'daily' in sections:
+            result['daily'] = self._fill_days(daily_data, period['daily_start'], period['now'])
+
+        if 'summary' in sections:
+            def revenue_since(day_start: datetime) -> float:
+                first_day = day_start.strftime('%Y-%m-%d')
+                return sum(row['revenue'] for day, row in daily_data.items() if day >= first_day)
+
+            result['summary'] = {
+                "today": round(revenue_since(period['today_start']), 2),
+                "mtd": round(revenue_since(period['month_start']), 2),
+                "ytd": round(revenue_since(period['year_start']), 2),
+                "rhi": round(self._calculate_rhi(intermediate['rhi']), 1),
+                "top_products": top_products,
+                "anomalies": sorted(anomalies, key=lambda x: x['day'], reverse=True)[:5],
+                "narrative": None  # Filled by the narrative service on request
+            }
+        return result
     
-    async def _calculate_rhi(self) -> float:
+    def _calculate_rhi(self, by_half: Dict[bool, Dict[str, Any]]) -> float:
         """
         Calculate Revenue Health Index (0-100) based on multiple factors:
         - Revenue trend (40%)
         - Order completion rate (30%)
         - Refund rate (30%)
+        `by_half` holds counts for paid orders of the last 30 days, keyed by
+        whether they fall in the first 15 days.
         """
-        # Get last 30 days data
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
+        first, second = by_half.get(True), by_half.get(False)
         
         # Revenue trend (compare first 15 days vs last 15 days)
-        mid_date = start_date + timedelta(days=15)
-        
-        first_half = await self.collection.aggregate([
-            {
-                "$addFields": {
-                    "paid_date": {"$dateFromString": {"dateString": "$paid_at", "onError": None}}
-                }
-            },
-            {
-                "$match": {
-                    "paid_date": {"$gte": start_date, "$lt": mid_date},
-                    "status": "completed"
-                }
-            },
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(length=1)
-        first_revenue = first_half[0]['total'] if first_half else 1.0
-        
-        second_half = await self.collection.aggregate([
-            {
-                "$addFields": {
-                    "paid_date": {"$dateFromString": {"dateString": "$paid_at", "onError": None}}
-                }
-            },
-            {
-                "$match": {
-                    "paid_date": {"$gte": mid_date, "$lte": end_date},
-                    "status": "completed"
-                }
-            },
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(length=1)
-        second_revenue = second_half[0]['total'] if second_half else 1.0
+        first_revenue = first['completed_revenue'] if first and first['completed_orders'] else 1.0
+        second_revenue = second['completed_revenue'] if second and second['completed_orders'] else 1.0
         
         # Calculate trend score (0-100)
         if first_revenue > 0:
@@ -321,35 +729,12 @@ class AnalyticsService:
             trend_score = 50.0
         
         # Completion rate
-        all_orders = await self.collection.count_documents({
-            "$expr": {
-                "$and": [
-                    {"$gte": [{"$dateFromString": {"dateString": "$paid_at", "onError": None}}, start_date]},
-                    {"$lte": [{"$dateFromString": {"dateString": "$paid_at", "onError": None}}, end_date]}
-                ]
-            }
-        })
-        completed_orders = await self.collection.count_documents({
-            "status": "completed",
-            "$expr": {
-                "$and": [
-                    {"$gte": [{"$dateFromString": {"dateString": "$paid_at", "onError": None}}, start_date]},
-                    {"$lte": [{"$dateFromString": {"dateString": "$paid_at", "onError": None}}, end_date]}
-                ]
-            }
-        })
+        all_orders = sum(half['orders'] for half in by_half.values())
+        completed_orders = sum(half['completed_orders'] for half in by_half.values())
+        refunded_count = sum(half['refunded_orders'] for half in by_half.values())
         completion_rate = (completed_orders / all_orders * 100) if all_orders > 0 else 80.0
         
         # Refund rate (lower is better)
-        refunded_count = await self.collection.count_documents({
-            "refunded": True,
-            "$expr": {
-                "$and": [
-                    {"$gte": [{"$dateFromString": {"dateString": "$paid_at", "onError": None}}, start_date]},
-                    {"$lte": [{"$dateFromString": {"dateString": "$paid_at", "onError": None}}, end_date]}
-                ]
-            }
-        })
         refund_rate = (refunded_count / all_orders * 100) if all_orders > 0 else 0.0
         refund_score = max(0, 100 - (refund_rate * 10))  # Penalize high refund rates
         
@@ -357,184 +742,354 @@ class AnalyticsService:
         rhi = (trend_score * 0.4) + (completion_rate * 0.3) + (refund_score * 0.3)
         return min(100, max(0, rhi))
     
-    async def get_top_products(self, days: int = 30) -> List[Dict]:
+    async def get_top_products(self, days: int = 30, as_of: Optional[datetime] = None) -> List[Dict]:
         """
         Get top products by revenue.
         """
-        from datetime import datetime, timedelta, timezone
-        
-        end_date = datetime.now(timezone.utc)
+        end_date = as_of or datetime.now(timezone.utc)
         start_date = end_date - timedelta(days=days)
         
-        print(f"[DEBUG] get_top_products: Looking for products from {start_date} to {end_date}")
-        
-        # Fetch all transactions (simple approach)
-        cursor = self.collection.find()
-        transactions = await cursor.to_list(length=None)
-        
-        print(f"[DEBUG] Total transactions in DB: {len(transactions)}")
-        
-        # Process in Python for robustness
-        product_data = {}
-        count_in_range = 0
-        
-        for tx in transactions:
-            try:
-                # Try to parse paid_at, fall back to created_at
-                date_str = tx.get('paid_at') or tx.get('created_at')
-                if not date_str:
-                    continue
-                
-                # Parse ISO format date string
-                if isinstance(date_str, str):
-                    date_str = date_str.replace('Z', '+00:00')
-                    try:
-                        tx_date = datetime.fromisoformat(date_str)
-                        # Ensure timezone-aware
-                        if tx_date.tzinfo is None:
-                            tx_date = tx_date.replace(tzinfo=timezone.utc)
-                    except Exception as e:
-                        print(f"[DEBUG] Failed to parse date: {date_str}, error: {e}")
-                        continue
-                else:
-                    tx_date = date_str
-                    # Ensure timezone-aware
-                    if isinstance(tx_date, datetime) and tx_date.tzinfo is None:
-                        tx_date = tx_date.replace(tzinfo=timezone.utc)
-                
-                # Check if in range
-                if tx_date < start_date or tx_date > end_date:
-                    continue
-                
-                # Only count completed/refunded transactions
-                status = tx.get('status', '')
-                if status not in ['completed', 'refunded', 'pending', '']:
-                    continue
-                
-                product_id = tx.get('product_id', 'Unknown')
-                if product_id not in product_data:
-                    product_data[product_id] = {'revenue': 0.0, 'orders': 0}
-                
-                product_data[product_id]['revenue'] += float(tx.get('amount', 0))
-                product_data[product_id]['orders'] += 1
-                count_in_range += 1
-            except Exception as e:
-                print(f"[DEBUG] Error processing transaction: {e}")
-                continue
-        
-        print(f"[DEBUG] Transactions in range ({days} days): {count_in_range}")
-        print(f"[DEBUG] Products found: {len(product_data)}")
+        products = await self._top_products(start_date, end_date)
         
-        # Sort by revenue and get top 10
         # If nothing was found in the requested date range, fall back to all transactions
-        if count_in_range == 0 and transactions:
-            product_data = {}
-            for tx in transactions:
-                try:
-                    # Try to parse paid_at, fall back to created_at
-                    date_str = tx.get('paid_at') or tx.get('created_at')
-                    if not date_str:
-                        continue
-
-                    if isinstance(date_str, str):
-                        date_str = date_str.replace('Z', '+00:00')
-                        try:
-                            tx_date = datetime.fromisoformat(date_str)
-                            # Ensure timezone-aware
-                            if tx_date.tzinfo is None:
-                                tx_date = tx_date.replace(tzinfo=timezone.utc)
-                        except:
-                            continue
-                    else:
-                        tx_date = date_str
-                        # Ensure timezone-aware
-                        if isinstance(tx_date, datetime) and tx_date.tzinfo is None:
-                            tx_date = tx_date.replace(tzinfo=timezone.utc)
-
-                    status = tx.get('status', '')
-                    if status not in ['completed', 'refunded', 'pending', '']:
-                        continue
-
-                    product_id = tx.get('product_id', 'Unknown')
-                    if product_id not in product_data:
-                        product_data[product_id] = {'revenue': 0.0, 'orders': 0}
-
-                    product_data[product_id]['revenue'] += float(tx.get('amount', 0))
-                    product_data[product_id]['orders'] += 1
-                except Exception:
-                    continue
-
-        sorted_products = sorted(
-            product_data.items(),
-            key=lambda x: x[1]['revenue'],
-            reverse=True
-        )[:10]
-        
-        print(f"[DEBUG] Top products (top 10): {len(sorted_products)}")
-        for pid, data in sorted_products:
-            print(f"  - {pid}: ${data['revenue']:.2f} ({data['orders']} orders)")
+        if not products:
+            products = await self._top_products(None, None)
         
+        return self._format_products(products)
+
+    async def _top_products(self, since: Optional[datetime], until: Optional[datetime]) -> List[Dict[str, Any]]:
+        """Top 10 products in [since, until]; across both tiers when the window reaches archived rows."""
+        if not (self.archive and await self.archive.covers(since)):
+            return await self.collection.aggregate(
+                self._top_products_pipeline(self._revenue_match(since, until))
+            ).to_list(length=10)
+        hot = await self.collection.aggregate(
+            self._top_products_pipeline(self._revenue_match(since, until), limit=PRODUCT_CANDIDATES)
+        ).to_list(length=None)
+        totals = {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']} for row in hot}
+        archived = await self.archive.products(since, until)
+        self._add_totals(totals, {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']} for row in archived})
+        return self._ranked(totals)
+
+    def _ranked(self, totals: Dict[Any, Dict[str, Any]], limit: int = 10) -> List[Dict[str, Any]]:
+        """The `limit` products with the most revenue, as pipeline rows (`_id` is the product)."""
+        return sorted(
+            ({'_id': product_id, **row} for product_id, row in totals.items()),
+            key=lambda row: row['revenue'],
+            reverse=True
+        )[:limit]
+
+    def _format_products(self, products: List[Dict[str, Any]]) -> List[Dict]:
         result = []
-        for product_id, data in sorted_products:
+        for data in products:
+            product_id = data['_id'] if data['_id'] is not None else 'Unknown'
             result.append({
                 'product_id': product_id,
                 'name': product_id,  # Using product_id as name
-                'revenue': data['revenue'],
+                'revenue': float(data['revenue']),
                 'orders': data['orders'],
                 'category': 'Product'
             })
         
-        print(f"[DEBUG] Returning {len(result)} products")
         return result
-    
-    async def detect_anomalies(self, lookback_days: int = 90) -> List[Dict]:
+
+    # ------------------ Query shapes ------------------
+    # Every query this service issues is built here so the index
+    # bootstrap (services/index_service.py) can explain() the same shapes.
+
+    def _revenue_match(
+        self,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        inclusive: bool = True,
+        statuses: List[Optional[str]] = REVENUE_STATUSES,
+    ) -> Dict[str, Any]:
+        """Match revenue-bearing transactions whose revenue_date falls in [since, until]."""
+        date_range: Dict[str, Any] = {"$type": "date"}
+        if since is not None:
+            date_range["$gte"] = since
+        if until is not None:
+            date_range["$lte" if inclusive else "$lt"] = until
+        return {"revenue_date": date_range, "status": {"$in": statuses}}
+
+    def _paid_match(
+        self,
+        since: datetime,
+        until: datetime,
+        inclusive: bool = True,
+        status: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Like _revenue_match but only for transactions that carry a paid_at timestamp."""
+        match = self._revenue_match(since, until, inclusive)
+        if status:
+            match["status"] = status
+        else:
+            del match["status"]
+        match["paid_at"] = {"$type": "string", "$ne": ""}
+        return match
+
+    def _dashboard_pipeline(self, period: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
-        Detect revenue anomalies using z-score method.
-        Returns days with |z-score| > 2.5
+        One indexed range scan over revenue_date feeding a $facet per
+        intermediate: per-day revenue (today/MTD/YTD, daily, anomalies),
+        per-product totals for the window and the RHI counts.
         """
-        # Get daily revenue for the period
-        daily_revenue = await self.get_daily_revenue(
-            start=(datetime.utcnow() - timedelta(days=lookback_days)).isoformat(),
-            end=datetime.utcnow().isoformat()
+        date_range = self._revenue_match(period["since"], period["until"])["revenue_date"]
+        return [
+            {"$match": {"revenue_date": date_range}},
+            {
+                "$facet": {
+                    "days": self._daily_pipeline(None, None),
+                    # Bounded so the facet document stays far below 16MB on huge catalogs
+                    "products": self._top_products_pipeline(
+                        self._revenue_match(period["product_start"], period["now"]), limit=PRODUCT_CANDIDATES
+                    ),
+                    "rhi": [
+                        {"$match": self._paid_match(period["rhi_start"], period["now"])},
+                        {
+                            "$group": {
+                                "_id": {"$lt": ["$revenue_date", period["rhi_mid"]]},
+                                "orders": {"$sum": 1},
+                                "completed_orders": {
+                                    "$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}
+                                },
+                                "completed_revenue": {
+                                    "$sum": {"$cond": [{"$eq": ["$status", "completed"]}, AMOUNT_BASE_EXPR, 0]}
+                                },
+                                "refunded_orders": {"$sum": {"$cond": [{"$eq": ["$refunded", True]}, 1, 0]}},
+                            }
+                        },
+                    ],
+                }
+            },
+        ]
+    def _daily_pipeline(self, since: Optional[datetime], until: Optional[datetime]) -> List[Dict[str, Any]]:
+        return [
+            {"$match": self._revenue_match(since, until)},
+            {
+                "$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$revenue_date"}},
+                    "revenue": {"$sum": AMOUNT_BASE_EXPR},
+                    "orders": {"$sum": 1},
+                }
+            },
+        ]
+
+    def _series_pipeline(self, since: datetime, until: datetime, dimensions: Sequence[str]) -> List[Dict[str, Any]]:
+        return [{"$match": self._revenue_match(since, until)}] + series_group_stages(
+            dimensions,
+            {"$dateToString": {"format": "%Y-%m-%d", "date": "$revenue_date"}},
+            AMOUNT_BASE_EXPR
         )
-        
-        if len(daily_revenue) < 7:  # Need at least 7 days for meaningful analysis
-            return []
-        
-        # Extract revenue values
-        revenues = [day['revenue'] for day in daily_revenue]
-        
-        # Calculate rolling statistics
-        mean = np.mean(revenues)
-        std = np.std(revenues)
-        
-        if std == 0:  # No variance in data
-            return []
-        
-        # Calculate z-scores
-        anomalies = []
-        for day_data in daily_revenue:
-            z_score = (day_data['revenue'] - mean) / std
-            
-            if abs(z_score) > 2.5:
-                # Determine possible causes based on heuristics
-                possible_causes = self._get_anomaly_causes(
-                    day_data['revenue'],
-                    mean,
-                    z_score > 0,
-                    day_data['day']
-                )
-                
-                anomalies.append({
-                    "day": day_data['day'],
-                    "revenue": round(day_data['revenue'], 2),
-                    "z": round(z_score, 2),
-                    "direction": "spike" if z_score > 0 else "drop",
-                    "possible_causes": possible_causes
-                })
-        
+
+    def _breakdown_pipeline(
+        self,
+        since: datetime,
+        until: datetime,
+        groups: Sequence[Sequence[str]],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        One indexed date range scan feeding a $facet per group (and the
+        total). revenue/orders follow _revenue_match, the refund counts
+        follow _paid_match (like the dashboard's RHI facet).
+        """
+        is_revenue = {"$in": [{"$ifNull": ["$status", None]}, REVENUE_STATUSES]}
+        is_paid = {"$and": [{"$eq": [{"$type": "$paid_at"}, "string"]}, {"$ne": ["$paid_at", ""]}]}
+        accumulators = {
+            "revenue": {"$sum": {"$cond": [is_revenue, AMOUNT_BASE_EXPR, 0]}},
+            "orders": {"$sum": {"$cond": [is_revenue, 1, 0]}},
+            "paid_orders": {"$sum": {"$cond": [is_paid, 1, 0]}},
+            "refunded_orders": {"$sum": {"$cond": [{"$and": [is_paid, {"$eq": ["$refunded", True]}]}, 1, 0]}},
+        }
+        facets = {"total": [{"$group": {"_id": {}, **accumulators}}]}
+        for group in groups:
+            facets[":".join(group)] = [
+                {"$group": {"_id": {d: f"${d}" for d in group}, **accumulators}},
+                {"$sort": {"revenue": -1}},
+                {"$limit": limit},
+            ]
+        date_range = self._revenue_match(since, until)["revenue_date"]
+        return [{"$match": {"revenue_date": date_range}}, {"$facet": facets}]
+
+    def _buckets_pipeline(self, since: datetime, until: datetime, granularity: str, tz: str) -> List[Dict[str, Any]]:
+        """Revenue per `granularity` bucket in `tz`, keyed by the bucket's start instant."""
+        trunc: Dict[str, Any] = {"date": "$revenue_date", "unit": granularity, "timezone": tz}
+        if granularity == 'week':
+            trunc["startOfWeek"] = "monday"
+        return [
+            {"$match": self._revenue_match(since, until)},
+            {"$group": {"_id": {"$dateTrunc": trunc}, "revenue": {"$sum": AMOUNT_BASE_EXPR}, "orders": {"$sum": 1}}},
+        ]
+
+    def _top_products_pipeline(self, match: Dict[str, Any], limit: int = 10) -> List[Dict[str, Any]]:
+        return [
+            {"$match": match},
+            {"$group": {"_id": "$product_id", "revenue": {"$sum": AMOUNT_BASE_EXPR}, "orders": {"$sum": 1}}},
+            {"$sort": {"revenue": -1}},
+            {"$limit": limit},
+        ]
+
+    def query_shapes(self) -> List[Dict[str, Any]]:
+        """Representative queries for plan verification (kind: find/aggregate/count)."""
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=90)
+        return [
+            {"name": "get_transactions", "kind": "find", "filter": {}, "sort": [("created_at", -1)], "limit": 100},
+            {"name": "get_transaction", "kind": "find", "filter": {"order_id": "ORD-0"}, "limit": 1},
+            {"name": "get_daily_revenue", "kind": "aggregate", "pipeline": self._daily_pipeline(start, end)},
+            {"name": "get_top_products", "kind": "aggregate",
+             "pipeline": self._top_products_pipeline(self._revenue_match(start, end))},
+            {"name": "dashboard", "kind": "aggregate",
+             "pipeline": self._dashboard_pipeline(self._dashboard_period(None, None))},
+            {"name": "revenue_by_month", "kind": "aggregate",
+             "pipeline": self._buckets_pipeline(start, end, "month", "America/New_York")},
+            {"name": "breakdown", "kind": "aggregate",
+             "pipeline": self._breakdown_pipeline(start, end, [("channel",), ("channel", "region")], 50)},
+            {"name": "series_anomalies", "kind": "aggregate",
+             "pipeline": self._series_pipeline(start, end, SERIES_DIMENSIONS)},
+        ] + [
+            shape
+            for name, filters, sort in (
+                ("date", {"status": "refunded", "channel": "web"}, "date"),
+                ("amount", {"min_amount": 100}, "amount"),
+                ("order_prefix", {"order_id": "ORD-12"}, "date"),
+                ("user", {"user_id": "U-1001", "start": start.isoformat()}, "date"),
+                ("product", {"product_id": "P-1", "region": "EU"}, "amount"),
+                ("products", {"product_id": ["P-1", "P-2"]}, "date"),
+                ("campaign", {"attribution_campaign": "spring", "min_amount": 100}, "amount"),
+                ("date_range_by_amount", {"start": start.isoformat(), "end": end.isoformat()}, "amount"),
+                ("product_amounts_by_date", {"product_id": "P-1", "max_amount": 20}, "date"),
+            )
+            for query, index, sort_field, bound in [self._search_query(filters, sort)]
+            # bounded_sort: may sort in memory, after the count below allowed it
+            for shape in [
+                {"name": f"search_{name}", "kind": "find", "filter": query, "hint": index,
+                 "sort": [(sort_field, -1), ("_id", -1)], "limit": 51, "bounded_sort": bound is not None},
+            ] + ([{"name": f"search_{name}_bound", "kind": "count", "filter": bound, "hint": index}] if bound else [])
+        ]
+    
+    async def detect_anomalies(self, lookback_days: int = 90, as_of: Optional[datetime] = None) -> List[Dict]:
+        """
+        Detect revenue anomalies: days whose z-score against their baseline
+        (see services/anomaly_service.py) exceeds ANOMALY_Z_THRESHOLD.
+        """
+        now = (as_of or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+        return await self._detect_anomalies(lookback_days, now, live=as_of is None)
+
+    async def _detect_anomalies(
+        self,
+        lookback_days: int,
+        now: datetime,
+        live: bool,
+        known: Optional[Dict[str, Dict[str, Any]]] = None,
+        known_since: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Score the revenue series; `known` is per-day totals already
+        aggregated from `known_since` to `now` (the dashboard pass), used
+        instead of a query when the requested days fall inside it.
+        """
+        async def load(first: date, last: date) -> Dict[str, float]:
+            first_dt = datetime.combine(first, datetime.min.time())
+            last_dt = min(datetime.combine(last, datetime.max.time()), now)
+            if known is not None and first_dt >= known_since:
+                days = self._fill_days(known, first_dt, last_dt)
+            else:
+                days = await self.get_daily_revenue(first_dt.isoformat(), last_dt.isoformat())
+            return {row['day']: row['revenue'] for row in days}
+
+        anomalies = await self.anomalies.detect('revenue', lookback_days, now, load, live=live)
+        for anomaly in anomalies:
+            anomaly['possible_causes'] = self._get_anomaly_causes(
+                anomaly['revenue'],
+                anomaly['expected'],
+                anomaly['direction'] == 'spike',
+                anomaly['day']
+            )
         return anomalies
     
+    async def detect_series_anomalies(
+        self,
+        dimensions: Sequence[str] = SERIES_DIMENSIONS,
+        lookback_days: int = 30,
+        limit: int = 20,
+        as_of: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        The most anomalous (series, day) pairs over the last `lookback_days`
+        days, where a series is one value of a dimension (a product, a
+        channel, a region). One aggregation returns every series' daily
+        revenue; the (series x day) matrix is then scored at once against
+        the same baseline as detect_anomalies.
+        """
+        from services.baselines import top_anomalies
+
+        unknown = [dimension for dimension in dimensions if dimension not in SERIES_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s) {', '.join(unknown)} (choose from {', '.join(SERIES_DIMENSIONS)})")
+        config = self.anomalies.config
+        now = (as_of or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        warmup = warmup_days(config)
+        since = today - timedelta(days=lookback_days + warmup)
+
+        with profiling.span('series.aggregate'):
+            series, matrix = await self.series_matrix(dimensions, since, now)
+
+        with profiling.span('series.score'):
+            columns = matrix.shape[1]
+            found = top_anomalies(matrix, config, columns - lookback_days - 1, limit, partial_last=as_of is None)
+
+        return [
+            {
+                'dimension': series[hit['row']][0],
+                'value': series[hit['row']][1] if series[hit['row']][1] is not None else 'Unknown',
+                'day': (since + timedelta(days=hit['column'])).strftime('%Y-%m-%d'),
+                'revenue': round(hit['revenue'], 2),
+                'expected': round(hit['expected'], 2),
+                'z': round(hit['z'], 2),
+                'direction': 'spike' if hit['z'] > 0 else 'drop',
+            }
+            for hit in found
+        ]
+
+    async def series_matrix(self, dimensions: Sequence[str], since: datetime,
+                            until: datetime) -> Tuple[List[Tuple[str, Any]], Any]:
+        """
+        Daily revenue of every value of each dimension over the UTC days
+        from `since` (a day start) to `until`: the (dimension, value) keys
+        and a (series x day) NumPy matrix, both tiers added together. One
+        aggregation returns every series.
+        """
+        import numpy as np
+
+        rows = await self.collection.aggregate(self._series_pipeline(since, until, dimensions)).to_list(length=None)
+        if self.archive:
+            rows += await self.archive.series(since, until, dimensions)
+
+        index: Dict[Tuple[str, Any], int] = {}
+        row_ids, day_lists, revenue_lists = [], [], []
+        for row in rows:
+            key = (row['_id']['d'], row['_id'].get('v'))
+            row_ids.append(index.setdefault(key, len(index)))
+            day_lists.append(row['days'])
+            revenue_lists.append(row['revenue'])
+        matrix = np.zeros((len(index), (until.date() - since.date()).days + 1))
+        if index:
+            lengths = [len(days) for days in day_lists]
+            day_offsets = (
+                np.array([day for days in day_lists for day in days], dtype='datetime64[D]')
+                - np.datetime64(since.date(), 'D')
+            ).astype(int)
+            # Tiers may both hold a day of a series: add rather than assign
+            np.add.at(
+                matrix,
+                (np.repeat(row_ids, lengths), day_offsets),
+                np.array([value for values in revenue_lists for value in values], dtype=float)
+            )
+        return list(index), matrix
+
     def _get_anomaly_causes(self, revenue: float, mean: float, is_spike: bool, day: str) -> List[str]:
         """
         Generate possible causes for anomalies based on heuristics.
@@ -0,0 +1,282 @@
+"""
+Revenue anomalies: each day scored against a rolling, EWMA or same-weekday
+baseline of the days before it (ANOMALY_BASELINE), kept as running state per series.
+"""
+import logging
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BASELINES = ('rolling', 'ewma', 'seasonal')
+ANOMALY_BASELINE = os.environ.get('ANOMALY_BASELINE', 'seasonal')
+ANOMALY_WINDOW_DAYS = int(os.environ.get('ANOMALY_WINDOW_DAYS', '28'))
+ANOMALY_EWMA_ALPHA = float(os.environ.get('ANOMALY_EWMA_ALPHA', '0.1'))
+ANOMALY_SEASONAL_WEEKS = int(os.environ.get('ANOMALY_SEASONAL_WEEKS', '8'))
+ANOMALY_Z_THRESHOLD = float(os.environ.get('ANOMALY_Z_THRESHOLD', '2.5'))
+# Observations a baseline needs before it scores (days; same-weekday weeks for `seasonal`)
+ANOMALY_MIN_PERIODS = {'rolling': 7, 'ewma': 7, 'seasonal': 3}
+# Scored days kept in the state (the longest lookback the API accepts)
+ANOMALY_HISTORY_DAYS = 365
+# Relative difference tolerated when checking folded totals against fresh ones
+AGREEMENT_TOLERANCE = 1e-6
+
+# load(first_day, last_day) -> {YYYY-MM-DD: revenue} for those days (inclusive)
+DailyLoader = Callable[[date, date], Awaitable[Dict[str, float]]]
+
+
+def baseline_config(method: Optional[str] = None) -> Dict[str, Any]:
+    method = method or ANOMALY_BASELINE
+    if method not in BASELINES:
+        raise ValueError(f"Unknown ANOMALY_BASELINE '{method}' (choose from {', '.join(BASELINES)})")
+    config: Dict[str, Any] = {'method': method, 'min_periods': ANOMALY_MIN_PERIODS[method]}
+    if method == 'rolling':
+        config['window'] = ANOMALY_WINDOW_DAYS
+    elif method == 'ewma':
+        config['alpha'] = ANOMALY_EWMA_ALPHA
+    else:
+        config['weeks'] = ANOMALY_SEASONAL_WEEKS
+    return config
+
+
+def warmup_days(config: Dict[str, Any]) -> int:
+    """Days of history loaded ahead of a window so its first day already has a baseline."""
+    if config['method'] == 'rolling':
+        return config['window']
+    if config['method'] == 'seasonal':
+        return config['weeks'] * 7
+    # Weight left beyond 4/alpha days is below e^-4
+    return math.ceil(4 / config['alpha'])
+
+
+class SeriesState:
+    """
+    Running baseline of one daily series, folded a day at a time. `history`
+    holds [day, revenue, mean, std, count] for folded days (newest last,
+    capped at ANOMALY_HISTORY_DAYS); `since` is the first day it covers.
+    """
+
+    def __init__(self, config: Dict[str, Any], since: str):
+        self.config = config
+        self.since = since
+        self.through: Optional[str] = None
+        self.started = False  # a sale has been seen
+        self.history: List[List[Any]] = []
+        if config['method'] == 'ewma':
+            self.moments = {'mean': 0.0, 'var': 0.0, 'count': 0}
+        else:
+            # One ring for rolling, one per weekday (Monday=0) for seasonal
+            self.rings = [{'values': [], 'sum': 0.0, 'sumsq': 0.0}
+                          for _ in range(1 if config['method'] == 'rolling' else 7)]
+
+    def _ring(self, day: str) -> Dict[str, Any]:
+        return self.rings[0] if len(self.rings) == 1 else self.rings[date.fromisoformat(day).weekday()]
+
+    def expect(self, day: str) -> List[Any]:
+        """[mean, std, count] of the baseline `day` is scored against."""
+        if self.config['method'] == 'ewma':
+            m = self.moments
+            return [m['mean'], math.sqrt(max(m['var'], 0.0)), m['count']]
+        ring = self._ring(day)
+        n = len(ring['values'])
+        if not n:
+            return [0.0, 0.0, 0]
+        mean = ring['sum'] / n
+        return [mean, math.sqrt(max(ring['sumsq'] / n - mean * mean, 0.0)), n]
+
+    def fold(self, day: str, revenue: float) -> None:
+        """Score `day` against the current baseline, then add it (O(1))."""
+        self.history.append([day, revenue, *self.expect(day)])
+        if len(self.history) > ANOMALY_HISTORY_DAYS:
+            del self.history[0]
+            self.since = self.history[0][0]
+        self.through = day
+        self.started = self.started or revenue != 0
+        if not self.started:
+            return
+        if self.config['method'] == 'ewma':
+            m, alpha = self.moments, self.config['alpha']
+            if m['count'] == 0:
+                m['mean'], m['var'] = revenue, 0.0
+            else:
+                delta = revenue - m['mean']
+                m['mean'] += alpha * delta
+                m['var'] = (1 - alpha) * (m['var'] + alpha * delta * delta)
+            m['count'] += 1
+            return
+        ring = self._ring(day)
+        ring['values'].append(revenue)
+        ring['sum'] += revenue
+        ring['sumsq'] += revenue * revenue
+        limit = self.config['window'] if self.config['method'] == 'rolling' else self.config['weeks']
+        if len(ring['values']) > limit:
+            oldest = ring['values'].pop(0)
+            ring['sum'] -= oldest
+            ring['sumsq'] -= oldest * oldest
+
+    @classmethod
+    def build(cls, config: Dict[str, Any], since: date, through: date, daily: Dict[str, float]) -> 'SeriesState':
+        """State after folding [since, through] from `daily`, computed in one vectorized pass."""
+        from services.baselines import baselines
+
+        days = _day_range(since, through)
+        state = cls(config, days[0] if days else since.isoformat())
+        if not days:
+            return state
+        values = [daily.get(day, 0.0) for day in days]
+        mean, std, count = (a[0].tolist() for a in baselines(values, config))
+        state.history = [[day, value, m, s, int(n)] for day, value, m, s, n in zip(days, values, mean, std, count)]
+        if len(state.history) > ANOMALY_HISTORY_DAYS:
+            state.history = state.history[-ANOMALY_HISTORY_DAYS:]
+            state.since = state.history[0][0]
+        state.through = days[-1]
+        state.started = any(values)
+        if not state.started:
+            return state
+        first = next(i for i, value in enumerate(values) if value)
+        observed = list(zip(days[first:], values[first:]))
+        if config['method'] == 'ewma':
+            # Final moments: the baseline of the day after `through`
+            final = baselines(values + [0.0], config)
+            state.moments = {'mean': float(final[0][0, -1]), 'var': float(final[1][0, -1]) ** 2,
+                             'count': len(observed)}
+            return state
+        limit = config['window'] if config['method'] == 'rolling' else config['weeks']
+        for ring in state.rings:
+            ring['values'] = []
+        for day, value in observed:
+            state._ring(day)['values'].append(value)
+        for ring in state.rings:
+            ring['values'] = ring['values'][-limit:]
+            ring['sum'] = math.fsum(ring['values'])
+            ring['sumsq'] = math.fsum(v * v for v in ring['values'])
+        return state
+
+    def agrees(self, daily: Dict[str, float], first_day: str) -> bool:
+        """Whether folded revenue from `first_day` on still matches `daily`."""
+        for day, revenue, *_ in self.history:
+            if day >= first_day and day in daily:
+                fresh = daily[day]
+                if abs(fresh - revenue) > AGREEMENT_TOLERANCE * max(1.0, abs(fresh)):
+                    return False
+        return True
+
+    def to_doc(self) -> Dict[str, Any]:
+        doc = {'config': self.config, 'since': self.since, 'through': self.through,
+               'started': self.started, 'history': self.history}
+        if self.config['method'] == 'ewma':
+            doc['moments'] = self.moments
+        else:
+            doc['rings'] = self.rings
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> 'SeriesState':
+        state = cls(doc['config'], doc['since'])
+        state.through = doc.get('through')
+        state.started = doc.get('started', False)
+        state.history = doc.get('history', [])
+        if 'moments' in doc:
+            state.moments = doc['moments']
+        if 'rings' in doc:
+            state.rings = doc['rings']
+        return state
+
+
+def _day_range(first: date, last: date) -> List[str]:
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+
+def flag(day: str, revenue: float, mean: float, std: float, count: int, config: Dict[str, Any],
+         threshold: float = ANOMALY_Z_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """An anomaly dict for a day whose |z| exceeds the threshold, else None."""
+    if count < config['min_periods'] or std <= 1e-9 * max(1.0, abs(mean)):
+        return None
+    z = (revenue - mean) / std
+    if abs(z) <= threshold:
+        return None
+    return {
+        'day': day,
+        'revenue': round(revenue, 2),
+        'expected': round(mean, 2),
+        'z': round(z, 2),
+        'direction': 'spike' if z > 0 else 'drop',
+    }
+
+
+class AnomalyService:
+    def __init__(self, db, method: Optional[str] = None):
+        # None offline (no db): only batch detection (live=False), which stores nothing
+        self.collection = db.anomaly_state if db is not None else None
+        self.config = baseline_config(method)
+        # series -> state; the persisted copy lets restarts and other workers skip the rebuild
+        self._states: Dict[str, SeriesState] = {}
+
+    async def detect(self, series: str, lookback_days: int, now: datetime, load: DailyLoader,
+                     live: bool = True) -> List[Dict[str, Any]]:
+        """
+        Anomalies of `series` over the `lookback_days` days before `now`'s
+        day, plus `now`'s own day. Completed days come from the running
+        state (only days completed since the last call are folded in); the
+        current, still partial day is scored against it but not folded, and
+        only flagged as a spike (a partial day always looks low). With
+        `live=False` (a past `now`) everything is computed in one batch pass
+        and nothing is stored.
+        """
+        today = now.date()
+        start = today - timedelta(days=lookback_days)
+        yesterday = today - timedelta(days=1)
+        recent = await load(start, today)
+
+        state = await self._state(series) if live else None
+        changed = False
+        if state is None or not self._usable(state, start, recent):
+            since = start - timedelta(days=warmup_days(self.config))
+            daily = {**await load(since, start - timedelta(days=1)), **recent}
+            state = SeriesState.build(self.config, since, yesterday, daily)
+            changed = True
+            if live:
+                logger.info(f"Rebuilt {self.config['method']} anomaly baseline for {series} from {since}")
+        else:
+            for day in _day_range(date.fromisoformat(state.through) + timedelta(days=1), yesterday):
+                state.fold(day, recent.get(day, 0.0))
+                changed = True
+
+        if live:
+            self._states[series] = state
+            if changed:
+                await self.collection.replace_one({'_id': series}, {'_id': series, **state.to_doc()}, upsert=True)
+
+        first_day = start.isoformat()
+        anomalies = [
+            anomaly for day, revenue, mean, std, count in state.history if day >= first_day
+            for anomaly in [flag(day, revenue, mean, std, count, self.config)] if anomaly
+        ]
+        current = today.isoformat()
+        partial = flag(current, recent.get(current, 0.0), *state.expect(current), self.config)
+        if partial and partial['direction'] == 'spike':
+            anomalies.append(partial)
+        return anomalies
+
+    def _usable(self, state: SeriesState, start: date, recent: Dict[str, float]) -> bool:
+        """Whether `state` can be advanced to today instead of rebuilt."""
+        if state.config != self.config or state.through is None:
+            return False
+        # Its scores must cover the window, and the days to fold must all be in `recent`
+        if state.since > start.isoformat() or state.through < (start - timedelta(days=1)).isoformat():
+            return False
+        return state.agrees(recent, start.isoformat())
+
+    async def _state(self, series: str) -> Optional[SeriesState]:
+        state = self._states.get(series)
+        if state is None:
+            doc = await self.collection.find_one({'_id': series})
+            state = SeriesState.from_doc(doc) if doc else None
+        return state
+
+    async def clear(self) -> None:
+        """Drop every series' state (after the dataset is cleared)."""
+        self._states.clear()
+        await self.collection.delete_many({})
@@ -0,0 +1,506 @@
+"""
+Hot/cold tiering for transactions.
+
+`compact()` moves raw transactions whose revenue_date is older than
+ARCHIVE_AFTER_DAYS (rounded down to a month start) out of the transactions
+collection into cold storage, and folds them into `transaction_summaries`:
+one document per month x product_id x channel x region holding per-day
+counters (`days.<YYYY-MM-DD>.<measure>`), i.e. everything the analytics
+aggregations need from a raw row.
+
+Every row lives in exactly one tier, so a query over any window is the hot
+aggregate plus the summary aggregate for the same window, and historical
+totals stay exact. Archived rows resolve to whole UTC days: a window bound
+inside an archived day includes that day.
+
+Cold storage (ARCHIVE_SINK):
+- `collection` (default): raw rows in `transactions_archive`
+- `parquet`: one file per month and batch under ARCHIVE_DIR (needs pyarrow),
+  plus `archived_orders` mapping each order_id to its month(s), so a lookup
+  by order_id reads one month instead of scanning every file
+
+With TRANSACTIONS_STORAGE=timeseries, deleting the moved rows needs MongoDB 7.0+.
+Run it from cron; it is resumable and bumps the dataset version:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=revenue python -m services.archive_service --compact
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import metrics
+from services.analytics_service import PRODUCT_CANDIDATES, REVENUE_STATUSES, series_group_stages
+from services.fx_service import apply_amount_base, base_amount
+from services.storage_service import transactions_collection
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '730'))
+ARCHIVE_SINKS = ('collection', 'parquet')
+ARCHIVE_SINK = os.environ.get('ARCHIVE_SINK', 'collection')
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', Path(__file__).resolve().parent.parent / 'archive'))
+# Rows moved per step; each step is written, summarized and deleted before the next
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '20000'))
+
+ARCHIVE_COLLECTION = 'transactions_archive'
+SUMMARY_COLLECTION = 'transaction_summaries'
+# order_id -> month of the parquet sink's rows
+ORDER_INDEX_COLLECTION = 'archived_orders'
+# Progress document in dataset_meta (next to the dataset version)
+STATE_DOC_ID = 'archive'
+
+SERIES_FIELDS = ('product_id', 'channel', 'region')
+MEASURES = ('rows', 'revenue', 'orders', 'paid_orders', 'completed_orders', 'completed_revenue', 'refunded_orders')
+
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+
+class ArchiveError(RuntimeError):
+    """Raised for an unusable archive configuration."""
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return _month_start(month + timedelta(days=32))
+
+
+def _day(value: datetime) -> str:
+    return _naive_utc(value).strftime('%Y-%m-%d')
+
+
+def summarize(docs: Iterable[Dict[str, Any]]) -> Dict[tuple, Dict[str, Dict[str, float]]]:
+    """
+    Per-day counters for raw rows, keyed by (month, product_id, channel, region).
+    revenue/orders follow AnalyticsService._revenue_match and the paid/completed/
+    refunded counts its _paid_match (the RHI inputs).
+    """
+    summaries: Dict[tuple, Dict[str, Dict[str, float]]] = {}
+    for doc in docs:
+        revenue_date = doc['revenue_date']
+        key = (_month_start(revenue_date),) + tuple(doc.get(field) for field in SERIES_FIELDS)
+        day = summaries.setdefault(key, {}).setdefault(revenue_date.strftime('%Y-%m-%d'), dict.fromkeys(MEASURES, 0))
+        amount = base_amount(doc)
+        status = doc.get('status')
+        day['rows'] += 1
+        if status in REVENUE_STATUSES:
+            day['revenue'] += amount
+            day['orders'] += 1
+        paid_at = doc.get('paid_at')
+        if isinstance(paid_at, str) and paid_at:
+            day['paid_orders'] += 1
+            if status == 'completed':
+                day['completed_orders'] += 1
+                day['completed_revenue'] += amount
+            if doc.get('refunded') is True:
+                day['refunded_orders'] += 1
+    return summaries
+
+
+async def _insert_new(collection, docs: List[Dict[str, Any]]) -> None:
+    """Insert `docs`, skipping those a unique index already holds (an interrupted run wrote them)."""
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+
+
+class _CollectionSink:
+    def __init__(self, db):
+        self.collection = db[ARCHIVE_COLLECTION]
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_indexes([
+            IndexModel([('order_id', 1)], name='order_id_1'),
+            IndexModel([('revenue_date', 1)], name='revenue_date_1'),
+        ])
+
+    async def write(self, docs: List[Dict[str, Any]]) -> None:
+        """Insert by _id; rows already archived by an interrupted run are skipped."""
+        await _insert_new(self.collection, docs)
+
+    async def read_month(self, month: datetime) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({'revenue_date': {'$gte': month, '$lt': _next_month(month)}})
+        return await cursor.to_list(length=None)
+
+    async def find(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({'order_id': order_id})
+
+    async def clear(self) -> None:
+        await self.collection.delete_many({})
+
+
+class _ParquetSink:
+    """
+    Files ARCHIVE_DIR/YYYY-MM/part-<uuid>.parquet; reads dedupe on _id (re-runs
+    may rewrite rows). `orders` maps each order_id to the months holding it.
+    """
+
+    collection = None
+
+    def __init__(self, root: Path, db):
+        if not PARQUET_AVAILABLE:
+            raise ArchiveError("ARCHIVE_SINK=parquet needs pyarrow (pip install pyarrow)")
+        self.root = root
+        self.orders = db[ORDER_INDEX_COLLECTION]
+
+    async def ensure_indexes(self) -> None:
+        await self.orders.create_index([('order_id', 1), ('month', 1)], unique=True, name='order_id_1_month_1')
+        if not await self.orders.find_one({}, {'_id': 1}):
+            # Archives written before the order index existed
+            for month in sorted(path.name for path in self.root.glob('????-??') if path.is_dir()):
+                order_ids = await asyncio.to_thread(self._order_ids, self.root / month)
+                if order_ids:
+                    await _insert_new(self.orders, [{'order_id': order_id, 'month': month} for order_id in order_ids])
+                    logger.info(f"Indexed {len(order_ids)} archived order ids of {month}")
+
+    async def write(self, docs: List[Dict[str, Any]]) -> None:
+        months = await asyncio.to_thread(self._write, docs)
+        # Indexed before the rows leave the hot collection, so lookups never miss them
+        entries = {
+            (doc['order_id'], month) for doc, month in zip(docs, months) if isinstance(doc.get('order_id'), str)
+        }
+        if entries:
+            await _insert_new(self.orders, [{'order_id': order_id, 'month': month} for order_id, month in entries])
+
+    def _write(self, docs: List[Dict[str, Any]]) -> List[str]:
+        """Write `docs` into their months' directories; returns each doc's month."""
+        import pandas as pd
+
+        frame = pd.DataFrame([{**doc, '_id': str(doc['_id'])} for doc in docs]).drop(columns=['meta'], errors='ignore')
+        months = frame['revenue_date'].dt.strftime('%Y-%m')
+        for month, rows in frame.groupby(months):
+            directory = self.root / month
+            directory.mkdir(parents=True, exist_ok=True)
+            rows.to_parquet(directory / f'part-{uuid.uuid4().hex}.parquet', index=False)
+        return months.tolist()
+
+    async def read_month(self, month: datetime) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, self.root / month.strftime('%Y-%m'))
+
+    def _read(self, path: Path, filters=None) -> List[Dict[str, Any]]:
+        import pandas as pd
+
+        if not path.exists() or not any(path.rglob('*.parquet')):
+            return []
+        frame = pd.read_parquet(path, filters=filters).drop_duplicates('_id')
+        return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+    def _order_ids(self, path: Path) -> List[str]:
+        import pandas as pd
+
+        if not any(path.rglob('*.parquet')):
+            return []
+        return pd.read_parquet(path, columns=['order_id'])['order_id'].dropna().unique().tolist()
+
+    async def find(self, order_id: str) -> Optional[Dict[str, Any]]:
+        # Unknown ids (typos, plain 404s) stop at the index
+        for month in sorted(await self.orders.distinct('month', {'order_id': order_id})):
+            rows = await asyncio.to_thread(self._read, self.root / month, [('order_id', '==', order_id)])
+            if rows:
+                return rows[0]
+        return None
+
+    async def clear(self) -> None:
+        import shutil
+
+        await asyncio.to_thread(shutil.rmtree, self.root, True)
+        await self.orders.delete_many({})
+
+
+class ArchiveService:
+    """
+    Moves old transactions to cold storage and answers the archived part of
+    analytics queries from the monthly summaries (see module docstring).
+    """
+
+    INDEXES = [
+        [("month", 1), ("product_id", 1), ("channel", 1), ("region", 1)],
+    ]
+
+    def __init__(self, db, sink: str = ARCHIVE_SINK):
+        if sink not in ARCHIVE_SINKS:
+            raise ArchiveError(f"Unknown ARCHIVE_SINK '{sink}' (choose from {', '.join(ARCHIVE_SINKS)})")
+        self.db = db
+        self.hot = transactions_collection(db)
+        self.summaries = db[SUMMARY_COLLECTION]
+        self.state = db.dataset_meta
+        self.sink = _CollectionSink(db) if sink == 'collection' else _ParquetSink(ARCHIVE_DIR, db)
+
+    # ------------------ Compaction ------------------
+
+    async def archived_until(self) -> Optional[datetime]:
+        """Upper bound (exclusive) of archived revenue_date, or None if nothing was archived."""
+        doc = await self.state.find_one({'_id': STATE_DOC_ID}, {'archived_until': 1})
+        return doc.get('archived_until') if doc else None
+
+    async def compact(self, now: Optional[datetime] = None, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                      batch_size: int = ARCHIVE_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        Archive every hot row with revenue_date before the cutoff month.
+        Each batch is written to the sink, marked pending, folded into the
+        summaries and deleted from the hot collection; a batch interrupted
+        half-way is repaired on the next run by rebuilding its months from
+        the sink. Late rows landing before an earlier cutoff are picked up too.
+        """
+        if older_than_days < 1:
+            raise ArchiveError("older_than_days must be at least 1")
+        started = time.perf_counter()
+        now = _naive_utc(now or datetime.now(timezone.utc))
+        cutoff = _month_start(now - timedelta(days=older_than_days))
+        await self.summaries.create_index(
+            list(self.INDEXES[0]), unique=True, name='month_1_product_id_1_channel_1_region_1'
+        )
+        await self.sink.ensure_indexes()
+
+        state = await self.state.find_one({'_id': STATE_DOC_ID}) or {}
+        if state.get('pending'):
+            await self._recover(state['pending'])
+        # Published before rows move, so readers consult the summaries for every row that left
+        if not state.get('archived_until') or state['archived_until'] < cutoff:
+            await self._set_state({'archived_until': cutoff})
+
+        archived = 0
+        while True:
+            batch = await self.hot.find(
+                {'revenue_date': {'$lt': cutoff, '$type': 'date'}}
+            ).sort('revenue_date', 1).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                break
+            months = sorted({_month_start(doc['revenue_date']) for doc in batch})
+            await self._set_state({'pending': months})
+            await self.sink.write(batch)
+            await self._apply(summarize(batch))
+            await self.hot.delete_many({'_id': {'$in': [doc['_id'] for doc in batch]}})
+            await self._set_state({'pending': []})
+            archived += len(batch)
+            metrics.ARCHIVE_ROWS.inc(len(batch))
+            logger.info(f"Archived {archived} transactions before {cutoff:%Y-%m-%d}")
+
+        return {
+            'cutoff': cutoff.isoformat(),
+            'archived': archived,
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+
+    async def rebuild_summaries(self, months: List[datetime]) -> None:
+        """Recompute the summaries of `months` from the rows in cold storage (at current FX rates)."""
+        for month in months:
+            docs = await self.sink.read_month(month)
+            apply_amount_base(docs)
+            await self.summaries.delete_many({'month': month})
+            await self._apply(summarize(docs))
+
+    async def clear(self) -> None:
+        """Drop archived rows, summaries and progress (used by clear-all)."""
+        await self.sink.clear()
+        await self.summaries.delete_many({})
+        await self.state.delete_one({'_id': STATE_DOC_ID})
+
+    async def _recover(self, months: List[datetime]) -> None:
+        logger.warning(f"Repairing interrupted archive batch for months {[f'{m:%Y-%m}' for m in months]}")
+        archived_until = await self.archived_until()
+        for month in months:
+            # Rows still hot that were (or were about to be) archived
+            stranded = await self.hot.find(
+                {'revenue_date': {'$gte': month, '$lt': min(_next_month(month), archived_until)}}
+            ).to_list(length=None)
+            if stranded:
+                await self.sink.write(stranded)
+                await self.hot.delete_many({'_id': {'$in': [doc['_id'] for doc in stranded]}})
+        await self.rebuild_summaries(months)
+        await self._set_state({'pending': []})
+
+    async def _apply(self, summaries: Dict[tuple, Dict[str, Dict[str, float]]]) -> None:
+        if not summaries:
+            return
+        operations = []
+        for (month, *series), days in summaries.items():
+            increments = {
+                f'days.{day}.{measure}': value
+                for day, counters in days.items() for measure, value in counters.items()
+            }
+            operations.append(UpdateOne(
+                {'month': month, **dict(zip(SERIES_FIELDS, series))}, {'$inc': increments}, upsert=True
+            ))
+        await self.summaries.bulk_write(operations, ordered=False)
+
+    async def _set_state(self, fields: Dict[str, Any]) -> None:
+        await self.state.update_one(
+            {'_id': STATE_DOC_ID},
+            {'$set': {**fields, 'updated_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    # ------------------ Reads ------------------
+
+    async def covers(self, since: Optional[datetime]) -> bool:
+        """Whether a window starting at `since` (None: all time) reaches archived rows."""
+        archived_until = await self.archived_until()
+        if archived_until is None:
+            return False
+        return since is None or _naive_utc(since) < archived_until
+
+    async def find(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return await self.sink.find(order_id)
+
+    async def daily(self, since: Optional[datetime], until: Optional[datetime]) -> Dict[str, Dict[str, Any]]:
+        """Archived revenue/orders per day in [since, until], like AnalyticsService._daily_pipeline."""
+        if not await self.covers(since):
+            return {}
+        rows = await self.summaries.aggregate(
+            self._days_pipeline(since, until) + self._group_days()
+        ).to_list(length=None)
+        return {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']} for row in rows}
+
+    async def products(self, since: Optional[datetime], until: Optional[datetime],
+                       limit: int = PRODUCT_CANDIDATES) -> List[Dict[str, Any]]:
+        """Archived revenue/orders per product in [since, until], highest revenue first."""
+        if not await self.covers(since):
+            return []
+        return await self.summaries.aggregate(
+            self._days_pipeline(since, until) + self._group_products(limit)
+        ).to_list(length=limit)
+
+    async def series(self, since: Optional[datetime], until: Optional[datetime],
+                     dimensions: Iterable[str]) -> List[Dict[str, Any]]:
+        """Archived daily revenue per dimension value, like AnalyticsService._series_pipeline."""
+        if not await self.covers(since):
+            return []
+        return await self.summaries.aggregate(
+            self._days_pipeline(since, until) + series_group_stages(dimensions, '$day.k', '$day.v.revenue')
+        ).to_list(length=None)
+
+    async def breakdown(self, since: Optional[datetime], until: Optional[datetime],
+                        groups: List[tuple], limit: int = PRODUCT_CANDIDATES) -> Dict[str, List[Dict[str, Any]]]:
+        """Archived share of AnalyticsService.get_breakdown: rows per group name (and `total`)."""
+        if not await self.covers(since):
+            return {}
+        accumulators = {
+            measure: {'$sum': f'$day.v.{measure}'} for measure in ('revenue', 'orders', 'paid_orders', 'refunded_orders')
+        }
+        facets = {'total': [{'$group': {'_id': {}, **accumulators}}]}
+        for group in groups:
+            facets[':'.join(group)] = [
+                {'$group': {'_id': {d: f'${d}' for d in group}, **accumulators}},
+                {'$sort': {'revenue': -1}},
+                {'$limit': limit},
+            ]
+        rows = await self.summaries.aggregate(
+            self._days_pipeline(since, until) + [{'$facet': facets}]
+        ).to_list(length=1)
+        return rows[0] if rows else {}
+
+    async def intermediate(self, period: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The archived share of AnalyticsService._compute_intermediate for `period`, or None."""
+        if not await self.covers(period['since']):
+            return None
+        rhi_start, rhi_mid = _day(period['rhi_start']), _day(period['rhi_mid'])
+        pipeline = self._days_pipeline(period['since'], period['until']) + [{
+            '$facet': {
+                'days': self._group_days(),
+                'products': [{'$match': {'day.k': {'$gte': _day(period['product_start'])}}}]
+                + self._group_products(PRODUCT_CANDIDATES),
+                'rhi': [
+                    {'$match': {'day.k': {'$gte': rhi_start}}},
+                    {
+                        '$group': {
+                            '_id': {'$lt': ['$day.k', rhi_mid]},
+                            'orders': {'$sum': '$day.v.paid_orders'},
+                            'completed_orders': {'$sum': '$day.v.completed_orders'},
+                            'completed_revenue': {'$sum': '$day.v.completed_revenue'},
+                            'refunded_orders': {'$sum': '$day.v.refunded_orders'},
+                        }
+                    },
+                ],
+            }
+        }]
+        rows = await self.summaries.aggregate(pipeline).to_list(length=1)
+        facets = rows[0] if rows else {}
+        return {
+            'days': {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']} for row in facets.get('days', [])},
+            'products': {row['_id']: {'revenue': row['revenue'], 'orders': row['orders']}
+                         for row in facets.get('products', [])},
+            'rhi': {row['_id']: {k: v for k, v in row.items() if k != '_id'} for row in facets.get('rhi', [])},
+        }
+
+    def _days_pipeline(self, since: Optional[datetime], until: Optional[datetime]) -> List[Dict[str, Any]]:
+        """Summary days (as `day.k` / `day.v`) in [since, until], pruned by month first."""
+        month_range: Dict[str, Any] = {}
+        day_range: Dict[str, Any] = {}
+        if since is not None:
+            month_range['$gte'] = _month_start(_naive_utc(since))
+            day_range['$gte'] = _day(since)
+        if until is not None:
+            month_range['$lte'] = _naive_utc(until)
+            day_range['$lte'] = _day(until)
+        pipeline: List[Dict[str, Any]] = [{'$match': {'month': month_range}}] if month_range else []
+        pipeline += [
+            {'$project': {**dict.fromkeys(SERIES_FIELDS, 1), 'day': {'$objectToArray': '$days'}}},
+            {'$unwind': '$day'},
+        ]
+        if day_range:
+            pipeline.append({'$match': {'day.k': day_range}})
+        return pipeline
+
+    def _group_days(self) -> List[Dict[str, Any]]:
+        return [{'$group': {'_id': '$day.k', 'revenue': {'$sum': '$day.v.revenue'}, 'orders': {'$sum': '$day.v.orders'}}}]
+
+    def _group_products(self, limit: int) -> List[Dict[str, Any]]:
+        return [
+            {'$group': {'_id': '$product_id', 'revenue': {'$sum': '$day.v.revenue'}, 'orders': {'$sum': '$day.v.orders'}}},
+            {'$match': {'orders': {'$gt': 0}}},
+            {'$sort': {'revenue': -1}},
+            {'$limit': limit},
+        ]
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from services.version_service import VersionService
+
+    parser = argparse.ArgumentParser(description='Move old transactions to cold storage and summarize them.')
+    parser.add_argument('--compact', action='store_true', required=True)
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def _main() -> int:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        try:
+            result = await ArchiveService(db).compact(older_than_days=args.older_than_days, batch_size=args.batch_size)
+            if result['archived']:
+                # Rows left the hot collection behind the API's back
+                await VersionService(db).bump()
+            print(json.dumps(result, indent=2))
+        except ArchiveError as e:
+            print(str(e))
+            return 1
+        finally:
+            client.close()
+        return 0
+
+    raise SystemExit(asyncio.run(_main()))
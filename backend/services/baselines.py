@@ -0,0 +1,106 @@
+"""
+Vectorized anomaly baselines over a (series x day) revenue matrix (see anomaly_service).
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+from services.anomaly_service import ANOMALY_Z_THRESHOLD
+
+
+def baselines(values, config: Dict[str, Any]):
+    """
+    Baseline of every day from the days before it, for a (series x day)
+    matrix of consecutive days of revenue. Leading zeros of a row
+    (before its first sale) are not observations. Returns numpy arrays
+    (mean, std, count) shaped like `values`.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    observed = np.cumsum(values != 0, axis=1) > 0
+    method = config['method']
+    if method == 'ewma':
+        mean, var, count = _ewma(values, observed, config['alpha'])
+    elif method == 'rolling':
+        mean, var, count = _rolling(values, observed, config['window'])
+    else:
+        # Every 7th column is the same weekday
+        mean, var, count = _rolling(values, observed, config['weeks'], step=7)
+    return mean, np.sqrt(np.clip(var, 0, None)), count
+
+
+def top_anomalies(values, config: Dict[str, Any], first_column: int, limit: int,
+                  threshold: float = ANOMALY_Z_THRESHOLD, partial_last: bool = True) -> List[Dict[str, Any]]:
+    """
+    The `limit` (row, column) cells of a (series x day) revenue matrix with
+    the largest |z| beyond `threshold`, among columns from `first_column`
+    on; earlier columns only warm the baselines up. With `partial_last` the
+    last column (the day in progress) only counts spikes. Returns dicts of
+    row, column, revenue, expected (baseline mean) and z, highest |z| first.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    mean, std, count = (a[:, first_column:] for a in baselines(values, config))
+    window = values[:, first_column:]
+    scorable = (count >= config['min_periods']) & (std > 1e-9 * np.maximum(1.0, np.abs(mean)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(scorable, (window - mean) / std, 0.0)
+    if partial_last and z.shape[1]:
+        z[:, -1] = np.clip(z[:, -1], 0, None)
+    magnitude = np.abs(z).ravel()
+    candidates = np.flatnonzero(magnitude > threshold)
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-magnitude[candidates], limit - 1)[:limit]]
+    candidates = candidates[np.argsort(-magnitude[candidates], kind='stable')]
+    rows, columns = np.unravel_index(candidates, z.shape)
+    return [
+        {'row': int(row), 'column': int(column) + first_column, 'revenue': float(window[row, column]),
+         'expected': float(mean[row, column]), 'z': float(z[row, column])}
+        for row, column in zip(rows, columns)
+    ]
+
+
+def _rolling(values, observed, window: int, step: int = 1):
+    """
+    Mean/variance of the previous `window` observed columns `step` apart
+    (step 7: the same weekday), from running sums over every row at once.
+    """
+    x = np.where(observed, values, 0.0)
+    rows, columns = x.shape
+    blocks = -(-columns // step)
+
+    def previous(a):
+        # Columns as (block, offset): block b sums blocks [b - window, b) of its offset
+        totals = np.zeros((rows, blocks + 1, step))
+        totals.reshape(rows, -1)[:, step:step + columns] = a
+        np.cumsum(totals, axis=1, out=totals)
+        out = totals[:, :blocks].copy()
+        if blocks > window:
+            out[:, window:] -= totals[:, :blocks - window]
+        return out.reshape(rows, -1)[:, :columns]
+
+    n = previous(observed)
+    mean = np.divide(previous(x), n, out=np.zeros_like(x), where=n > 0)
+    var = np.divide(previous(x * x), n, out=np.zeros_like(x), where=n > 0) - mean * mean
+    return mean, var, n
+
+
+def _ewma(values, observed, alpha: float):
+    """
+    EWMA mean/variance before each column, with SeriesState's recursion
+    m += a*d, v = (1-a)*(v + a*d^2) where d = x - m: one vectorized step per
+    day across every series.
+    """
+    # Day-major copies so each step reads and writes contiguous rows
+    x, seen_today = np.ascontiguousarray(values.T), np.ascontiguousarray(observed.T)
+    mean, var = np.zeros_like(x), np.zeros_like(x)
+    m, v = np.zeros(x.shape[1]), np.zeros(x.shape[1])
+    seen = np.zeros(x.shape[1], dtype=bool)
+    for day in range(x.shape[0]):
+        mean[day], var[day] = m, v
+        obs = seen_today[day]
+        delta = x[day] - m
+        # The first observation starts the mean at itself and the variance at zero
+        m = np.where(obs & ~seen, x[day], np.where(obs, m + alpha * delta, m))
+        v = np.where(obs & seen, (1 - alpha) * (v + alpha * delta * delta), v)
+        seen |= obs
+    count = np.cumsum(observed, axis=1) - observed
+    return mean.T, var.T, count
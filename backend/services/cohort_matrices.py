@@ -0,0 +1,108 @@
+"""
+Cohort x offset matrices and the retention/LTV curves read from them (see cohort_service).
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def month_index(values) -> Any:
+    """Months since 1970-01 of 'YYYY-MM' strings (or datetimes), as an int64 array."""
+    return np.array(values, dtype='datetime64[M]').astype(np.int64)
+
+
+def month_label(index: int) -> str:
+    return str(np.datetime64(int(index), 'M'))
+
+
+def cohort_matrices(users, months, revenue, orders, current_month: int) -> Dict[str, Any]:
+    """
+    Cohort x offset matrices from per-row columns: user ids, month indexes
+    (month_index), revenue and order counts. Rows of the same user and
+    month (e.g. from both storage tiers) are merged.
+    """
+    if not len(users):
+        return {'first': current_month, 'customers': np.zeros((0, 0), dtype=np.int64),
+                'revenue': np.zeros((0, 0)), 'repeat': np.zeros(0, dtype=np.int64), 'current': current_month}
+    # factorize hashes the ids instead of sorting strings
+    codes = pd.factorize(np.asarray(users, dtype=object))[0]
+    months = np.asarray(months, dtype=np.int64)
+    revenue = np.asarray(revenue, dtype=np.float64)
+    orders = np.asarray(orders, dtype=np.int64)
+
+    # The one sort: by user, then month
+    order = np.lexsort((months, codes))
+    codes, months, revenue, orders = codes[order], months[order], revenue[order], orders[order]
+    distinct = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (months[1:] != months[:-1])])
+    codes, months = codes[distinct], months[distinct]
+    revenue = np.add.reduceat(revenue, distinct)
+    orders = np.add.reduceat(orders, distinct)
+
+    # Each user's first row holds their acquisition month
+    user_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    first_months = months[user_starts]
+    cohort = np.repeat(first_months, np.diff(np.r_[user_starts, len(codes)]))
+    first = int(first_months.min())
+    n_cohorts = int(first_months.max()) - first + 1
+    width = max(current_month, int(months.max())) - first + 1
+    cell = (cohort - first) * width + (months - cohort)
+    size = n_cohorts * width
+    # Repeat purchasers: more than one order over their whole history
+    repeat = np.bincount(first_months - first, weights=np.add.reduceat(orders, user_starts) > 1,
+                         minlength=n_cohorts).astype(np.int64)
+    return {
+        'first': first,
+        'current': current_month,
+        'customers': np.bincount(cell, minlength=size).reshape(n_cohorts, width),
+        'revenue': np.bincount(cell, weights=revenue, minlength=size).reshape(n_cohorts, width),
+        'repeat': repeat,
+    }
+
+
+def cohort_report(matrices: Dict[str, Any], first_cohort: int, last_cohort: int, months: int,
+                  metric: str) -> Dict[str, Any]:
+    """
+    The `metric` ('retention' or 'ltv') curves of cohorts first_cohort..last_cohort
+    (month indexes) over offsets 0..`months`, per cohort customer, and their
+    size-weighted average. Offsets not observed yet are None.
+    """
+    first, current = matrices['first'], matrices['current']
+    rows = np.arange(max(first_cohort, first), min(last_cohort, first + len(matrices['customers']) - 1) + 1) - first
+    customers = matrices['customers'][rows, :months + 1].astype(np.float64)
+    sizes = customers[:, 0] if len(rows) else np.zeros(0)
+    if metric == 'retention':
+        values = customers
+    else:
+        values = np.cumsum(matrices['revenue'][rows, :months + 1], axis=1)
+    # Offsets past the current month haven't happened yet
+    observed = (first + rows)[:, None] + np.arange(values.shape[1])[None, :] <= current
+    values = np.where(observed, values, np.nan)
+    if values.shape[1] < months + 1:
+        values = np.pad(values, ((0, 0), (0, months + 1 - values.shape[1])), constant_values=np.nan)
+        observed = np.pad(observed, ((0, 0), (0, months + 1 - observed.shape[1])))
+
+    kept = sizes > 0
+    rates = np.divide(values, sizes[:, None], out=np.full(values.shape, np.nan), where=kept[:, None])
+    weights = np.where(observed & kept[:, None], sizes[:, None], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = np.nansum(np.nan_to_num(rates) * weights, axis=0) / weights.sum(axis=0)
+    digits = 4 if metric == 'retention' else 2
+
+    def rounded(series) -> List[Optional[float]]:
+        return [None if value != value else round(float(value), digits) for value in series]
+
+    return {
+        'metric': metric,
+        'months': months,
+        'cohorts': [
+            {
+                'cohort': month_label(first + int(row)),
+                'customers': int(size),
+                'repeat_rate': round(int(matrices['repeat'][row]) / int(size), 4),
+                'values': rounded(series),
+            }
+            for row, size, series in zip(rows, sizes, rates) if size
+        ],
+        'average': rounded(average),
+    }
@@ -0,0 +1,199 @@
+"""
+Monthly acquisition cohorts keyed on user_id: repeat-purchase retention and LTV.
+
+A customer's cohort is the UTC month of their first revenue row (statuses as
+in AnalyticsService._revenue_match; rows without a user_id are skipped).
+Mongo reduces the rows to one (user, month, revenue, orders) row per active
+customer month; `cohort_matrices` then sorts those columns by (user, month)
+once and derives everything with NumPy group operations
+(services/cohort_matrices.py):
+
+- `customers[c, k]`: customers of cohort c who bought in month c + k
+  (k = 0 is the whole cohort), so retention is customers[c, k] / customers[c, 0];
+- `revenue[c, k]`: their revenue in the reporting currency, so the LTV curve
+  is the running sum of revenue[c, :k + 1] per cohort customer.
+
+Cells after the current month are not observed yet and come back as null.
+Archived rows are read from cold storage (a collection scan, or the parquet
+files month by month, each reduced to its customer-month rows as it is read),
+since the monthly summaries carry no user_id. The
+matrices are computed once per dataset version and month and shared by every request
+(and by every worker of a host with SHARED_STATE_DIR).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+import profiling
+from services.analytics_service import REVENUE_STATUSES, _parse_bound
+from services.fx_service import AMOUNT_BASE_EXPR, base_amount
+from services.storage_service import transactions_collection
+
+logger = logging.getLogger(__name__)
+
+# Offsets (months after acquisition) a response may include
+MAX_COHORT_MONTHS = 120
+DEFAULT_COHORTS = 12
+
+
+def _month_number(moment: datetime) -> int:
+    """Months since 1970-01, as cohort_matrices indexes them."""
+    return (moment.year - 1970) * 12 + moment.month - 1
+
+
+def _parse_month(value: Optional[str]) -> Optional[int]:
+    """'YYYY-MM' or an ISO date/datetime (its UTC month) as a month index."""
+    if not value:
+        return None
+    try:
+        if len(value) == 7:
+            return _month_number(datetime.strptime(value, '%Y-%m'))
+        return _month_number(_parse_bound(value).astimezone(timezone.utc))
+    except ValueError:
+        raise ValueError(f"Invalid month '{value}' (use YYYY-MM or an ISO date)")
+
+
+class CohortService:
+    def __init__(self, db, versions=None, archive=None, shared=None):
+        self.db = db
+        self.collection = transactions_collection(db)
+        # Optional VersionService: the matrices are cached per dataset version
+        self.versions = versions
+        # Optional ArchiveService: archived customers and their history are read from cold storage
+        self.archive = archive
+        # Optional SharedStateService: one worker per host builds a version's matrices, all map them
+        self.shared = shared
+        # ((dataset version, current month), matrices): the open cohorts change with the month too
+        self._cached: Optional[Tuple[Tuple[Optional[int], int], Dict[str, Any]]] = None
+        # One computation per key, however many requests arrive while it runs
+        self._filling: Optional[Tuple[Tuple[Optional[int], int], asyncio.Task]] = None
+
+    async def get_retention(self, start: Optional[str] = None, end: Optional[str] = None,
+                            months: int = 12) -> Dict[str, Any]:
+        """
+        Share of each monthly cohort in [start, end] (default: the last 12)
+        buying again 0..`months` months after acquisition, the size-weighted
+        average curve, and each cohort's repeat-purchase rate.
+        """
+        matrices = await self._matrices()
+        return self._report(matrices, start, end, months, 'retention')
+
+    async def get_ltv(self, start: Optional[str] = None, end: Optional[str] = None,
+                      months: int = 12) -> Dict[str, Any]:
+        """Cumulative revenue per cohort customer 0..`months` months after acquisition (LTV curves)."""
+        matrices = await self._matrices()
+        return self._report(matrices, start, end, months, 'ltv')
+
+    def _report(self, matrices: Dict[str, Any], start: Optional[str], end: Optional[str],
+                months: int, metric: str) -> Dict[str, Any]:
+        if not 0 <= months <= MAX_COHORT_MONTHS:
+            raise ValueError(f"months must be between 0 and {MAX_COHORT_MONTHS}")
+        current = matrices['current']
+        last_cohort = _parse_month(end)
+        last_cohort = current if last_cohort is None else last_cohort
+        first_cohort = _parse_month(start)
+        first_cohort = last_cohort - DEFAULT_COHORTS + 1 if first_cohort is None else first_cohort
+        if first_cohort > last_cohort:
+            raise ValueError("start must not be after end")
+
+        from services.cohort_matrices import cohort_report
+
+        return cohort_report(matrices, first_cohort, last_cohort, months, metric)
+
+    async def _matrices(self) -> Dict[str, Any]:
+        key = (await self.versions.current() if self.versions else None, _month_number(datetime.now(timezone.utc)))
+        if self.versions and self._cached and self._cached[0] == key:
+            metrics.CACHE_REQUESTS.inc(cache='cohorts', result='hit')
+            return self._cached[1]
+        metrics.CACHE_REQUESTS.inc(cache='cohorts', result='miss')
+        if self._filling is None or self._filling[0] != key:
+            self._filling = (key, asyncio.create_task(self._load(key)))
+        filling = self._filling
+        try:
+            matrices = await filling[1]
+        finally:
+            if self._filling is filling:
+                self._filling = None
+        if self.versions:
+            self._cached = (key, matrices)
+        return matrices
+
+    async def _load(self, key: Tuple[Optional[int], int]) -> Dict[str, Any]:
+        version, current = key
+        if self.shared is None or version is None:
+            return await self._compute(current)
+        return await self.shared.get('cohorts', [version, current], lambda: self._compute(current))
+
+    async def _compute(self, current: int) -> Dict[str, Any]:
+        """The cohort matrices of every revenue row, observed through month `current`."""
+        import pandas as pd
+        from services.cohort_matrices import cohort_matrices, month_index
+
+        started = time.perf_counter()
+        with metrics.CACHE_FILL_SECONDS.time(cache='cohorts'), profiling.span('cohorts.aggregate'):
+            rows = await self.collection.aggregate(self._user_months_pipeline(), allowDiskUse=True).to_list(length=None)
+            if self.archive and await self.archive.archived_until():
+                if self.archive.sink.collection is not None:
+                    rows += await self.archive.sink.collection.aggregate(
+                        self._user_months_pipeline(), allowDiskUse=True
+                    ).to_list(length=None)
+                else:
+                    for month in sorted(await self.archive.summaries.distinct('month')):
+                        docs = [
+                            doc for doc in await self.archive.sink.read_month(month)
+                            if doc.get('status') in REVENUE_STATUSES and isinstance(doc.get('user_id'), str)
+                            and doc['user_id'] and isinstance(doc.get('revenue_date'), datetime)
+                        ]
+                        if not docs:
+                            continue
+                        # Reduced to the pipeline's customer-month rows before the next month is read
+                        totals = pd.DataFrame({
+                            'user_id': [doc['user_id'] for doc in docs],
+                            'revenue': [base_amount(doc) for doc in docs],
+                        }).groupby('user_id', sort=False)['revenue'].agg(['sum', 'size'])
+                        label = month.strftime('%Y-%m')
+                        rows += [
+                            {'_id': {'u': user, 'm': label}, 'revenue': revenue, 'orders': orders}
+                            for user, revenue, orders in zip(
+                                totals.index.tolist(), totals['sum'].tolist(), totals['size'].tolist()
+                            )
+                        ]
+
+        with profiling.span('cohorts.matrices'):
+            matrices = cohort_matrices(
+                [row['_id']['u'] for row in rows],
+                month_index([row['_id']['m'] for row in rows]),
+                [row['revenue'] for row in rows],
+                [row['orders'] for row in rows],
+                current,
+            )
+        logger.info(
+            f"Built cohort matrices from {len(rows)} customer-month rows "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return matrices
+
+    def _user_months_pipeline(self) -> List[Dict[str, Any]]:
+        """Revenue and orders per (user_id, UTC month) over every revenue row with a user."""
+        return [
+            {
+                "$match": {
+                    "revenue_date": {"$type": "date"},
+                    "status": {"$in": REVENUE_STATUSES},
+                    "user_id": {"$type": "string", "$ne": ""},
+                }
+            },
+            {
+                "$group": {
+                    "_id": {
+                        "u": "$user_id",
+                        "m": {"$dateToString": {"format": "%Y-%m", "date": "$revenue_date"}},
+                    },
+                    "revenue": {"$sum": AMOUNT_BASE_EXPR},
+                    "orders": {"$sum": 1},
+                }
+            },
+        ]
@@ -1,11 +1,18 @@
 import csv
 import io
-from typing import List, Dict
+from typing import Any, List, Dict
+
+from services.storage_service import transactions_collection
 
 class ExportService:
+    # Newest-first export sort
+    INDEXES = [
+        [("created_at", -1)],
+    ]
+
     def __init__(self, db):
         self.db = db
-        self.collection = db.transactions
+        self.collection = transactions_collection(db)
     
     async def export_to_csv(self, limit: int = 5000) -> str:
         """
@@ -34,3 +41,9 @@ class ExportService:
             writer.writerow(row)
         
         return output.getvalue()
+
+    def query_shapes(self) -> List[Dict[str, Any]]:
+        """Representative queries for plan verification."""
+        return [
+            {"name": "export_to_csv", "kind": "find", "filter": {}, "sort": [("created_at", -1)], "limit": 5000},
+        ]
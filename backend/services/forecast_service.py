@@ -0,0 +1,163 @@
+"""
+Revenue forecasts with prediction intervals, in total and per product.
+
+Every product's daily revenue over the last FORECAST_HISTORY_DAYS complete
+days comes from AnalyticsService.series_matrix (one aggregation, both
+tiers); the total is their sum. Each series gets an additive Holt-Winters
+model with a damped trend and a weekday season, in error-correction form:
+
+    forecast = level + damping * trend + season[weekday]
+    error    = actual - forecast
+    level    = level + damping * trend + alpha * error
+    trend    = damping * trend + beta * error
+    season[weekday] += gamma * error
+
+`fit` (services/holt_winters.py) runs that recursion for every series and every (alpha, beta, gamma)
+of a small grid at once, one vectorized step per day, and keeps each
+series' parameters with the lowest one-step squared error. Prediction
+intervals use the model's forecast-error variance for day h,
+sigma^2 * (1 + sum of c_j^2 for j < h) with c_j = alpha + beta * (damping +
+... + damping^j) + gamma * [j is a whole number of weeks], and for an
+h-day total the variance of the summed errors.
+
+Fitted state is cached per dataset version and day (shared by the workers
+of a host with SHARED_STATE_DIR); requests only project it.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+FORECAST_HISTORY_DAYS = max(int(os.environ.get('FORECAST_HISTORY_DAYS', '365')), 98)
+FORECAST_HORIZONS = (30, 60, 90)
+SEASON_DAYS = 7
+DAMPING = 0.98
+# Smoothing grid searched per series
+ALPHAS = (0.05, 0.15, 0.3, 0.5)
+BETAS = (0.0, 0.01)
+GAMMAS = (0.05, 0.2)
+# Days that only initialize the state: not part of the fit error
+WARMUP_DAYS = 2 * SEASON_DAYS
+
+
+class ForecastService:
+    def __init__(self, analytics, versions=None, shared=None):
+        # AnalyticsService: the daily series come from its series_matrix
+        self.analytics = analytics
+        # Optional VersionService: fitted state is cached per dataset version (and day)
+        self.versions = versions
+        # Optional SharedStateService: one worker per host fits a version's models, all map the state
+        self.shared = shared
+        self._cached: Optional[Tuple[Any, Dict[str, Any]]] = None
+        self._filling: Optional[Tuple[Any, asyncio.Task]] = None
+
+    async def get_forecast(self, products: int = 20, interval: float = 0.9,
+                           as_of: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        30/60/90-day revenue forecasts with `interval` prediction intervals
+        for the total and the `products` products with the highest 30-day
+        forecast, next to each period's preceding actual revenue, plus the
+        total's daily forecast.
+        """
+        if not 0 < interval < 1:
+            raise ValueError("interval must be between 0 and 1")
+        from services.holt_winters import project
+
+        now = (as_of or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        fitted = await self._fitted(today)
+        z = NormalDist().inv_cdf(0.5 + interval / 2)
+        horizon = max(FORECAST_HORIZONS)
+        with profiling.span('forecast.project'):
+            projected = project(fitted['state'], horizon, z)
+
+        def horizons(row: int) -> List[Dict[str, Any]]:
+            return [
+                {
+                    'days': days,
+                    'revenue': round(float(projected['total'][row, days - 1]), 2),
+                    'lower': round(float(projected['total_lower'][row, days - 1]), 2),
+                    'upper': round(float(projected['total_upper'][row, days - 1]), 2),
+                    'previous': round(float(fitted['previous'][row, i]), 2),
+                }
+                for i, days in enumerate(FORECAST_HORIZONS)
+            ]
+
+        # Row 0 is the total
+        ranked = 1 + projected['total'][1:, FORECAST_HORIZONS[0] - 1].argsort()[::-1][:products]
+        return {
+            'as_of': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+            'interval': interval,
+            'total': {'product_id': None, 'horizons': horizons(0)},
+            'daily': [
+                {
+                    'day': (today + timedelta(days=h)).strftime('%Y-%m-%d'),
+                    'revenue': round(float(projected['mean'][0, h]), 2),
+                    'lower': round(float(projected['lower'][0, h]), 2),
+                    'upper': round(float(projected['upper'][0, h]), 2),
+                }
+                for h in range(horizon)
+            ],
+            'products': [
+                {
+                    'product_id': fitted['products'][row - 1] if fitted['products'][row - 1] is not None else 'Unknown',
+                    'horizons': horizons(row),
+                }
+                for row in ranked.tolist()
+            ],
+        }
+
+    async def _fitted(self, today: datetime) -> Dict[str, Any]:
+        key = (await self.versions.current() if self.versions else None, today)
+        if self.versions and self._cached and self._cached[0] == key:
+            metrics.CACHE_REQUESTS.inc(cache='forecast', result='hit')
+            return self._cached[1]
+        metrics.CACHE_REQUESTS.inc(cache='forecast', result='miss')
+        if self._filling is None or self._filling[0] != key:
+            self._filling = (key, asyncio.create_task(self._load(key)))
+        filling = self._filling
+        try:
+            fitted = await filling[1]
+        finally:
+            if self._filling is filling:
+                self._filling = None
+        if self.versions:
+            self._cached = (key, fitted)
+        return fitted
+
+    async def _load(self, key: Tuple[Optional[int], datetime]) -> Dict[str, Any]:
+        version, today = key
+        if self.shared is None or version is None:
+            return await self._fit(today)
+        return await self.shared.get('forecast', [version, today.strftime('%Y-%m-%d')], lambda: self._fit(today))
+
+    async def _fit(self, today: datetime) -> Dict[str, Any]:
+        import numpy as np
+        from services.holt_winters import fit
+
+        started = time.perf_counter()
+        since = today - timedelta(days=FORECAST_HISTORY_DAYS)
+        with metrics.CACHE_FILL_SECONDS.time(cache='forecast'):
+            with profiling.span('forecast.aggregate'):
+                # Complete days only: today is still partial
+                series, matrix = await self.analytics.series_matrix(
+                    ['product_id'], since, today - timedelta(microseconds=1)
+                )
+            values = np.vstack([matrix.sum(axis=0, keepdims=True), matrix])
+            with profiling.span('forecast.fit'):
+                # CPU-bound: keep the event loop serving meanwhile
+                state = await asyncio.to_thread(fit, values)
+        logger.info(f"Fitted {len(values)} forecast series in {time.perf_counter() - started:.2f}s")
+        return {
+            'state': state,
+            'products': [value for _, value in series],
+            'previous': np.stack([values[:, -days:].sum(axis=1) for days in FORECAST_HORIZONS], axis=1),
+        }
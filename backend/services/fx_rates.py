@@ -0,0 +1,56 @@
+"""
+As-of rate lookups over the FX_RATES_PATH table (see fx_service).
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from services.fx_service import FX_RATES_BASE, REPORTING_CURRENCY
+
+
+class RateTable:
+    """Per-currency daily rates as sorted numpy arrays, looked up as-of a day."""
+
+    def __init__(self, rows: Sequence[Tuple[str, str, float]], base: str = FX_RATES_BASE):
+        self.base = base
+        by_currency: Dict[str, List[Tuple[Any, float]]] = {}
+        for day, currency, rate in rows:
+            by_currency.setdefault(currency.strip().upper(), []).append((np.datetime64(day, 'D'), float(rate)))
+        self._series: Dict[str, Tuple[Any, Any]] = {}
+        for currency, points in by_currency.items():
+            points.sort()
+            self._series[currency] = (
+                np.array([day for day, _ in points], dtype='datetime64[D]'),
+                np.array([rate for _, rate in points], dtype=float),
+            )
+
+    @property
+    def currencies(self) -> List[str]:
+        return sorted({self.base, *self._series})
+
+    def rates(self, currencies, days):
+        """Units of each currency per base unit on each day (NaN when unknown), as numpy arrays."""
+        out = np.full(len(currencies), np.nan)
+        for currency in np.unique(currencies):
+            mask = currencies == currency
+            if currency == self.base:
+                out[mask] = 1.0
+                continue
+            series = self._series.get(currency)
+            if series is None:
+                continue
+            series_days, series_rates = series
+            # Latest fixing on or before the day; days before the first fixing use the first
+            index = np.searchsorted(series_days, days[mask], side='right') - 1
+            out[mask] = series_rates[np.clip(index, 0, None)]
+        return out
+
+    def to_reporting(self, amounts: Sequence[float], currencies: Sequence[str], days: Sequence[datetime],
+                     reporting: str = REPORTING_CURRENCY):
+        """Convert a chunk of amounts (numpy array; NaN where a currency has no rate)."""
+        currencies = np.array([(c or '').strip().upper() for c in currencies], dtype=object)
+        days = np.array(days, dtype='datetime64[D]')
+        source = self.rates(currencies, days)
+        target = self.rates(np.full(len(currencies), reporting, dtype=object), days)
+        return np.asarray(amounts, dtype=float) / source * target
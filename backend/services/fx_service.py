@@ -0,0 +1,171 @@
+"""
+Currency normalization: `amount_base` in the reporting currency.
+
+Rows are converted once, when they are written (import, ingest), so
+aggregations sum a stored field instead of looking up a rate per document.
+Rates come from a local CSV (FX_RATES_PATH) with columns `date,currency,rate`,
+where `rate` is units of `currency` per one unit of the file's base currency
+(FX_RATES_BASE, default: the reporting currency), e.g. an ECB reference-rate
+export. A row uses the latest rate on or before its revenue_date (weekends and
+holidays carry the previous fixing); cross rates go through the base.
+
+The table is parsed once per process and reloaded when the file changes.
+Rows whose currency has no rate keep `amount_base` null and are summed at
+face value (like rows written before this existed) until recompute() fills
+them in. After correcting or extending the file, recompute (archive summaries
+and order-value sketches are rebuilt along with the rows):
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=revenue python -m services.fx_service --recompute
+"""
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from services.storage_service import transactions_collection
+
+logger = logging.getLogger(__name__)
+
+REPORTING_CURRENCY = os.environ.get('REPORTING_CURRENCY', 'USD').upper()
+FX_RATES_BASE = os.environ.get('FX_RATES_BASE', REPORTING_CURRENCY).upper()
+FX_RATES_PATH = os.environ.get('FX_RATES_PATH', str(Path(__file__).resolve().parent.parent / 'fx_rates.csv'))
+FX_RECOMPUTE_BATCH_SIZE = 10_000
+
+# Aggregation expression for a row's revenue in the reporting currency
+AMOUNT_BASE_EXPR = {'$ifNull': ['$amount_base', '$amount']}
+
+
+def base_amount(doc: Dict[str, Any]) -> float:
+    """Python twin of AMOUNT_BASE_EXPR (folding rows into cached aggregates)."""
+    value = doc.get('amount_base')
+    return value if value is not None else (doc.get('amount') or 0.0)
+
+
+# services.fx_rates.RateTable of FX_RATES_PATH, and the (path, mtime) it was read at
+_table = None
+_table_key: Optional[Tuple[str, float]] = None
+
+
+def rate_table():
+    """The cached RateTable for FX_RATES_PATH (re-read when the file's mtime changes; empty if missing)."""
+    global _table, _table_key
+    from services.fx_rates import RateTable
+
+    path = Path(FX_RATES_PATH)
+    try:
+        key = (str(path), path.stat().st_mtime)
+    except FileNotFoundError:
+        key = (str(path), 0.0)
+    if _table is None or key != _table_key:
+        rows: List[Tuple[str, str, float]] = []
+        if key[1]:
+            import pandas as pd
+
+            frame = pd.read_csv(path, dtype={'currency': str})
+            rows = list(zip(frame['date'].astype(str), frame['currency'], frame['rate'].astype(float)))
+            logger.info(f"Loaded {len(rows)} FX rates from {path}")
+        _table, _table_key = RateTable(rows), key
+    return _table
+
+
+def apply_amount_base(docs: List[Dict[str, Any]]) -> int:
+    """Set `amount_base` on documents in place (one vectorized lookup). Returns rows without a rate."""
+    if not docs:
+        return 0
+    converted = rate_table().to_reporting(
+        [doc.get('amount') or 0.0 for doc in docs],
+        [doc.get('currency') for doc in docs],
+        [doc['revenue_date'] for doc in docs],
+    )
+    missing = 0
+    for doc, value in zip(docs, converted.tolist()):
+        if value != value:  # NaN: no rate for this currency
+            doc['amount_base'] = None
+            missing += 1
+        else:
+            doc['amount_base'] = value
+    return missing
+
+
+class FxService:
+    def __init__(self, db, archive=None, sketches=None):
+        self.db = db
+        self.collection = transactions_collection(db)
+        # Optional ArchiveService: its summaries are rebuilt with the new rates
+        self.archive = archive
+        # Optional SketchService: order-value sketches are rebuilt with the new amounts
+        self.sketches = sketches
+
+    async def recompute(self, batch_size: int = FX_RECOMPUTE_BATCH_SIZE) -> Dict[str, Any]:
+        """Rewrite amount_base everywhere from the current rate table."""
+        started = time.perf_counter()
+        result = {'updated': 0, 'missing_rate': 0}
+        collections = [self.collection]
+        if self.archive and self.archive.sink.collection is not None:
+            collections.append(self.archive.sink.collection)
+        for collection in collections:
+            updated, missing = await self._recompute_collection(collection, batch_size)
+            result['updated'] += updated
+            result['missing_rate'] += missing
+        if self.archive:
+            months = await self.archive.summaries.distinct('month')
+            await self.archive.rebuild_summaries(sorted(months))
+            result['summary_months'] = len(months)
+        if self.sketches:
+            result['sketch_rows'] = (await self.sketches.rebuild(self.archive))['rows']
+        result['seconds'] = round(time.perf_counter() - started, 2)
+        return result
+
+    async def _recompute_collection(self, collection, batch_size: int) -> Tuple[int, int]:
+        updated = missing = 0
+        projection = {'amount': 1, 'currency': 1, 'revenue_date': 1, 'amount_base': 1}
+        cursor = collection.find({'revenue_date': {'$type': 'date'}}, projection)
+        while True:
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                break
+            previous = [row.get('amount_base') for row in batch]
+            missing += apply_amount_base(batch)
+            operations = [
+                UpdateOne({'_id': row['_id']}, {'$set': {'amount_base': row['amount_base']}})
+                for row, before in zip(batch, previous) if row['amount_base'] != before
+            ]
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+        logger.info(f"Recomputed amount_base on {collection.name}: {updated} updated, {missing} without a rate")
+        return updated, missing
+
+
+if __name__ == '__main__':
+    import argparse
+    import asyncio
+    import json
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from services.archive_service import ArchiveService
+    from services.sketch_service import SketchService
+    from services.version_service import VersionService
+
+    parser = argparse.ArgumentParser(description='Recompute amount_base from the FX rate table.')
+    parser.add_argument('--recompute', action='store_true', required=True)
+    parser.add_argument('--batch-size', type=int, default=FX_RECOMPUTE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def _main() -> int:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        try:
+            result = await FxService(db, ArchiveService(db), SketchService(db)).recompute(args.batch_size)
+            # Amounts changed behind the API's back
+            await VersionService(db).bump()
+            print(json.dumps(result, indent=2))
+        finally:
+            client.close()
+        return 0
+
+    raise SystemExit(asyncio.run(_main()))
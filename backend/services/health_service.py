@@ -0,0 +1,69 @@
+from typing import Dict, Any
+
+from services.storage_service import transactions_collection
+
+KNOWN_STATUSES = ['completed', 'pending', 'failed', 'refunded', '']
+MAX_PRODUCTS_PAGE = 500
+
+
+class HealthService:
+    def __init__(self, db):
+        self.db = db
+        self.collection = transactions_collection(db)
+
+    async def liveness(self) -> Dict[str, Any]:
+        """
+        Cheap probe: a server ping plus the collection's metadata count.
+        Never scans documents.
+        """
+        await self.db.command('ping')
+        estimate = await self.collection.estimated_document_count()
+        return {
+            "status": "ok",
+            "transaction_count_estimate": estimate,
+            "has_data": estimate > 0,
+        }
+
+    async def get_data_health(self, products_limit: int = 50, products_offset: int = 0) -> Dict[str, Any]:
+        """
+        Status breakdown, product cardinality and a page of products
+        from a single $facet aggregation (one collection pass).
+        """
+        products_limit = max(1, min(products_limit, MAX_PRODUCTS_PAGE))
+
+        pipeline = [
+            {
+                '$facet': {
+                    'status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+                    'product_count': [
+                        {'$group': {'_id': '$product_id'}},
+                        {'$count': 'n'},
+                    ],
+                    'products': [
+                        {'$group': {'_id': '$product_id', 'count': {'$sum': 1}}},
+                        {'$sort': {'count': -1, '_id': 1}},
+                        {'$skip': products_offset},
+                        {'$limit': products_limit},
+                    ],
+                }
+            }
+        ]
+        result = await self.collection.aggregate(pipeline, allowDiskUse=True).to_list(length=1)
+        facets = result[0] if result else {'status': [], 'product_count': [], 'products': []}
+
+        status_counts = {status: 0 for status in KNOWN_STATUSES}
+        for row in facets['status']:
+            status_counts[row['_id'] or ''] = status_counts.get(row['_id'] or '', 0) + row['count']
+
+        product_count = facets['product_count'][0]['n'] if facets['product_count'] else 0
+        total = await self.collection.estimated_document_count()
+
+        return {
+            "transaction_count": total,
+            "has_data": total > 0,
+            "status_breakdown": status_counts,
+            "product_count": product_count,
+            "products": [{'product_id': p['_id'], 'count': p['count']} for p in facets['products']],
+            "products_limit": products_limit,
+            "products_offset": products_offset,
+        }
@@ -0,0 +1,92 @@
+"""
+Vectorized Holt-Winters fitting and projection behind ForecastService (model in forecast_service).
+"""
+from typing import Any, Dict
+
+import numpy as np
+
+from services.forecast_service import ALPHAS, BETAS, DAMPING, GAMMAS, SEASON_DAYS, WARMUP_DAYS
+
+# Series fitted together: the working arrays hold one column per series and
+# grid point, so this bounds peak memory whatever the product count
+FIT_BLOCK_ROWS = 1000
+
+
+def fit(values) -> Dict[str, Any]:
+    """
+    Fit every row of a (series x day) matrix (see forecast_service),
+    FIT_BLOCK_ROWS rows at a time. Returns the state after the last day:
+    level, trend, season (indexed by day % 7), alpha/beta/gamma and the
+    residual sigma, one entry per series.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    blocks = [_fit_block(values[row:row + FIT_BLOCK_ROWS]) for row in range(0, len(values), FIT_BLOCK_ROWS)]
+    state = {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0] if key != 'days'}
+    state['days'] = values.shape[1]
+    return state
+
+
+def _fit_block(values) -> Dict[str, Any]:
+    """Every row of `values` and every grid point at once, one vectorized step per day."""
+    n, days = values.shape
+    grid = np.array([(a, b, g) for a in ALPHAS for b in BETAS for g in GAMMAS if a + g <= 1])
+    alpha, beta, gamma = (np.tile(grid[:, i], n) for i in range(3))
+    # Day-major copy, one column per (series, parameters) pair
+    x = np.ascontiguousarray(np.repeat(values, len(grid), axis=0).T)
+
+    first, second = x[:SEASON_DAYS], x[SEASON_DAYS:WARMUP_DAYS]
+    level = first.mean(axis=0)
+    trend = (second.mean(axis=0) - level) / SEASON_DAYS
+    season = (first - level + second - second.mean(axis=0)) / 2
+    sse = np.zeros(x.shape[1])
+    for day in range(days):
+        weekday = day % SEASON_DAYS
+        error = x[day] - (level + DAMPING * trend + season[weekday])
+        level = level + DAMPING * trend + alpha * error
+        trend = DAMPING * trend + beta * error
+        season[weekday] += gamma * error
+        if day >= WARMUP_DAYS:
+            sse += error * error
+
+    best = sse.reshape(n, len(grid)).argmin(axis=1)
+    pick = np.arange(n) * len(grid) + best
+    return {
+        'level': level[pick],
+        'trend': trend[pick],
+        'season': season[:, pick].T,
+        'alpha': alpha[pick],
+        'beta': beta[pick],
+        'gamma': gamma[pick],
+        'sigma': np.sqrt(sse[pick] / max(1, days - WARMUP_DAYS)),
+        'days': days,
+    }
+
+
+def project(state: Dict[str, Any], horizon: int, z: float) -> Dict[str, Any]:
+    """
+    Daily forecasts for the `horizon` days after the fit, with their
+    intervals, and the interval of each h-day total: arrays of shape
+    (series x horizon). Revenue cannot go negative, so bounds are clipped.
+    """
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(DAMPING ** steps)
+    weekdays = (state['days'] + steps - 1) % SEASON_DAYS
+    mean = state['level'][:, None] + damped[None, :] * state['trend'][:, None] + state['season'][:, weekdays]
+
+    # c_j for j = 1 .. horizon - 1
+    c = (state['alpha'][:, None] + state['beta'][:, None] * damped[None, :-1]
+         + state['gamma'][:, None] * (steps[None, :-1] % SEASON_DAYS == 0))
+    sigma2 = (state['sigma'] ** 2)[:, None]
+    daily_sd = np.sqrt(sigma2 * (1 + np.concatenate([np.zeros((len(c), 1)), np.cumsum(c * c, axis=1)], axis=1)))
+    # An h-day total's error weighs the k-th last day's shock by C_k = 1 + c_1 + ... + c_k
+    weights = 1 + np.concatenate([np.zeros((len(c), 1)), np.cumsum(c, axis=1)], axis=1)
+    total_sd = np.sqrt(sigma2 * np.cumsum(weights * weights, axis=1))
+    total = np.cumsum(mean, axis=1)
+    return {
+        'mean': np.clip(mean, 0, None),
+        'lower': np.clip(mean - z * daily_sd, 0, None),
+        'upper': np.clip(mean + z * daily_sd, 0, None),
+        'total': np.clip(total, 0, None),
+        'total_lower': np.clip(total - z * total_sd, 0, None),
+        'total_upper': np.clip(total + z * total_sd, 0, None),
+    }
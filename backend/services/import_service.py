@@ -1,25 +1,188 @@
-import pandas as pd
 import io
-from typing import Dict, Any, List
-from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+from datetime import datetime, timezone
 import uuid
 from dateutil import parser
 import logging
-from decimal import Decimal, InvalidOperation
+import time
+
+import metrics
+from services.fx_service import apply_amount_base
+from services.storage_service import add_meta, transactions_collection
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTS = {"csv", "xlsx", "xls"}
 MAX_ROWS_SOFT_LIMIT = 200_000
 
 
+# Transaction field -> header names it is read from (case-insensitive), in priority order
+COLUMN_KEYWORDS: Dict[str, List[str]] = {
+    'order_id': ['order_id', 'order id', 'id', 'orderid'],
+    'user_id': ['user_id', 'user id', 'userid'],
+    'product_id': ['product_id', 'product id', 'sku', 'productid'],
+    'amount': ['amount', 'amt', 'value', 'price'],
+    'currency': ['currency', 'curr'],
+    'status': ['status', 'state'],
+    'channel': ['channel', 'source', 'platform'],
+    'created_at': ['created_at', 'created at', 'createdat', 'date_created'],
+    'paid_at': ['paid_at', 'paid at', 'paidat', 'timestamp', 'date'],
+    'region': ['region', 'country', 'locale'],
+    'refunded': ['refunded', 'is_refunded'],
+    'refund_amount': ['refund_amount', 'refund amount', 'refund'],
+    'attribution_campaign': ['attribution_campaign', 'campaign', 'utm_campaign'],
+}
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Convert to naive UTC for storage; naive inputs are assumed to be UTC already."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_datetime(text: str) -> datetime:
+    """ISO 8601 on the fast path (most exports); anything else through dateutil."""
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return parser.parse(text)
+
+
+def _parse_amount(text: str) -> float:
+    try:
+        return float(text.replace(',', '').replace('$', ''))
+    except ValueError:
+        return 0.0
+
+
+def map_columns(columns: Sequence[str]) -> Dict[str, str]:
+    """Transaction field -> file column, for the fields the header provides."""
+    mapped = {}
+    for field, keywords in COLUMN_KEYWORDS.items():
+        for keyword in keywords:
+            column = next((col for col in columns if col.lower().strip() == keyword.lower().strip()), None)
+            if column is not None:
+                mapped[field] = column
+                break
+    return mapped
+
+
+def frame_records(df) -> List[Dict[str, Any]]:
+    """A DataFrame's rows as column -> cell dicts (several times cheaper than to_dict('records'))."""
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in df.to_numpy(dtype=object).tolist()]
+
+
+def to_transaction(row: Mapping[str, Any], columns: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Normalize one file row (column -> cell) into a transaction document.
+    Shared by imports and the offline CLI (services/offline_service.py),
+    so both read a file the same way.
+    """
+    def cell(field: str, default: str = '') -> str:
+        column = columns.get(field)
+        return str(row.get(column, default)).strip() if column else default
+
+    order_id = cell('order_id') or f"AUTO-{uuid.uuid4().hex[:8]}"
+    status = cell('status').lower()
+    channel = cell('channel').lower()
+    # Normalize values to match API schema
+    if status == 'cancelled':
+        status = 'failed'
+    if channel == 'email':
+        channel = 'partner'
+
+    created_at_str = cell('created_at')
+    try:
+        created_dt = _parse_datetime(created_at_str) if created_at_str else datetime.utcnow()
+    except (ValueError, OverflowError):
+        created_dt = datetime.utcnow()
+    paid_at_str = cell('paid_at')
+    try:
+        paid_dt = _parse_datetime(paid_at_str) if paid_at_str else None
+    except (ValueError, OverflowError):
+        paid_dt = None
+
+    return {
+        'id': str(uuid.uuid4()),
+        'order_id': order_id,
+        'user_id': cell('user_id'),
+        'product_id': cell('product_id'),
+        'amount': _parse_amount(cell('amount', '0')),
+        'currency': cell('currency', 'USD').upper(),
+        'status': status,
+        'channel': channel,
+        'created_at': created_dt.isoformat(),
+        # A missing paid_at is allowed even for completed rows (the model makes it optional)
+        'paid_at': paid_dt.isoformat() if paid_dt else None,
+        # Indexed BSON date that analytics filter and bucket on
+        'revenue_date': _as_utc(paid_dt or created_dt),
+        'refunded': cell('refunded', 'false').lower() in ['true', 'yes', '1'],
+        'refund_amount': _parse_amount(cell('refund_amount', '0')),
+        'region': cell('region'),
+        'attribution_campaign': cell('attribution_campaign'),
+    }
+
+
+def to_transactions(rows: Iterable[Mapping[str, Any]], columns: Dict[str, str],
+                    first_line: int = 2) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Every row as a transaction (NO SKIPPING: rows that fail to normalize
+    are kept with defaults) and how many were defaulted. `first_line` is
+    the file line of the first row, for error messages.
+    """
+    transactions = []
+    row_errors = 0
+    # Per-row logging only when DEBUG is on; the check is hoisted out of the loop
+    debug_rows = logger.isEnabledFor(logging.DEBUG)
+    for index, row in enumerate(rows):
+        try:
+            tx = to_transaction(row, columns)
+            if debug_rows:
+                logger.debug(f"Row {first_line + index}: order_id={tx['order_id']}, amount={tx['amount']}")
+        except Exception as e:
+            row_errors += 1
+            logging.error(f"Row {first_line + index} error: {str(e)}", exc_info=True)
+            now = datetime.utcnow()
+            tx = {
+                'id': str(uuid.uuid4()),
+                'order_id': f"AUTO-{uuid.uuid4().hex[:8]}",
+                'user_id': '',
+                'product_id': '',
+                'amount': 0.0,
+                'currency': 'USD',
+                'status': '',
+                'channel': '',
+                'created_at': now.isoformat(),
+                'paid_at': None,
+                'revenue_date': now,
+                'refunded': False,
+                'refund_amount': 0.0,
+                'region': '',
+                'attribution_campaign': '',
+            }
+        transactions.append(tx)
+    return transactions, row_errors
+
+
 class ImportService:
-    def __init__(self, db):
+    # order_id lookups back re-import checks and single-transaction reads
+    INDEXES = [
+        [("order_id", 1)],
+    ]
+
+    def __init__(self, db, sketches=None):
         self.db = db
-        self.collection = db.transactions
+        self.collection = transactions_collection(db)
+        # Optional SketchService: imported rows are folded into the per-day sketches
+        self.sketches = sketches
 
     async def import_from_file(self, content: bytes, file_ext: str, preview: bool = False) -> Dict[str, Any]:
         """Import transactions from CSV or Excel file."""
+        import pandas as pd
+
         file_ext = (file_ext or '').lower().strip().lstrip('.')
         if file_ext not in ALLOWED_EXTS:
             return {
@@ -29,12 +192,14 @@ class ImportService:
         
         total_rows = 0
         
+        started = time.perf_counter()
         try:
             # Read file
-            if file_ext == 'csv':
-                df = pd.read_csv(io.BytesIO(content), dtype=str, low_memory=False)
-            else:
-                df = pd.read_excel(io.BytesIO(content), dtype=str)
+            with metrics.IMPORT_SECONDS.time(stage='parse'):
+                if file_ext == 'csv':
+                    df = pd.read_csv(io.BytesIO(content), dtype=str, low_memory=False)
+                else:
+                    df = pd.read_excel(io.BytesIO(content), dtype=str)
             
             total_rows = len(df)
             if total_rows > MAX_ROWS_SOFT_LIMIT and not preview:
@@ -45,199 +210,36 @@ class ImportService:
             
             original_columns = list(df.columns)
             logging.info(f"CSV columns: {original_columns}")
-
-            # Simple column mapping - just use lowercase matching
-            def find_column(df_cols, keywords):
-                """Find a column by keywords"""
-                for keyword in keywords:
-                    for col in df_cols:
-                        if col.lower().strip() == keyword.lower().strip():
-                            return col
-                return None
-
-            order_id_col = find_column(original_columns, ['order_id', 'order id', 'id', 'orderid'])
-            user_id_col = find_column(original_columns, ['user_id', 'user id', 'userid'])
-            product_id_col = find_column(original_columns, ['product_id', 'product id', 'sku', 'productid'])
-            amount_col = find_column(original_columns, ['amount', 'amt', 'value', 'price'])
-            currency_col = find_column(original_columns, ['currency', 'curr'])
-            status_col = find_column(original_columns, ['status', 'state'])
-            channel_col = find_column(original_columns, ['channel', 'source', 'platform'])
-            created_at_col = find_column(original_columns, ['created_at', 'created at', 'createdat', 'date_created'])
-            paid_at_col = find_column(original_columns, ['paid_at', 'paid at', 'paidat', 'timestamp', 'date'])
-            region_col = find_column(original_columns, ['region', 'country', 'locale'])
-            refunded_col = find_column(original_columns, ['refunded', 'is_refunded'])
-            refund_amount_col = find_column(original_columns, ['refund_amount', 'refund amount', 'refund'])
-            campaign_col = find_column(original_columns, ['attribution_campaign', 'campaign', 'utm_campaign'])
-
-            logging.info(f"Mapped: order_id={order_id_col}, amount={amount_col}, status={status_col}")
+            columns = map_columns(original_columns)
+            logging.info(
+                f"Mapped: order_id={columns.get('order_id')}, amount={columns.get('amount')}, status={columns.get('status')}"
+            )
 
             # Preview mode
             if preview:
-                preview_rows = []
-                for _, row in df.head(10).iterrows():
-                    preview_row = {}
-                    # Include all mapped columns in preview
-                    if order_id_col:
-                        preview_row['order_id'] = str(row.get(order_id_col, '')).strip()
-                    if user_id_col:
-                        preview_row['user_id'] = str(row.get(user_id_col, '')).strip()
-                    if product_id_col:
-                        preview_row['product_id'] = str(row.get(product_id_col, '')).strip()
-                    if amount_col:
-                        preview_row['amount'] = str(row.get(amount_col, '')).strip()
-                    if currency_col:
-                        preview_row['currency'] = str(row.get(currency_col, '')).strip()
-                    if status_col:
-                        preview_row['status'] = str(row.get(status_col, '')).strip()
-                    if channel_col:
-                        preview_row['channel'] = str(row.get(channel_col, '')).strip()
-                    if created_at_col:
-                        preview_row['created_at'] = str(row.get(created_at_col, '')).strip()
-                    if paid_at_col:
-                        preview_row['paid_at'] = str(row.get(paid_at_col, '')).strip()
-                    if region_col:
-                        preview_row['region'] = str(row.get(region_col, '')).strip()
-                    if refunded_col:
-                        preview_row['refunded'] = str(row.get(refunded_col, '')).strip()
-                    if refund_amount_col:
-                        preview_row['refund_amount'] = str(row.get(refund_amount_col, '')).strip()
-                    if campaign_col:
-                        preview_row['attribution_campaign'] = str(row.get(campaign_col, '')).strip()
-                    
-                    preview_rows.append(preview_row)
-                
-                mapped_columns_dict = {}
-                if order_id_col:
-                    mapped_columns_dict['order_id'] = order_id_col
-                if user_id_col:
-                    mapped_columns_dict['user_id'] = user_id_col
-                if product_id_col:
-                    mapped_columns_dict['product_id'] = product_id_col
-                if amount_col:
-                    mapped_columns_dict['amount'] = amount_col
-                if currency_col:
-                    mapped_columns_dict['currency'] = currency_col
-                if status_col:
-                    mapped_columns_dict['status'] = status_col
-                if channel_col:
-                    mapped_columns_dict['channel'] = channel_col
-                if created_at_col:
-                    mapped_columns_dict['created_at'] = created_at_col
-                if paid_at_col:
-                    mapped_columns_dict['paid_at'] = paid_at_col
-                if region_col:
-                    mapped_columns_dict['region'] = region_col
-                if refunded_col:
-                    mapped_columns_dict['refunded'] = refunded_col
-                if refund_amount_col:
-                    mapped_columns_dict['refund_amount'] = refund_amount_col
-                if campaign_col:
-                    mapped_columns_dict['attribution_campaign'] = campaign_col
-                
-                logging.info(f"Preview: {len(preview_rows)} rows, columns: {list(mapped_columns_dict.keys())}")
-                
+                # Include all mapped columns in preview
+                preview_rows = [
+                    {field: str(row.get(column, '')).strip() for field, column in columns.items()}
+                    for row in frame_records(df.head(10))
+                ]
+                logging.info(f"Preview: {len(preview_rows)} rows, columns: {list(columns)}")
+
                 return {
                     'success': True,
                     'preview': preview_rows,
-                    'mapped_columns': mapped_columns_dict,
+                    'mapped_columns': columns,
                     'total': total_rows,
                 }
 
             # Process all rows - NO SKIPPING
-            transactions = []
-
-            for index, row in df.iterrows():
-                try:
-                    # Get values with defaults
-                    order_id = str(row.get(order_id_col, '')).strip() if order_id_col else ''
-                    if not order_id:
-                        order_id = f"AUTO-{uuid.uuid4().hex[:8]}"
-                    
-                    user_id = str(row.get(user_id_col, '')).strip() if user_id_col else ''
-                    product_id = str(row.get(product_id_col, '')).strip() if product_id_col else ''
-                    
-                    amount_str = str(row.get(amount_col, '0')).strip() if amount_col else '0'
-                    try:
-                        amount = float(amount_str.replace(',', '').replace('$', ''))
-                    except:
-                        amount = 0.0
-                    
-                    currency = str(row.get(currency_col, 'USD')).strip().upper() if currency_col else 'USD'
-                    status = str(row.get(status_col, '')).strip().lower() if status_col else ''
-                    channel = str(row.get(channel_col, '')).strip().lower() if channel_col else ''
-
-                    # Normalize values to match API schema
-                    if status == 'cancelled':
-                        status = 'failed'
-                    if channel == 'email':
-                        channel = 'partner'
-                    
-                    created_at_str = str(row.get(created_at_col, '')).strip() if created_at_col else ''
-                    try:
-                        created_at = parser.parse(created_at_str).isoformat() if created_at_str else datetime.utcnow().isoformat()
-                    except:
-                        created_at = datetime.utcnow().isoformat()
-                    
-                    paid_at_str = str(row.get(paid_at_col, '')).strip() if paid_at_col else ''
-                    try:
-                        paid_at = parser.parse(paid_at_str).isoformat() if paid_at_str else None
-                    except:
-                        paid_at = None
-                    # If status indicates completion but paid_at missing, allow None; model supports Optional[str]
-                    
-                    refunded_str = str(row.get(refunded_col, 'false')).strip().lower() if refunded_col else 'false'
-                    refunded = refunded_str in ['true', 'yes', '1']
-                    
-                    refund_amount_str = str(row.get(refund_amount_col, '0')).strip() if refund_amount_col else '0'
-                    try:
-                        refund_amount = float(refund_amount_str.replace(',', '').replace('$', ''))
-                    except:
-                        refund_amount = 0.0
-                    
-                    region = str(row.get(region_col, '')).strip() if region_col else ''
-                    campaign = str(row.get(campaign_col, '')).strip() if campaign_col else ''
-
-                    tx = {
-                        'id': str(uuid.uuid4()),
-                        'order_id': order_id,
-                        'user_id': user_id,
-                        'product_id': product_id,
-                        'amount': amount,
-                        'currency': currency,
-                        'status': status,
-                        'channel': channel,
-                        'created_at': created_at,
-                        'paid_at': paid_at,
-                        'refunded': refunded,
-                        'refund_amount': refund_amount,
-                        'region': region,
-                        'attribution_campaign': campaign,
-                    }
-
-                    transactions.append(tx)
-                    logging.info(f"Row {index + 2}: order_id={order_id}, amount={amount}")
-
-                except Exception as e:
-                    logging.error(f"Row {index + 2} error: {str(e)}", exc_info=True)
-                    # Still add the row with defaults
-                    tx = {
-                        'id': str(uuid.uuid4()),
-                        'order_id': f"AUTO-{uuid.uuid4().hex[:8]}",
-                        'user_id': '',
-                        'product_id': '',
-                        'amount': 0.0,
-                        'currency': 'USD',
-                        'status': '',
-                        'channel': '',
-                        'created_at': datetime.utcnow().isoformat(),
-                        'paid_at': None,
-                        'refunded': False,
-                        'refund_amount': 0.0,
-                        'region': '',
-                        'attribution_campaign': '',
-                    }
-                    transactions.append(tx)
+            transform_started = time.perf_counter()
+            transactions, row_errors = to_transactions(frame_records(df), columns)
 
+            # Reporting-currency amounts for the whole file in one vectorized rate lookup
+            fx_missing = apply_amount_base(transactions)
+            if fx_missing:
+                logger.warning(f"No FX rate for {fx_missing} rows; they count at face value until rates are added")
+            metrics.IMPORT_SECONDS.observe(time.perf_counter() - transform_started, stage='transform')
             logging.info(f"Total transactions to insert: {len(transactions)}")
 
             if not transactions:
@@ -249,27 +251,46 @@ class ImportService:
 
             # Insert into DB
             try:
-                logging.info(f"About to insert {len(transactions)} transactions")
-                logging.info(f"First transaction: {transactions[0] if transactions else 'NONE'}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"First transaction: {transactions[0]}")
                 
-                result = await self.collection.insert_many(transactions)
+                with metrics.IMPORT_SECONDS.time(stage='insert'):
+                    for tx in transactions:
+                        add_meta(tx)
+                    result = await self.collection.insert_many(transactions)
                 inserted = len(result.inserted_ids)
                 
                 logging.info(f"Successfully inserted {inserted} records")
-                logging.info(f"Inserted IDs: {result.inserted_ids[:5]}")
                 
-                # Verify insertion
-                count_after = await self.collection.count_documents({})
+                # Verify insertion (metadata count: no collection scan)
+                count_after = await self.collection.estimated_document_count()
                 logging.info(f"Total transactions in DB after insert: {count_after}")
                 
             except Exception as e:
                 logging.error(f"DB insert error: {str(e)}", exc_info=True)
                 inserted = 0
 
+            if inserted and self.sketches:
+                try:
+                    with metrics.IMPORT_SECONDS.time(stage='sketch'):
+                        await self.sketches.add(transactions)
+                except Exception as e:
+                    # Derived data: the rows are in, a sketch --rebuild catches up
+                    logger.error(f"Sketch update failed: {str(e)}", exc_info=True)
+
+            elapsed = time.perf_counter() - started
+            metrics.IMPORT_SECONDS.observe(elapsed, stage='total')
+            metrics.IMPORT_ROWS.inc(inserted, outcome='imported')
+            metrics.IMPORT_ROWS.inc(row_errors, outcome='defaulted')
+            metrics.IMPORT_ROWS.inc(len(transactions) - inserted, outcome='insert_failed')
+            if elapsed > 0:
+                metrics.IMPORT_ROWS_PER_SECOND.set(total_rows / elapsed)
+
             return {
                 'success': True,
                 'imported': inserted,
                 'skipped': 0,
+                'fx_missing': fx_missing,
                 'total': total_rows,
             }
 
@@ -281,3 +302,7 @@ class ImportService:
                 'detail': str(e),
                 'total': total_rows,
             }
+
+    def query_shapes(self) -> List[Dict[str, Any]]:
+        """Read queries issued during import (plan verification); import only writes today."""
+        return []
@@ -0,0 +1,180 @@
+"""
+Index bootstrap and query-plan verification for the transactions collection
+(either storage layout, see storage_service).
+
+Each service declares the indexes its queries need (`INDEXES`) and exposes the
+query shapes it issues (`query_shapes()`). At startup `ensure_indexes()` creates
+the union of those indexes and backfills `revenue_date` on documents imported
+before it existed. `verify_query_plans()` explains every shape and reports any
+COLLSCAN. tests/test_query_plans.py runs it against MONGO_URL (skipped when no
+server answers); from the command line:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=revenue python -m services.index_service --verify
+"""
+import logging
+from typing import Any, Dict, Iterable, List
+
+from pymongo import IndexModel
+
+from services.analytics_service import AnalyticsService
+from services.export_service import ExportService
+from services.import_service import ImportService
+from services import storage_service
+
+logger = logging.getLogger(__name__)
+
+SERVICES = (AnalyticsService, ExportService, ImportService)
+
+# Below this many documents the planner may legitimately prefer a COLLSCAN
+DEFAULT_MIN_DOCS_FOR_VERIFY = 10_000
+
+
+class QueryPlanError(RuntimeError):
+    """Raised when a verified query shape falls back to a collection scan."""
+
+
+def _index_name(keys: List) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _plan_stages(node: Any) -> Iterable[str]:
+    """Yield every stage name in the winning plan(s) of an explain document."""
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            yield node["stage"]
+        for key, value in node.items():
+            if key in ("rejectedPlans", "allPlansExecution"):
+                continue
+            yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _plan_stages(item)
+
+
+class IndexService:
+    def __init__(self, db):
+        self.db = db
+        self.storage = storage_service.TRANSACTIONS_STORAGE
+        self.collection = storage_service.transactions_collection(db, self.storage)
+
+    def declared_indexes(self) -> List[IndexModel]:
+        """Union of every service's INDEXES, deduplicated by key pattern."""
+        seen = {}
+        for service in SERVICES:
+            for keys in service.INDEXES:
+                seen.setdefault(tuple(keys), IndexModel(list(keys), name=_index_name(keys)))
+        return list(seen.values())
+
+    async def ensure_indexes(self) -> List[str]:
+        """Create declared indexes (idempotent) and backfill revenue_date."""
+        await storage_service.StorageService(self.db, self.storage).ensure_collection()
+        backfilled = await self.backfill_revenue_date()
+        if backfilled:
+            logger.info(f"Backfilled revenue_date on {backfilled} transactions")
+        names = await self.collection.create_indexes(self.declared_indexes())
+        logger.info(f"Ensured indexes on {self.collection.name}: {names}")
+        return names
+
+    async def backfill_revenue_date(self) -> int:
+        """Derive revenue_date (paid_at, else created_at) for documents missing it."""
+        if self.storage == "timeseries":
+            # revenue_date is the timeField: every stored document has one
+            return 0
+        result = await self.collection.update_many(
+            {"revenue_date": {"$exists": False}},
+            [{
+                "$set": {
+                    "revenue_date": {
+                        "$ifNull": [
+                            {"$dateFromString": {"dateString": "$paid_at", "onError": None, "onNull": None}},
+                            {"$dateFromString": {"dateString": "$created_at", "onError": None, "onNull": None}},
+                        ]
+                    }
+                }
+            }]
+        )
+        return result.modified_count
+
+    def query_shapes(self) -> List[Dict[str, Any]]:
+        shapes = []
+        for service in SERVICES:
+            for shape in service(self.db).query_shapes():
+                shapes.append({**shape, "service": service.__name__})
+        return shapes
+
+    async def explain(self, shape: Dict[str, Any]) -> Dict[str, Any]:
+        kind = shape["kind"]
+        if kind == "find":
+            cursor = self.collection.find(shape.get("filter", {}))
+            if shape.get("sort"):
+                cursor = cursor.sort(shape["sort"])
+            if shape.get("hint"):
+                cursor = cursor.hint(shape["hint"])
+            if shape.get("limit"):
+                cursor = cursor.limit(shape["limit"])
+            return await cursor.explain()
+        if kind == "count":
+            pipeline = [{"$match": shape["filter"]}, {"$group": {"_id": 1, "n": {"$sum": 1}}}]
+        else:
+            pipeline = shape["pipeline"]
+        return await self.db.command(
+            "aggregate", self.collection.name, pipeline=pipeline, explain=True,
+            **({"hint": dict(shape["hint"])} if shape.get("hint") else {})
+        )
+
+    async def verify_query_plans(
+        self, min_docs: int = DEFAULT_MIN_DOCS_FOR_VERIFY, strict: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Explain every service query shape. With strict=True, raise QueryPlanError
+        if any of them uses COLLSCAN while the collection holds >= min_docs documents.
+        """
+        doc_count = await self.collection.estimated_document_count()
+        report = []
+        for shape in self.query_shapes():
+            stages = sorted(set(_plan_stages(await self.explain(shape))))
+            report.append({
+                "service": shape["service"],
+                "name": shape["name"],
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+            })
+
+        offenders = [f"{r['service']}.{r['name']}" for r in report if r["collscan"]]
+        if offenders:
+            message = f"COLLSCAN in {len(offenders)} query shape(s) over {doc_count} docs: {', '.join(offenders)}"
+            if strict and doc_count >= min_docs:
+                raise QueryPlanError(message)
+            logger.warning(message)
+        return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import json
+    import os
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Create transaction indexes and verify query plans.")
+    parser.add_argument("--verify", action="store_true", help="explain every query shape after creating indexes")
+    parser.add_argument("--min-docs", type=int, default=DEFAULT_MIN_DOCS_FOR_VERIFY)
+    args = parser.parse_args()
+
+    async def _main() -> int:
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        service = IndexService(client[os.environ["DB_NAME"]])
+        try:
+            await service.ensure_indexes()
+            if args.verify:
+                report = await service.verify_query_plans(min_docs=args.min_docs)
+                print(json.dumps(report, indent=2))
+        except QueryPlanError as e:
+            print(str(e))
+            return 1
+        finally:
+            client.close()
+        return 0
+
+    raise SystemExit(asyncio.run(_main()))
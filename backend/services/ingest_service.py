@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from dateutil import parser
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+import metrics
+from models import TransactionCreate
+from services.import_service import _as_utc
+from services.fx_service import apply_amount_base
+from services.storage_service import add_meta, transactions_collection
+
+logger = logging.getLogger(__name__)
+
+# A batch is written when it reaches INGEST_BATCH_SIZE rows or its oldest row
+# has waited INGEST_FLUSH_MS, whichever comes first.
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '500'))
+INGEST_FLUSH_MS = float(os.environ.get('INGEST_FLUSH_MS', '50'))
+# Rows buffered but not yet written; submitters wait for room beyond this
+INGEST_MAX_PENDING = int(os.environ.get('INGEST_MAX_PENDING', '50000'))
+# accepted: ack once buffered (lost if the process dies before the flush)
+# written:  ack after the batch insert is acknowledged by the primary (w=1)
+# durable:  ack after the batch is journaled on a majority (w=majority, j=true)
+ACK_MODES = ('accepted', 'written', 'durable')
+INGEST_ACK = os.environ.get('INGEST_ACK', 'written')
+
+_WRITTEN = WriteConcern(w=1)
+_DURABLE = WriteConcern(w='majority', j=True)
+
+
+class IngestError(RuntimeError):
+    """Raised to waiting submitters when their rows could not be written."""
+
+
+def to_document(tx: TransactionCreate) -> Dict[str, Any]:
+    """Shape a validated transaction like ImportService rows (id, created_at, revenue_date, amount_base)."""
+    now = datetime.utcnow()
+    doc = tx.model_dump()
+    doc['id'] = str(uuid.uuid4())
+    doc['created_at'] = now.isoformat()
+    paid_dt = parser.parse(tx.paid_at) if tx.paid_at else None
+    doc['paid_at'] = paid_dt.isoformat() if paid_dt else None
+    doc['revenue_date'] = _as_utc(paid_dt or now)
+    apply_amount_base([doc])
+    return add_meta(doc)
+
+
+class _Submission:
+    __slots__ = ('end', 'durable', 'future', 'failed')
+
+    def __init__(self, end: int, durable: bool, future: Optional[asyncio.Future]):
+        self.end = end
+        self.durable = durable
+        self.future = future
+        self.failed = 0
+
+
+class IngestService:
+    """
+    Write-coalescing buffer for the transaction ingest endpoints.
+
+    Submissions append documents to one in-process buffer; a single flusher
+    task turns it into insert_many batches of up to INGEST_BATCH_SIZE rows,
+    lingering at most INGEST_FLUSH_MS for a batch to fill. A batch uses the
+    strongest write concern any of its submitters asked for. `before_flush()`
+    runs before each insert and `on_flush(written_docs)` after it (also when
+    nothing was written), so derived state can be updated from exactly the
+    rows that landed.
+    """
+
+    def __init__(
+        self,
+        db,
+        before_flush: Optional[Callable[[], None]] = None,
+        on_flush: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None
+    ):
+        self.collection = transactions_collection(db)
+        self._collections = {
+            False: self.collection.with_options(write_concern=_WRITTEN),
+            True: self.collection.with_options(write_concern=_DURABLE),
+        }
+        self.before_flush = before_flush
+        self.on_flush = on_flush
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffered_upto = 0  # sequence number after the last buffered row
+        self._waiting: Deque[_Submission] = deque()
+        self._has_rows: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._room: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        self._has_rows = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is buffered, then stop the flusher."""
+        if not self._task:
+            return
+        self._stopping = True
+        self._has_rows.set()
+        self._batch_full.set()
+        await self._task
+        self._task = None
+
+    async def submit(self, docs: List[Dict[str, Any]], ack: str = INGEST_ACK) -> None:
+        """
+        Buffer documents and return according to `ack` (see ACK_MODES).
+        Raises IngestError if a waited-for write failed.
+        """
+        if ack not in ACK_MODES:
+            raise ValueError(f"Unknown ack mode '{ack}'")
+        if not docs:
+            return
+        async with self._room:
+            await self._room.wait_for(lambda: len(self._buffer) < INGEST_MAX_PENDING)
+            self._buffer.extend(docs)
+            self._buffered_upto += len(docs)
+            future = None if ack == 'accepted' else asyncio.get_running_loop().create_future()
+            self._waiting.append(_Submission(self._buffered_upto, ack == 'durable', future))
+        metrics.INGEST_ROWS.inc(len(docs), outcome='accepted')
+        metrics.INGEST_PENDING.set(len(self._buffer))
+        self._has_rows.set()
+        if len(self._buffer) >= INGEST_BATCH_SIZE:
+            self._batch_full.set()
+        if future is not None:
+            await future
+
+    async def _run(self) -> None:
+        while True:
+            if self._stopping and not self._buffer:
+                return
+            await self._has_rows.wait()
+            if self._stopping and not self._buffer:
+                return
+            if len(self._buffer) < INGEST_BATCH_SIZE and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), INGEST_FLUSH_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Ingest flush failed: {str(e)}", exc_info=True)
+
+    async def _flush(self) -> None:
+        batch = self._buffer[:INGEST_BATCH_SIZE]
+        del self._buffer[:len(batch)]
+        if not self._buffer:
+            self._has_rows.clear()
+        if len(self._buffer) < INGEST_BATCH_SIZE:
+            self._batch_full.clear()
+        async with self._room:
+            self._room.notify_all()
+        metrics.INGEST_PENDING.set(len(self._buffer))
+        if not batch:
+            return
+
+        batch_end = self._buffered_upto - len(self._buffer)
+        batch_start = batch_end - len(batch)
+        # Earlier submissions are settled, so the ones with rows in this batch lead the queue
+        durable = False
+        for submission in self._waiting:
+            durable = durable or submission.durable
+            if submission.end >= batch_end:
+                break
+
+        failed_rows: List[int] = []
+        if self.before_flush:
+            self.before_flush()
+        started = time.perf_counter()
+        try:
+            await self._collections[durable].insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            failed_rows = [error['index'] for error in e.details.get('writeErrors', [])]
+            logger.error(f"Ingest batch: {len(failed_rows)} of {len(batch)} rows failed")
+        except Exception as e:
+            failed_rows = list(range(len(batch)))
+            logger.error(f"Ingest batch of {len(batch)} rows failed: {str(e)}")
+        metrics.INGEST_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        metrics.INGEST_BATCH_ROWS.observe(len(batch))
+        metrics.INGEST_ROWS.inc(len(batch) - len(failed_rows), outcome='written')
+        metrics.INGEST_ROWS.inc(len(failed_rows), outcome='failed')
+
+        # Attribute failed rows to the submissions that own them
+        for index in failed_rows:
+            seq = batch_start + index
+            for submission in self._waiting:
+                if seq < submission.end:
+                    submission.failed += 1
+                    break
+
+        failed = set(failed_rows)
+        written = [doc for i, doc in enumerate(batch) if i not in failed] if failed else batch
+        try:
+            # Before acking, so a client reading right after its ack sees its rows
+            if self.on_flush:
+                await self.on_flush(written)
+        finally:
+            while self._waiting and self._waiting[0].end <= batch_end:
+                submission = self._waiting.popleft()
+                if submission.future is None or submission.future.done():
+                    continue
+                if submission.failed:
+                    submission.future.set_exception(IngestError(f"{submission.failed} row(s) could not be written"))
+                else:
+                    submission.future.set_result(None)
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often the watcher asks for the dataset version when clients are connected
+# (writes through this worker wake it immediately via notify())
+LIVE_POLL_SECONDS = float(os.environ.get('LIVE_POLL_SECONDS', '2'))
+# Comment line sent to idle connections so proxies don't time them out
+LIVE_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_HEARTBEAT_SECONDS', '25'))
+# Floor between broadcasts, so steady ingest doesn't push an event per flushed batch
+LIVE_MIN_INTERVAL_SECONDS = float(os.environ.get('LIVE_MIN_INTERVAL_SECONDS', '1'))
+LIVE_MAX_CONNECTIONS = int(os.environ.get('LIVE_MAX_CONNECTIONS', '10000'))
+
+KPI_FIELDS = ('today', 'mtd', 'ytd', 'rhi')
+# Summary fields compared between versions to tell clients what to refetch
+TRACKED_FIELDS = KPI_FIELDS + ('top_products', 'anomalies')
+
+
+class LiveService:
+    """
+    Fans dataset-version changes out to connected dashboards.
+
+    One watcher task per worker polls the version and, when it moves, builds
+    a single event (headline KPIs from the cached summary plus the list of
+    fields that changed) and hands it to every subscriber. Each connection
+    only owns a one-slot queue that keeps the newest event, so thousands of
+    idle clients cost a parked coroutine each and slow readers never make
+    the broadcast wait or pile up stale events.
+    """
+
+    def __init__(self, versions, analytics):
+        self.versions = versions
+        self.analytics = analytics
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._latest: Optional[Dict[str, Any]] = None
+        self._latest_summary: Optional[Dict[str, Any]] = None
+        self._publish_lock = asyncio.Lock()
+        self._published_at = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connections(self) -> int:
+        return len(self._subscribers)
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        """Wake the watcher now (this worker just changed the data)."""
+        if self._wake:
+            self._wake.set()
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= LIVE_MAX_CONNECTIONS
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        metrics.LIVE_CONNECTIONS.set(len(self._subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        metrics.LIVE_CONNECTIONS.set(len(self._subscribers))
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """Event for the current version (sent to clients as they connect)."""
+        await self._publish(await self.versions.current())
+        return self._latest
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), LIVE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._subscribers:
+                continue
+            delay = LIVE_MIN_INTERVAL_SECONDS - (time.monotonic() - self._published_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._publish(await self.versions.current())
+            except Exception as e:
+                logger.error(f"Live update failed: {str(e)}")
+
+    async def _publish(self, version: int) -> None:
+        """Build and broadcast the event for `version` unless it already went out."""
+        async with self._publish_lock:
+            if self._latest is not None and self._latest['version'] == version:
+                return
+            summary = await self.analytics.get_revenue_summary()
+            previous = self._latest_summary
+            changed: List[str] = [
+                field for field in TRACKED_FIELDS
+                if previous is None or previous[field] != summary[field]
+            ]
+            event = {
+                'version': version,
+                'kpis': {field: summary[field] for field in KPI_FIELDS},
+                'changed': ['transactions'] + changed,
+            }
+            self._latest, self._latest_summary = event, summary
+            self._published_at = time.monotonic()
+            for queue in self._subscribers:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+            metrics.LIVE_EVENTS.inc()
@@ -1,19 +1,24 @@
 # services/narrative_service.py - FINAL CORRECTED for Google Gemini
 
-# --- UPDATED Imports for Gemini ---
+# --- Gemini SDK is imported lazily (see NarrativeService._genai) ---
+import importlib.util
+
 try:
-    import google.generativeai as genai
-    from google.generativeai import types
-    GENAI_AVAILABLE = True
-except ImportError:
+    GENAI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ModuleNotFoundError:
     GENAI_AVAILABLE = False
 
+genai = None
+
 # ----------------------------------
 
 import os
-from typing import List, Dict
+import time
+from typing import AsyncIterator, List, Dict
 import logging
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,9 +26,8 @@ class NarrativeService:
     def __init__(self):
         # Use standard Gemini environment variable
         self.api_key = os.environ.get("GEMINI_API_KEY", "")
-        
-        if self.api_key and GENAI_AVAILABLE:
-            genai.configure(api_key=self.api_key)
+        # SDK import and configure() are deferred to the first LLM call
+        self._configured = False
 
         # Choose a balanced model (speed + cost-effective)
         self.model = "gemini-2.5-flash"
@@ -34,6 +38,17 @@ class NarrativeService:
             "Provide concise, actionable insights in 2-3 sentences."
         )
 
+    def _genai(self):
+        """Import and configure the Gemini SDK on first use."""
+        global genai
+        if genai is None:
+            import google.generativeai as genai_module
+            genai = genai_module
+        if not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+        return genai
+
     async def generate_narrative(
         self,
         today: float,
@@ -50,25 +65,10 @@ class NarrativeService:
         if not self.api_key or not GENAI_AVAILABLE:
             return self._generate_fallback_narrative(today, mtd, ytd, rhi, top_products, anomalies)
 
+        started = time.perf_counter()
         try:
-            # Prepare context data
-            top_product_names = [p.get("name", "Unknown") for p in top_products[:3]]
-            anomaly_count = len(anomalies)
-            spike_count = sum(1 for a in anomalies if a.get("direction") == "spike")
-            drop_count = anomaly_count - spike_count
-
-            prompt = f"""
-Analyze this revenue data and provide a brief narrative summary:
-
-- Today's revenue: ${today:,.2f}
-- Month-to-date: ${mtd:,.2f}
-- Year-to-date: ${ytd:,.2f}
-- Revenue Health Index: {rhi}%
-- Top products: {', '.join(top_product_names) if top_product_names else 'N/A'}
-- Anomalies detected: {anomaly_count} ({spike_count} spikes, {drop_count} drops)
-
-Provide 2-3 sentences highlighting key insights and trends.
-"""
+            prompt = self._build_prompt(today, mtd, ytd, rhi, top_products, anomalies)
+            genai = self._genai()
 
             # --- Gemini Chat Completion Logic ---
             response = genai.GenerativeModel(
@@ -83,14 +83,97 @@ Provide 2-3 sentences highlighting key insights and trends.
 
             # Return trimmed response text
             if response and hasattr(response, 'text'):
+                metrics.LLM_SECONDS.observe(time.perf_counter() - started, mode='complete', outcome='ok')
                 return response.text.strip()
             else:
+                metrics.LLM_SECONDS.observe(time.perf_counter() - started, mode='complete', outcome='empty')
                 return self._generate_fallback_narrative(today, mtd, ytd, rhi, top_products, anomalies)
 
         except Exception as e:
+            metrics.LLM_SECONDS.observe(time.perf_counter() - started, mode='complete', outcome='error')
             logger.error(f"Failed to generate narrative: {str(e)}")
             return self._generate_fallback_narrative(today, mtd, ytd, rhi, top_products, anomalies)
 
+    async def stream_narrative(
+        self,
+        today: float,
+        mtd: float,
+        ytd: float,
+        rhi: float,
+        top_products: List[Dict],
+        anomalies: List[Dict],
+    ) -> AsyncIterator[str]:
+        """
+        Stream the narrative as text chunks as Gemini produces them.
+        Yields the rule-based narrative in one chunk if the LLM is unavailable
+        or fails before producing any text.
+        """
+        if not self.api_key or not GENAI_AVAILABLE:
+            yield self._generate_fallback_narrative(today, mtd, ytd, rhi, top_products, anomalies)
+            return
+
+        produced = False
+        outcome = 'error'
+        started = time.perf_counter()
+        try:
+            prompt = self._build_prompt(today, mtd, ytd, rhi, top_products, anomalies)
+            genai = self._genai()
+            response = await genai.GenerativeModel(
+                model_name=self.model,
+                system_instruction=self.system_message_content,
+            ).generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.2,
+                ),
+                stream=True,
+            )
+            async for chunk in response:
+                text = getattr(chunk, 'text', '')
+                if text:
+                    if not produced:
+                        metrics.LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                    produced = True
+                    yield text
+            outcome = 'ok' if produced else 'empty'
+        except Exception as e:
+            logger.error(f"Failed to stream narrative: {str(e)}")
+        finally:
+            metrics.LLM_SECONDS.observe(time.perf_counter() - started, mode='stream', outcome=outcome)
+
+        if not produced:
+            yield self._generate_fallback_narrative(today, mtd, ytd, rhi, top_products, anomalies)
+
+    def _build_prompt(
+        self,
+        today: float,
+        mtd: float,
+        ytd: float,
+        rhi: float,
+        top_products: List[Dict],
+        anomalies: List[Dict],
+    ) -> str:
+        """Build the LLM prompt from the summary figures."""
+        # Prepare context data
+        top_product_names = [p.get("name", "Unknown") for p in top_products[:3]]
+        anomaly_count = len(anomalies)
+        spike_count = sum(1 for a in anomalies if a.get("direction") == "spike")
+        drop_count = anomaly_count - spike_count
+
+        prompt = f"""
+Analyze this revenue data and provide a brief narrative summary:
+
+- Today's revenue: ${today:,.2f}
+- Month-to-date: ${mtd:,.2f}
+- Year-to-date: ${ytd:,.2f}
+- Revenue Health Index: {rhi}%
+- Top products: {', '.join(top_product_names) if top_product_names else 'N/A'}
+- Anomalies detected: {anomaly_count} ({spike_count} spikes, {drop_count} drops)
+
+Provide 2-3 sentences highlighting key insights and trends.
+"""
+        return prompt
+
     # ------------------ FALLBACK ------------------
     def _generate_fallback_narrative(
         self,
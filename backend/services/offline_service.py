@@ -0,0 +1,243 @@
+"""
+Offline analytics over transaction exports, without MongoDB.
+
+    cd backend
+    python -m services.offline_service exports/ march.csv --end 2025-06-30T23:59:59 \\
+        --format csv --out report/
+
+Inputs are CSV, Excel (.xlsx/.xls) and Parquet files, or directories of
+them. Rows are read the way an import reads them (import_service.map_columns
+and to_transactions, then fx_service.apply_amount_base) and folded by
+AnalyticsService.fold_offline, the twin that keeps cached dashboards current;
+the report's sections are then built by the same code as /v1/dashboard, so a
+dump of the live data reproduces the dashboard for the same period.
+
+CSV and Parquet files are streamed OFFLINE_CHUNK_ROWS rows at a time (Excel
+files are read whole: the format tops out at ~1M rows). Chunks are
+normalized and folded in a process pool and the per-chunk results, which
+only hold per-day and per-product totals, are merged, so memory is bounded by
+the chunks in flight whatever the input size.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from services.analytics_service import AnalyticsService
+from services.archive_service import PARQUET_AVAILABLE
+from services.fx_service import apply_amount_base
+from services.import_service import frame_records, map_columns, to_transactions
+
+logger = logging.getLogger(__name__)
+
+OFFLINE_CHUNK_ROWS = int(os.environ.get('OFFLINE_CHUNK_ROWS', '100000'))
+INPUT_EXTS = ('csv', 'xlsx', 'xls', 'parquet')
+REPORT_FORMATS = ('json', 'csv')
+# Chunks read ahead per worker: keeps the pool busy without buffering the input
+READ_AHEAD = 2
+
+# Per-process engine: workers build it once, not per chunk
+_analytics: Optional[AnalyticsService] = None
+
+
+class OfflineError(RuntimeError):
+    """Raised for inputs or options the offline CLI cannot use."""
+
+
+def _engine() -> AnalyticsService:
+    global _analytics
+    if _analytics is None:
+        _analytics = AnalyticsService(None)
+    return _analytics
+
+
+def input_files(paths: Sequence[str]) -> List[Path]:
+    """The files to read: `paths` themselves, and every input file under a directory (sorted)."""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(p for p in path.rglob('*') if p.is_file() and p.suffix.lower().lstrip('.') in INPUT_EXTS)
+        elif not path.is_file():
+            raise OfflineError(f"No such file or directory: {path}")
+        elif path.suffix.lower().lstrip('.') not in INPUT_EXTS:
+            raise OfflineError(f"Unsupported file type: {path} (use {', '.join(INPUT_EXTS)})")
+        else:
+            files.append(path)
+    return files
+
+
+def read_chunks(path: Path, chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Iterator[Any]:
+    """`path` as DataFrames of at most `chunk_rows` rows, every cell a string (NaN when empty) as imports read it."""
+    ext = path.suffix.lower().lstrip('.')
+    if ext == 'csv':
+        try:
+            yield from pd.read_csv(path, dtype=str, chunksize=chunk_rows)
+        except pd.errors.EmptyDataError:
+            logger.warning(f"{path} is empty")
+    elif ext == 'parquet':
+        if not PARQUET_AVAILABLE:
+            raise OfflineError("Parquet input needs pyarrow (pip install pyarrow)")
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            chunk = batch.to_pandas()
+            # Typed columns as the text a CSV export would hold
+            yield chunk.astype(str).where(chunk.notna())
+    else:
+        frame = pd.read_excel(path, dtype=str)
+        for offset in range(0, len(frame), chunk_rows):
+            yield frame.iloc[offset:offset + chunk_rows]
+
+
+def fold_chunk(chunk, columns: Dict[str, str], first_line: int, start: Optional[str],
+               end: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """Normalize and fold one chunk (runs in the pool): its intermediate and row counts."""
+    analytics = _engine()
+    transactions, defaulted = to_transactions(frame_records(chunk), columns, first_line)
+    fx_missing = apply_amount_base(transactions)
+    intermediate = analytics.offline_intermediate(start, end)
+    analytics.fold_offline(intermediate, transactions)
+    return intermediate, {'rows': len(transactions), 'defaulted': defaulted, 'fx_missing': fx_missing}
+
+
+def fold_files(files: Sequence[Path], start: Optional[str], end: str, workers: int,
+               chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """Every row of `files` folded into one offline intermediate, and row counts (workers=1: in process)."""
+    analytics = _engine()
+    intermediate = analytics.offline_intermediate(start, end)
+    counts = {'files': len(files), 'rows': 0, 'defaulted': 0, 'fx_missing': 0}
+
+    def merge(result: Tuple[Dict[str, Any], Dict[str, int]]) -> None:
+        part, part_counts = result
+        analytics.merge_offline(intermediate, part)
+        for key, value in part_counts.items():
+            counts[key] += value
+
+    def chunks() -> Iterator[Tuple[Any, Dict[str, str], int]]:
+        for path in files:
+            columns: Optional[Dict[str, str]] = None
+            # File line of the chunk's first row (line 1 is the header)
+            line = 2
+            for chunk in read_chunks(path, chunk_rows):
+                if columns is None:
+                    columns = map_columns(list(chunk.columns))
+                    logger.info(f"{path}: mapped {columns}")
+                yield chunk, columns, line
+                line += len(chunk)
+
+    if workers <= 1:
+        for chunk, columns, line in chunks():
+            merge(fold_chunk(chunk, columns, line, start, end))
+        return intermediate, counts
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk, columns, line in chunks():
+            if len(pending) >= READ_AHEAD * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+            pending.add(pool.submit(fold_chunk, chunk, columns, line, start, end))
+        for future in wait(pending).done:
+            merge(future.result())
+    return intermediate, counts
+
+
+async def analyze(paths: Sequence[str], start: Optional[str] = None, end: Optional[str] = None,
+                  workers: Optional[int] = None, chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    The dashboard's summary, daily, products and anomalies sections over
+    every row of `paths`, for the period the API would use for [start, end]
+    (default end: now), plus input row counts.
+    """
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be positive")
+    end = end or datetime.now(timezone.utc).isoformat()
+    files = input_files(paths)
+    started = time.perf_counter()
+    # Blocking reads and a process pool: off the event loop
+    intermediate, counts = await asyncio.to_thread(
+        fold_files, files, start, end, workers or os.cpu_count() or 1, chunk_rows
+    )
+    sections = await _engine().offline_sections(intermediate)
+    logger.info(f"Analyzed {counts['rows']} rows from {counts['files']} files in {time.perf_counter() - started:.2f}s")
+    return {'start': start, 'end': end, 'input': counts, **sections}
+
+
+def write_report(report: Dict[str, Any], fmt: str = 'json', out: Optional[Path] = None) -> None:
+    """
+    `json`: the whole report, to `out` or stdout. `csv`: one file per
+    section in the `out` directory (summary.csv, daily.csv, products.csv,
+    anomalies.csv).
+    """
+    if fmt not in REPORT_FORMATS:
+        raise OfflineError(f"Unknown format '{fmt}' (choose from {', '.join(REPORT_FORMATS)})")
+    if fmt == 'json':
+        text = json.dumps(report, indent=2, default=str)
+        if out is None:
+            print(text)
+        else:
+            out.write_text(text + '\n')
+        return
+
+    if out is None:
+        raise OfflineError("--format csv writes one file per section: pass --out DIR")
+    out.mkdir(parents=True, exist_ok=True)
+    summary = report['summary']
+    tables = {
+        'summary': [{
+            'start': report['start'],
+            'end': report['end'],
+            **{key: summary[key] for key in ('today', 'mtd', 'ytd', 'rhi')},
+            **report['input'],
+        }],
+        'daily': report['daily'],
+        'products': report['products'],
+        'anomalies': [
+            {**row, 'possible_causes': '; '.join(row.get('possible_causes') or [])} for row in report['anomalies']
+        ],
+    }
+    for name, rows in tables.items():
+        with open(out / f'{name}.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """The command line (also behind the repository's analyze_csv.py)."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Dashboard analytics over CSV/Excel/Parquet exports, without MongoDB.')
+    parser.add_argument('paths', nargs='+', help='files, or directories of them')
+    parser.add_argument('--start', help='ISO date/datetime, as for the dashboard API (default: per-section windows)')
+    parser.add_argument('--end', help='ISO date/datetime anchoring today/MTD/YTD (default: now)')
+    parser.add_argument('--format', choices=REPORT_FORMATS, default='json')
+    parser.add_argument('--out', type=Path, help='JSON file, or directory for --format csv (default: stdout)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-rows', type=int, default=OFFLINE_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    async def _main() -> int:
+        try:
+            report = await analyze(args.paths, args.start, args.end, args.workers, args.chunk_rows)
+            write_report(report, args.format, args.out)
+        except (OfflineError, ValueError) as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        return 0
+
+    return asyncio.run(_main())
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,287 @@
+"""
+Per-version analytics state shared by every worker on a host, through mmap'd files.
+
+With several uvicorn/gunicorn workers, each one would compute and hold its
+own copy of the per-version arrays: cohort matrices and fitted forecast
+state. Setting SHARED_STATE_DIR builds them once per host, and every worker
+reads them in place. Put the directory on tmpfs (e.g. /dev/shm/revenue-hub)
+so the files never touch disk.
+
+- Each entry is one file, `<name>.state`. It starts with a header: magic,
+  header length, then JSON with the entry's key, its scalars and an array
+  table. The raw arrays follow, 64-byte aligned.
+- Readers mmap the file read-only and wrap each array with np.frombuffer. All
+  workers therefore share the same page-cache pages: nothing is copied or
+  deserialized, and memory does not grow with the worker count.
+- A missing or outdated entry is rebuilt by the worker that takes the
+  entry's flock first. The others poll until the file holds their key.
+- The builder writes a temporary file and os.replace()s it over the entry.
+  Readers therefore see the old state or the new one, never a partial file.
+  A mapping made before the swap stays valid for as long as its worker
+  holds on to it.
+
+Keys are lists ordered oldest to newest, e.g. [dataset version] or
+[dataset version, day]. A worker asking for an older key than the published
+one (a stale version read, a past as_of) builds for itself, and never
+replaces newer state. The same happens after SHARED_STATE_WAIT_SECONDS of
+waiting on a builder. A builder that dies releases its lock with its process.
+
+Needs POSIX file locks (fcntl). Leave SHARED_STATE_DIR unset to keep the
+per-worker caches. To inspect or drop entries:
+
+    SHARED_STATE_DIR=/dev/shm/revenue-hub python -m services.shared_state_service --list
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_DIR = os.environ.get('SHARED_STATE_DIR', '')
+# How long a worker waits for another worker's build before building for itself
+SHARED_STATE_WAIT_SECONDS = float(os.environ.get('SHARED_STATE_WAIT_SECONDS', '120'))
+# How often a waiting worker checks for the published entry
+SHARED_STATE_POLL_SECONDS = 0.05
+
+MAGIC = b'RHSTATE\x01'
+# Array offsets (and the data section) are aligned for SIMD loads
+ALIGNMENT = 64
+# Marks an array's slot in the header tree
+ARRAY_TAG = '__array__'
+SUFFIX = '.state'
+
+
+class SharedStateError(RuntimeError):
+    """Raised for an unusable SHARED_STATE_DIR or an unreadable entry."""
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _flatten(tree: Any, arrays: List[Any]) -> Any:
+    """`tree` as JSON, each numpy array replaced by {ARRAY_TAG: index} and appended to `arrays`."""
+    if isinstance(tree, dict):
+        return {str(key): _flatten(value, arrays) for key, value in tree.items()}
+    if isinstance(tree, (list, tuple)):
+        return [_flatten(value, arrays) for value in tree]
+    if isinstance(tree, np.ndarray):
+        if tree.dtype.hasobject:
+            raise SharedStateError("Object arrays cannot be shared")
+        arrays.append(np.ascontiguousarray(tree))
+        return {ARRAY_TAG: len(arrays) - 1}
+    if isinstance(tree, np.generic):
+        return tree.item()
+    return tree
+
+
+def _unflatten(tree: Any, arrays: List[Any]) -> Any:
+    if isinstance(tree, dict):
+        if len(tree) == 1 and ARRAY_TAG in tree:
+            return arrays[tree[ARRAY_TAG]]
+        return {key: _unflatten(value, arrays) for key, value in tree.items()}
+    if isinstance(tree, list):
+        return [_unflatten(value, arrays) for value in tree]
+    return tree
+
+
+def write_entry(path: Path, key: List[Any], tree: Dict[str, Any]) -> int:
+    """Write `tree` under `key` to `path` in the entry layout (see module docstring). Returns its size."""
+    arrays: List[Any] = []
+    flat = _flatten(tree, arrays)
+    table, offset = [], 0
+    for array in arrays:
+        table.append({'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({
+        'key': key,
+        'tree': flat,
+        'arrays': table,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'pid': os.getpid(),
+    }).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+    with open(path, 'wb') as f:
+        f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+        for spec, array in zip(table, arrays):
+            if array.nbytes:
+                f.seek(data_start + spec['offset'])
+                f.write(memoryview(array.reshape(-1)).cast('B'))
+        f.truncate(data_start + offset)
+    return data_start + offset
+
+
+def map_entry(path: Path) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Map the entry at `path` read-only: its header and its tree, whose arrays are views of the mapping."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC) + 8:
+            raise SharedStateError(f"{path} is not a shared-state entry")
+        # The mapping outlives the descriptor; the arrays keep it alive
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise SharedStateError(f"{path} is not a shared-state entry")
+    header_end = len(MAGIC) + 8 + int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], 'little')
+    header = json.loads(buffer[len(MAGIC) + 8:header_end])
+    data_start = _aligned(header_end)
+    arrays = []
+    for spec in header['arrays']:
+        dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+        count = int(np.prod(shape, dtype=np.int64))
+        if not count:
+            arrays.append(np.empty(shape, dtype=dtype))
+            continue
+        arrays.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + spec['offset']).reshape(shape))
+    header['size'] = len(buffer)
+    return header, _unflatten(header.pop('tree'), arrays)
+
+
+class SharedStateService:
+    def __init__(self, root: str = SHARED_STATE_DIR):
+        try:
+            import fcntl
+        except ImportError:
+            raise SharedStateError("SHARED_STATE_DIR needs POSIX file locks (fcntl); leave it unset on this platform")
+        self._fcntl = fcntl
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # name -> (file identity, key, tree) of the entry this worker has mapped
+        self._mapped: Dict[str, Tuple[Tuple[int, int], List[Any], Dict[str, Any]]] = {}
+
+    async def get(self, name: str, key: List[Any], build: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        The state `name` for `key`: mapped from the published entry, or
+        built by `build()` in whichever worker gets the entry's lock first
+        and published for the others.
+        """
+        key = json.loads(json.dumps(key))
+        mapped = self._mapped.get(name)
+        if mapped and mapped[1] == key:
+            metrics.CACHE_REQUESTS.inc(cache=f'shared_{name}', result='hit')
+            return mapped[2]
+        current = self._load(name)
+        if current and current[0] == key:
+            metrics.CACHE_REQUESTS.inc(cache=f'shared_{name}', result='hit')
+            return current[1]
+        metrics.CACHE_REQUESTS.inc(cache=f'shared_{name}', result='miss')
+        if current and self._newer(current[0], key):
+            return await build()
+
+        deadline = time.monotonic() + SHARED_STATE_WAIT_SECONDS
+        with open(self.root / f'{name}.lock', 'a') as lock:
+            while True:
+                try:
+                    self._fcntl.flock(lock, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    pass
+                if time.monotonic() > deadline:
+                    logger.warning(f"Shared {name} state still locked after {SHARED_STATE_WAIT_SECONDS:.0f}s; building locally")
+                    return await build()
+                await asyncio.sleep(SHARED_STATE_POLL_SECONDS)
+                current = self._load(name)
+                if current and current[0] == key:
+                    return current[1]
+            try:
+                # Published while we waited for the lock?
+                current = self._load(name)
+                if current and current[0] == key:
+                    return current[1]
+                tree = await build()
+                if current and self._newer(current[0], key):
+                    return tree
+                return self._publish(name, key, tree)
+            finally:
+                self._fcntl.flock(lock, self._fcntl.LOCK_UN)
+
+    def _newer(self, published: List[Any], key: List[Any]) -> bool:
+        try:
+            return published > key
+        except TypeError:
+            return False
+
+    def _load(self, name: str) -> Optional[Tuple[List[Any], Dict[str, Any]]]:
+        """The published entry's (key, tree), remapped only when the file was replaced."""
+        path = self.root / f'{name}{SUFFIX}'
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_dev, stat.st_ino)
+        mapped = self._mapped.get(name)
+        if mapped and mapped[0] == identity:
+            return mapped[1], mapped[2]
+        try:
+            header, tree = map_entry(path)
+        except (FileNotFoundError, SharedStateError, ValueError) as e:
+            # Replaced between the stat and the open, or not ours: rebuilt like a missing entry
+            logger.warning(f"Ignoring shared {name} state: {str(e)}")
+            return None
+        self._mapped[name] = (identity, header['key'], tree)
+        metrics.SHARED_STATE_BYTES.set(header['size'], name=name)
+        return header['key'], tree
+
+    def _publish(self, name: str, key: List[Any], tree: Dict[str, Any]) -> Dict[str, Any]:
+        """Swap in the entry for `key` and return its mapped tree (the built one if writing fails)."""
+        path = self.root / f'{name}{SUFFIX}'
+        staging = self.root / f'{name}{SUFFIX}.{os.getpid()}.tmp'
+        started = time.perf_counter()
+        try:
+            size = write_entry(staging, key, tree)
+            os.replace(staging, path)
+        except Exception as e:
+            # The state itself is fine: this worker serves it, the others build their own
+            logger.error(f"Publishing shared {name} state failed: {str(e)}", exc_info=True)
+            staging.unlink(missing_ok=True)
+            return tree
+        logger.info(f"Published shared {name} state {key} ({size} bytes) in {time.perf_counter() - started:.2f}s")
+        loaded = self._load(name)
+        return loaded[1] if loaded and loaded[0] == key else tree
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Published entries: name, key, size and when and by which process they were built."""
+        rows = []
+        for path in sorted(self.root.glob(f'*{SUFFIX}')):
+            try:
+                header, _ = map_entry(path)
+            except (FileNotFoundError, SharedStateError, ValueError):
+                continue
+            rows.append({'name': path.name[:-len(SUFFIX)], 'key': header['key'], 'bytes': header['size'],
+                         'built_at': header['built_at'], 'pid': header['pid']})
+        return rows
+
+    def clear(self) -> int:
+        """Remove every entry (mapped copies stay valid; the next request rebuilds). Returns how many."""
+        paths = list(self.root.glob(f'*{SUFFIX}'))
+        for path in paths:
+            path.unlink(missing_ok=True)
+        self._mapped.clear()
+        return len(paths)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or drop the analytics state shared by API workers.')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--list', action='store_true')
+    action.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    if not SHARED_STATE_DIR:
+        print("SHARED_STATE_DIR is not set")
+        raise SystemExit(1)
+    service = SharedStateService()
+    if args.list:
+        print(json.dumps(service.entries(), indent=2))
+    else:
+        print(json.dumps({'cleared': service.clear()}))
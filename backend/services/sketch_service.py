@@ -0,0 +1,265 @@
+"""
+Mergeable per-day sketches: distinct paying customers and order-value percentiles.
+
+Exact distinct counts (`$addToSet`) and percentiles over months of raw rows
+hold every value in memory and scan every row. Instead, every revenue row
+(REVENUE_STATUSES, as in AnalyticsService._revenue_match) is folded when it
+is written (import, ingest flush) into small per-day summaries in
+`daily_sketches`, one document per UTC day x product_id x channel plus the
+rollups (`*` for "any"), so an unfiltered day is one document:
+
+- `users`: a HyperLogLog of user_id (2^HLL_PRECISION one-byte registers,
+  stored sparse as (index, rank) pairs while that is smaller). Merging is a
+  register-wise max; the estimate's relative standard error is
+  1.04 / sqrt(2^HLL_PRECISION), about 1.6%, whatever the range.
+- `value_keys`/`value_counts`: a DDSketch of the order value in the
+  reporting currency (amount_base): counts per logarithmic bucket, so every
+  quantile is within VALUE_ACCURACY relative error of an actual order value.
+  Merging adds the counts. (A DDSketch rather than a t-digest: it merges
+  exactly, so a merged range answers the same as one sketch over the rows.)
+
+Reads merge the documents of a date range and filter in NumPy. Sketches are
+never moved by archive compaction, so they cover both tiers. Rows are only
+ever added; after an FX rate correction (or to backfill rows written before
+sketches existed) rebuild them from the hot collection and the archive:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=revenue python -m services.sketch_service --rebuild
+"""
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import IndexModel, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from services.analytics_service import REVENUE_STATUSES, _parse_bound
+from services.storage_service import transactions_collection
+
+logger = logging.getLogger(__name__)
+
+SKETCH_COLLECTION = 'daily_sketches'
+ANY = '*'
+SKETCH_DIMENSIONS = ('day', 'product_id', 'channel')
+# Changing either needs a --rebuild: stored sketches of different shapes don't merge
+HLL_PRECISION = 12
+VALUE_ACCURACY = 0.01
+# Optimistic-concurrency rounds when other workers update the same documents
+SKETCH_WRITE_RETRIES = 5
+SKETCH_REBUILD_BATCH_SIZE = 10_000
+MAX_SKETCH_DAYS = 3660
+
+HLL_ERROR = 1.04 / math.sqrt(1 << HLL_PRECISION)
+
+
+class SketchError(RuntimeError):
+    """Raised when sketch documents keep changing under a write."""
+
+
+def _summary(sketch) -> Dict[str, Any]:
+    """Orders, estimated unique users and order-value percentiles of a DaySketch."""
+    p50, p90, p99 = sketch.quantiles((0.5, 0.9, 0.99))
+    return {
+        'orders': sketch.orders,
+        # The HLL estimate can overshoot small counts; a day can't have more buyers than orders
+        'unique_users': min(sketch.distinct(), sketch.orders),
+        'p50': p50,
+        'p90': p90,
+        'p99': p99,
+    }
+
+
+class SketchService:
+    """Writes and merges the per-day sketches in `daily_sketches` (see module docstring)."""
+
+    INDEXES = [
+        [('product_id', 1), ('channel', 1), ('day', 1)],
+    ]
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db[SKETCH_COLLECTION]
+        self._indexed = False
+
+    async def ensure_indexes(self) -> None:
+        # Unique: concurrent first writes of a cell collide instead of creating two documents
+        await self.collection.create_indexes([
+            IndexModel(list(keys), name='_'.join(f'{field}_{direction}' for field, direction in keys), unique=True)
+            for keys in self.INDEXES
+        ])
+        self._indexed = True
+
+    async def add(self, docs: List[Dict[str, Any]]) -> int:
+        """
+        Fold written rows into the stored sketches. Each touched document is
+        read, merged and replaced conditionally on its `rev`; cells another
+        writer changed in between are re-read and retried. Returns the number
+        of documents written.
+        """
+        from services.sketches import DaySketch, sketch_rows
+
+        sketches = sketch_rows(docs)
+        if not sketches:
+            return 0
+        if not self._indexed:
+            await self.ensure_indexes()
+        pending = list(sketches)
+        for _ in range(SKETCH_WRITE_RETRIES):
+            stored = await self._load(pending)
+            operations = []
+            for key in pending:
+                cell = dict(zip(SKETCH_DIMENSIONS, key))
+                current = stored.get(key)
+                if current is None:
+                    sketch, condition, rev = sketches[key], {'$exists': False}, 1
+                else:
+                    sketch = DaySketch.merged([DaySketch.from_doc(current), sketches[key]])
+                    condition, rev = current['rev'], current['rev'] + 1
+                operations.append(ReplaceOne(
+                    {**cell, 'rev': condition}, {**cell, **sketch.to_doc(), 'rev': rev}, upsert=True
+                ))
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+                return len(sketches)
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                if any(error['code'] != 11000 for error in errors):
+                    raise
+                # A changed rev fails the filter, and the upsert then hits the unique index
+                pending = [pending[error['index']] for error in errors]
+                logger.info(f"Retrying {len(pending)} sketch cells changed by another writer")
+        raise SketchError(f"{len(pending)} sketch cells kept changing during {SKETCH_WRITE_RETRIES} attempts")
+
+    async def _load(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        wanted = set(keys)
+        query = {
+            field: {'$in': sorted({key[i] for key in keys})} for i, field in enumerate(SKETCH_DIMENSIONS)
+        }
+        stored = {}
+        async for doc in self.collection.find(query, {'_id': 0}):
+            key = tuple(doc[field] for field in SKETCH_DIMENSIONS)
+            if key in wanted:
+                stored[key] = doc
+        return stored
+
+    async def clear(self) -> None:
+        """Drop every sketch (used by clear-all)."""
+        await self.collection.delete_many({})
+
+    async def rebuild(self, archive=None, batch_size: int = SKETCH_REBUILD_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        Recompute every sketch from the hot collection and, given an
+        ArchiveService, the rows in its cold storage. Rows written while
+        this runs may be counted twice; run it when imports are quiet.
+        """
+        started = time.perf_counter()
+        await self.clear()
+        projection = {field: 1 for field in ('revenue_date', 'status', 'product_id', 'channel', 'user_id',
+                                             'amount', 'amount_base')}
+        query = {'revenue_date': {'$type': 'date'}, 'status': {'$in': REVENUE_STATUSES}}
+        rows = 0
+        cursor = transactions_collection(self.db).find(query, projection)
+        while True:
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                break
+            await self.add(batch)
+            rows += len(batch)
+        if archive:
+            for month in sorted(await archive.summaries.distinct('month')):
+                batch = await archive.sink.read_month(month)
+                await self.add(batch)
+                rows += len(batch)
+        result = {
+            'rows': rows,
+            'documents': await self.collection.count_documents({}),
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"Rebuilt sketches: {result}")
+        return result
+
+    # ------------------ Reads ------------------
+
+    async def get_customer_stats(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        product_id: Optional[str] = None,
+        channel: Optional[str] = None,
+        by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Approximate unique paying users and p50/p90/p99 order value over the
+        UTC days of [start, end] (default: last 30 days), optionally for one
+        product and/or channel, from the merged sketches; `by` also splits the
+        result per day, product_id or channel.
+        """
+        from services.sketches import DaySketch
+
+        if by not in (None, 'day', 'product_id', 'channel'):
+            raise ValueError(f"Unknown split '{by}' (choose from day, product_id, channel)")
+        end_date = _parse_bound(end, upper=True) or datetime.now(timezone.utc)
+        start_date = _parse_bound(start) or end_date - timedelta(days=30)
+        first = start_date.astimezone(timezone.utc).date()
+        last = end_date.astimezone(timezone.utc).date()
+        if (last - first).days > MAX_SKETCH_DAYS:
+            raise ValueError(f"Ask for at most {MAX_SKETCH_DAYS} days")
+
+        query: Dict[str, Any] = {
+            'product_id': product_id or ANY,
+            'channel': channel or ANY,
+            'day': {'$gte': first.isoformat(), '$lte': last.isoformat()},
+        }
+        if by in ('product_id', 'channel'):
+            if query[by] != ANY:
+                raise ValueError(f"Cannot split by {by} and filter on it")
+            query[by] = {'$ne': ANY}
+        groups: Dict[str, List[DaySketch]] = {}
+        async for doc in self.collection.find(query, {'_id': 0, 'rev': 0}):
+            groups.setdefault(doc[by] if by else '', []).append(DaySketch.from_doc(doc))
+
+        total = DaySketch.merged(sketch for sketches in groups.values() for sketch in sketches)
+        rows = []
+        if by:
+            for key, sketches in groups.items():
+                rows.append({'key': key, **_summary(DaySketch.merged(sketches))})
+            rows.sort(key=lambda row: row['key'] if by == 'day' else (-row['orders'], row['key']))
+        return {
+            'start': first.isoformat(),
+            'end': last.isoformat(),
+            'unique_users_error': round(HLL_ERROR, 4),
+            'value_accuracy': VALUE_ACCURACY,
+            'total': _summary(total),
+            'rows': rows,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    import asyncio
+    import json
+    import os
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from services.archive_service import ArchiveService
+    from services.version_service import VersionService
+
+    parser = argparse.ArgumentParser(description='Rebuild the per-day customer and order-value sketches.')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.add_argument('--batch-size', type=int, default=SKETCH_REBUILD_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def _main() -> int:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        db = client[os.environ['DB_NAME']]
+        try:
+            result = await SketchService(db).rebuild(ArchiveService(db), args.batch_size)
+            await VersionService(db).bump()
+            print(json.dumps(result, indent=2))
+        finally:
+            client.close()
+        return 0
+
+    raise SystemExit(asyncio.run(_main()))
@@ -0,0 +1,176 @@
+"""
+HyperLogLog and DDSketch arithmetic behind SketchService (see sketch_service).
+"""
+import hashlib
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import Binary
+
+from services.analytics_service import REVENUE_STATUSES
+from services.fx_service import base_amount
+from services.sketch_service import ANY, HLL_PRECISION, VALUE_ACCURACY
+
+_REGISTERS = 1 << HLL_PRECISION
+_RANK_BITS = 64 - HLL_PRECISION
+_GAMMA = (1 + VALUE_ACCURACY) / (1 - VALUE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Order values below this land in the zero bucket (free orders, refunds booked as negatives)
+_MIN_VALUE = 1e-6
+
+
+def _user_hash(user_id: str) -> int:
+    # Stable across processes and releases, unlike hash()
+    return int.from_bytes(hashlib.blake2b(user_id.encode(), digest_size=8).digest(), 'little')
+
+
+def _hll_updates(user_ids: List[str]):
+    """(register index, rank) of each user id, as numpy arrays."""
+    hashes = np.array([_user_hash(user) for user in user_ids], dtype=np.uint64)
+    index = (hashes >> np.uint64(_RANK_BITS)).astype(np.int64)
+    rest = hashes & np.uint64((1 << _RANK_BITS) - 1)
+    # Rank = position of the first 1 bit in the remaining bits; frexp's exponent is the bit length
+    # (exact: the remainder has fewer bits than a double's mantissa)
+    rank = _RANK_BITS + 1 - np.frexp(rest.astype(np.float64))[1]
+    return index, rank.astype(np.uint8)
+
+
+def _value_keys(values):
+    """DDSketch bucket of each positive value: ceil(log_gamma(value))."""
+    return np.ceil(np.log(values) / _LOG_GAMMA).astype(np.int32)
+
+
+class DaySketch:
+    """HyperLogLog registers and order-value buckets of one (day, product, channel) cell."""
+
+    __slots__ = ('orders', 'registers', 'keys', 'counts', 'zeros')
+
+    def __init__(self, orders: int = 0, registers=None, keys=None, counts=None, zeros: int = 0):
+        self.orders = orders
+        self.registers = registers if registers is not None else np.zeros(_REGISTERS, dtype=np.uint8)
+        self.keys = keys if keys is not None else np.zeros(0, dtype=np.int32)
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.int64)
+        self.zeros = zeros
+
+    @classmethod
+    def of(cls, user_index, user_rank, values) -> 'DaySketch':
+        """Sketch of some rows: HLL updates (see _hll_updates) and their order values."""
+        sketch = cls(orders=len(values))
+        np.maximum.at(sketch.registers, user_index, user_rank)
+        positive = values[values >= _MIN_VALUE]
+        sketch.zeros = int(len(values) - len(positive))
+        sketch.keys, sketch.counts = np.unique(_value_keys(positive), return_counts=True)
+        return sketch
+
+    @classmethod
+    def merged(cls, sketches: Iterable['DaySketch']) -> 'DaySketch':
+        sketches = list(sketches)
+        if not sketches:
+            return cls()
+        keys = np.concatenate([s.keys for s in sketches])
+        counts = np.concatenate([s.counts for s in sketches])
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return cls(
+            orders=sum(s.orders for s in sketches),
+            registers=np.maximum.reduce([s.registers for s in sketches]),
+            keys=unique.astype(np.int32),
+            counts=np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64),
+            zeros=sum(s.zeros for s in sketches),
+        )
+
+    def distinct(self) -> int:
+        """HyperLogLog estimate, with linear counting while registers are still empty."""
+        m = _REGISTERS
+        empty = int(np.count_nonzero(self.registers == 0))
+        if empty == m:
+            return 0
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        if estimate <= 2.5 * m and empty:
+            estimate = m * math.log(m / empty)
+        return int(round(estimate))
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Order value at each quantile (None without orders); rank-based like numpy's 'lower'."""
+        total = self.zeros + int(self.counts.sum())
+        if not total:
+            return [None for _ in qs]
+        cumulative = self.zeros + np.cumsum(self.counts)
+        out = []
+        for q in qs:
+            rank = q * (total - 1)
+            if rank < self.zeros:
+                out.append(0.0)
+                continue
+            i = int(np.searchsorted(cumulative, rank, side='right'))
+            # Midpoint of the bucket (gamma^(k-1), gamma^k] in relative terms
+            out.append(round(2 * _GAMMA ** int(self.keys[i]) / (_GAMMA + 1), 2))
+        return out
+
+    def to_doc(self) -> Dict[str, Any]:
+        nonzero = np.flatnonzero(self.registers)
+        if 3 * len(nonzero) < _REGISTERS:
+            # Sparse: uint16 indexes then uint8 ranks; 3 bytes per entry never equals the dense length
+            users = nonzero.astype('<u2').tobytes() + self.registers[nonzero].tobytes()
+        else:
+            users = self.registers.tobytes()
+        return {
+            'orders': self.orders,
+            'users': Binary(users),
+            'value_keys': Binary(self.keys.astype('<i4').tobytes()),
+            'value_counts': Binary(self.counts.astype('<i8').tobytes()),
+            'zero_values': self.zeros,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> 'DaySketch':
+        users = bytes(doc['users'])
+        if len(users) == _REGISTERS:
+            registers = np.frombuffer(users, dtype=np.uint8).copy()
+        else:
+            n = len(users) // 3
+            registers = np.zeros(_REGISTERS, dtype=np.uint8)
+            registers[np.frombuffer(users[:2 * n], dtype='<u2')] = np.frombuffer(users[2 * n:], dtype=np.uint8)
+        return cls(
+            orders=doc['orders'],
+            registers=registers,
+            keys=np.frombuffer(bytes(doc['value_keys']), dtype='<i4').astype(np.int32),
+            counts=np.frombuffer(bytes(doc['value_counts']), dtype='<i8').astype(np.int64),
+            zeros=doc['zero_values'],
+        )
+
+
+def sketch_rows(docs: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, str, str], DaySketch]:
+    """Sketches of the revenue rows among `docs`, keyed by (day, product_id, channel) and its rollups."""
+    groups: Dict[Tuple[str, str, str], List[int]] = {}
+    users: List[str] = []
+    values: List[float] = []
+    for doc in docs:
+        revenue_date = doc.get('revenue_date')
+        if doc.get('status') not in REVENUE_STATUSES or not isinstance(revenue_date, datetime):
+            continue
+        if revenue_date.tzinfo is not None:
+            revenue_date = revenue_date.astimezone(timezone.utc)
+        day = revenue_date.strftime('%Y-%m-%d')
+        product, channel = doc.get('product_id') or '', doc.get('channel') or ''
+        row = len(values)
+        for key in ((day, product, channel), (day, product, ANY), (day, ANY, channel), (day, ANY, ANY)):
+            groups.setdefault(key, []).append(row)
+        users.append(doc.get('user_id') or '')
+        values.append(base_amount(doc))
+    if not values:
+        return {}
+
+    index, rank = _hll_updates(users)
+    # Rows without a user still count as orders, just not as customers
+    rank[np.array([not user for user in users])] = 0
+    values = np.array(values, dtype=np.float64)
+    sketches = {}
+    for key, rows in groups.items():
+        rows = np.array(rows)
+        sketches[key] = DaySketch.of(index[rows], rank[rows], values[rows])
+    return sketches
+
+
@@ -0,0 +1,192 @@
+"""
+Storage layout of the transactions collection.
+
+TRANSACTIONS_STORAGE selects where services read and write transactions:
+
+- `collection` (default): the regular `transactions` collection.
+- `timeseries`: a MongoDB time-series collection (TIMESERIES_COLLECTION,
+  default `transactions_ts`). `revenue_date` is the timeField and `meta`
+  ({product_id, channel, region}) the metaField, so rows of one series are
+  packed into compressed buckets and windowed scans skip whole buckets by
+  their time bounds. Needs MongoDB 7.0+ (ensure_collection refuses older
+  servers): FX recompute, archive compaction and clear-all update or delete
+  arbitrary rows, which earlier time-series collections reject.
+
+Documents keep product_id/channel/region at top level in both layouts (the
+`meta` copy only drives bucketing), so every service query runs unchanged.
+Time-series collections cannot be renamed, hence the separate name. Switch
+layouts by migrating, then restarting with the new TRANSACTIONS_STORAGE:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=revenue \\
+        python -m services.storage_service --migrate timeseries
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STORAGE_LAYOUTS = ('collection', 'timeseries')
+TRANSACTIONS_STORAGE = os.environ.get('TRANSACTIONS_STORAGE', 'collection')
+COLLECTION_NAME = 'transactions'
+TIMESERIES_COLLECTION = os.environ.get('TIMESERIES_COLLECTION', 'transactions_ts')
+# Transactions of one product/channel/region arrive minutes to hours apart
+TIMESERIES_GRANULARITY = os.environ.get('TIMESERIES_GRANULARITY', 'hours')
+META_FIELDS = ('product_id', 'channel', 'region')
+# Arbitrary updates and deletes on time-series collections
+TIMESERIES_MIN_SERVER = (7, 0)
+
+MIGRATION_BATCH_SIZE = 10_000
+
+
+class StorageError(RuntimeError):
+    """Raised for an unknown layout or a migration that would mix datasets."""
+
+
+def _layout(storage: Optional[str]) -> str:
+    storage = storage or TRANSACTIONS_STORAGE
+    if storage not in STORAGE_LAYOUTS:
+        raise StorageError(f"Unknown TRANSACTIONS_STORAGE '{storage}' (choose from {', '.join(STORAGE_LAYOUTS)})")
+    return storage
+
+
+def collection_name(storage: Optional[str] = None) -> str:
+    return TIMESERIES_COLLECTION if _layout(storage) == 'timeseries' else COLLECTION_NAME
+
+
+def transactions_collection(db, storage: Optional[str] = None):
+    """The transactions collection for `storage` (default: TRANSACTIONS_STORAGE)."""
+    return db[collection_name(storage)]
+
+
+def add_meta(doc: Dict[str, Any], storage: Optional[str] = None) -> Dict[str, Any]:
+    """Set the time-series series key on a document about to be inserted (no-op for `collection`)."""
+    if _layout(storage) == 'timeseries':
+        doc['meta'] = {field: doc.get(field) for field in META_FIELDS}
+    return doc
+
+
+class StorageService:
+    def __init__(self, db, storage: Optional[str] = None):
+        self.db = db
+        self.storage = _layout(storage)
+        self.collection = transactions_collection(db, self.storage)
+
+    async def ensure_collection(self) -> bool:
+        """
+        Create the time-series collection if it is missing (inserting into a
+        missing name would silently create a regular collection). Returns True
+        if it was created. Raises StorageError on a server older than
+        TIMESERIES_MIN_SERVER.
+        """
+        if self.storage != 'timeseries':
+            return False
+        version = tuple((await self.db.command('buildInfo'))['versionArray'][:2])
+        if version < TIMESERIES_MIN_SERVER:
+            raise StorageError(
+                f"The timeseries layout needs MongoDB {'.'.join(map(str, TIMESERIES_MIN_SERVER))}+ "
+                f"(server is {'.'.join(map(str, version))}); use TRANSACTIONS_STORAGE=collection"
+            )
+        if await self.db.list_collection_names(filter={'name': self.collection.name}):
+            return False
+        await self.db.create_collection(
+            self.collection.name,
+            timeseries={'timeField': 'revenue_date', 'metaField': 'meta', 'granularity': TIMESERIES_GRANULARITY}
+        )
+        logger.info(
+            f"Created time-series collection {self.collection.name} "
+            f"(copy existing rows with `python -m services.storage_service --migrate timeseries`)"
+        )
+        return True
+
+    async def migrate(self, target: str, batch_size: int = MIGRATION_BATCH_SIZE,
+                      drop_source: bool = False) -> Dict[str, Any]:
+        """
+        Copy every transaction from the other layout into `target`, setting
+        (or stripping) `meta` on the way. The target must be empty. Rows
+        without a date `revenue_date` cannot enter a time-series collection
+        and are reported as skipped (index bootstrap backfills them first).
+        """
+        target = _layout(target)
+        source = 'collection' if target == 'timeseries' else 'timeseries'
+        destination = StorageService(self.db, target)
+        source_collection = transactions_collection(self.db, source)
+        await destination.ensure_collection()
+        if await destination.collection.find_one({}, {'_id': 1}):
+            raise StorageError(f"{destination.collection.name} is not empty; clear it before migrating")
+
+        started = time.perf_counter()
+        query = {'revenue_date': {'$type': 'date'}} if target == 'timeseries' else {}
+        total = await source_collection.count_documents({})
+        copied = 0
+        batch = []
+        async for doc in source_collection.find(query):
+            if target == 'timeseries':
+                add_meta(doc, target)
+            else:
+                doc.pop('meta', None)
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                copied += len((await destination.collection.insert_many(batch, ordered=False)).inserted_ids)
+                batch = []
+        if batch:
+            copied += len((await destination.collection.insert_many(batch, ordered=False)).inserted_ids)
+
+        if drop_source and copied == total:
+            await source_collection.drop()
+        elif drop_source:
+            logger.warning(f"Kept {source_collection.name}: copied {copied} of {total} documents")
+        result = {
+            'source': source_collection.name,
+            'target': destination.collection.name,
+            'copied': copied,
+            'skipped': total - copied,
+            'seconds': round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"Migrated transactions: {result}")
+        return result
+
+    async def stats(self) -> Dict[str, Any]:
+        """Document count and on-disk footprint of the active collection ($collStats)."""
+        cursor = self.collection.aggregate([{'$collStats': {'storageStats': {}}}])
+        storage = (await cursor.to_list(length=1))[0]['storageStats']
+        stats = {
+            'storage': self.storage,
+            'collection': self.collection.name,
+            'documents': await self.collection.count_documents({}),
+            'data_bytes': storage.get('size', 0),
+            'storage_bytes': storage.get('storageSize', 0),
+            'index_bytes': storage.get('totalIndexSize', 0),
+        }
+        if 'timeseries' in storage:
+            stats['buckets'] = storage['timeseries'].get('bucketCount', 0)
+        return stats
+
+
+if __name__ == '__main__':
+    import argparse
+    import asyncio
+    import json
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description='Migrate transactions between storage layouts.')
+    parser.add_argument('--migrate', choices=STORAGE_LAYOUTS, required=True, help='target layout')
+    parser.add_argument('--batch-size', type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument('--drop-source', action='store_true', help='drop the old collection once fully copied')
+    args = parser.parse_args()
+
+    async def _main() -> int:
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        service = StorageService(client[os.environ['DB_NAME']], args.migrate)
+        try:
+            print(json.dumps(await service.migrate(args.migrate, args.batch_size, args.drop_source), indent=2))
+        except StorageError as e:
+            print(str(e))
+            return 1
+        finally:
+            client.close()
+        return 0
+
+    raise SystemExit(asyncio.run(_main()))
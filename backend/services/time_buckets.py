@@ -0,0 +1,48 @@
+"""
+Calendar buckets (hour/day/week/month) in a timezone for AnalyticsService.get_daily_revenue.
+"""
+from datetime import datetime
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from services.analytics_service import BUCKET_FREQ
+
+
+def bucket_starts(instants, granularity: str, tz: str):
+    """Start of the `granularity` bucket (in `tz`) holding each instant of a tz-aware DatetimeIndex."""
+    local = instants.tz_convert(tz)
+    if granularity == 'hour':
+        # Subtract the local minutes instead of flooring wall time: no DST ambiguity, half-hour zones work
+        return local - pd.to_timedelta(local.minute * 60 + local.second, unit='s') \
+            - pd.to_timedelta(local.microsecond, unit='us')
+    wall = local.tz_localize(None).normalize()
+    if granularity == 'week':
+        wall = wall - pd.to_timedelta(wall.weekday, unit='D')
+    elif granularity == 'month':
+        wall = wall - pd.to_timedelta(wall.day - 1, unit='D')
+    return localize(wall, tz)
+
+
+def localize(wall, tz: str):
+    """Wall times (bucket starts, midnights) to instants in `tz`; a midnight skipped by DST moves forward."""
+    return wall.tz_localize(tz, ambiguous=np.ones(len(wall), dtype=bool), nonexistent='shift_forward')
+
+
+def bucket_range(since: datetime, until: datetime, granularity: str, tz: str):
+    """Every bucket start from the one holding `since` through `until`, tz-aware."""
+    first = bucket_starts(pd.DatetimeIndex([since]), granularity, tz)[0]
+    last = pd.Timestamp(until).tz_convert(tz)
+    if granularity == 'hour':
+        return pd.date_range(first, last, freq='h')
+    # Calendar steps in wall time, so buckets stay on local midnight across DST changes
+    wall = pd.date_range(first.tz_localize(None), last.tz_localize(None), freq=BUCKET_FREQ[granularity])
+    return localize(wall, tz)
+
+
+def bucket_labels(buckets, granularity: str) -> List[str]:
+    """API labels of bucket starts: an ISO timestamp with offset for hours, YYYY-MM-DD otherwise."""
+    if granularity == 'hour':
+        return [bucket.isoformat() for bucket in buckets]
+    return list(buckets.strftime('%Y-%m-%d'))
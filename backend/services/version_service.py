@@ -0,0 +1,49 @@
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+# How long a worker trusts its last read of the version before asking Mongo
+# again; bounds how stale another worker's view can be after an import.
+DATASET_VERSION_TTL_SECONDS = float(os.environ.get('DATASET_VERSION_TTL_SECONDS', '1'))
+
+VERSION_DOC_ID = 'transactions'
+
+
+class VersionService:
+    """
+    Monotonic dataset version, bumped whenever the transactions collection
+    changes (import, clear, ingest). Kept in `dataset_meta` so every worker
+    sees the same value; ETags and per-version caches key on it.
+
+    Writes that bypass the API (e.g. loading benchmark data directly) must
+    call bump() themselves.
+    """
+
+    def __init__(self, db):
+        self.collection = db.dataset_meta
+        self._version: Optional[int] = None
+        self._read_at = 0.0
+
+    async def current(self) -> int:
+        if self._version is not None and time.monotonic() - self._read_at < DATASET_VERSION_TTL_SECONDS:
+            return self._version
+        doc = await self.collection.find_one({'_id': VERSION_DOC_ID}, {'version': 1})
+        self._remember(doc['version'] if doc else 0)
+        return self._version
+
+    async def bump(self) -> int:
+        doc = await self.collection.find_one_and_update(
+            {'_id': VERSION_DOC_ID},
+            {'$inc': {'version': 1}, '$set': {'updated_at': datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._remember(doc['version'])
+        return self._version
+
+    def _remember(self, version: int) -> None:
+        self._version = version
+        self._read_at = time.monotonic()
@@ -0,0 +1,39 @@
+"""
+Background pre-warming of heavy modules that services import lazily.
+
+Cold-start policy: server.py imports every service module at startup, so
+those modules never import NumPy, pandas or an LLM SDK at module level.
+Numeric code lives in modules that import them at the top (services/sketches,
+baselines, holt_winters, cohort_matrices, time_buckets, fx_rates,
+shared_state_service) and that a service imports once, in the method that
+needs them; server.py only imports shared_state_service when
+SHARED_STATE_DIR is set. benchmarks/startup_benchmark.py catches
+regressions.
+
+server.py schedules prewarm() after startup so the first import/LLM/anomaly
+request doesn't pay the import cost, without delaying readiness.
+"""
+import importlib
+import logging
+import time
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Modules kept off the cold-start path (see above)
+HEAVY_MODULES = ("numpy", "pandas", "google.generativeai")
+
+
+def prewarm(modules: Iterable[str] = HEAVY_MODULES) -> Dict[str, float]:
+    """Import each module, returning per-module import time in milliseconds."""
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.info(f"Pre-warm skipped {name}: {e}")
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Pre-warmed modules (ms): {timings}")
+    return timings
@@ -1,6 +1,6 @@
 // API client ready for FastAPI backend integration
 import axios, { AxiosInstance } from 'axios';
-import type { Transaction, RevenueSummary, DailyRevenue, Product, Anomaly } from '@/types';
+import type { Transaction, TransactionSearchParams, TransactionSearchResult, RevenueSummary, DailyRevenue, Granularity, BreakdownDimension, RevenueBreakdown, CustomerSplit, CustomerStats, CohortReport, RevenueForecast, Product, Anomaly, SeriesAnomaly, Dashboard, DashboardSection } from '@/types';
 
 // Define the structure for API settings stored in localStorage
 interface ApiSettings {
@@ -66,6 +66,11 @@ class ApiClient {
     return response.data;
   }
 
+  async searchTransactions(params: TransactionSearchParams): Promise<TransactionSearchResult> {
+    const response = await this.client.get<TransactionSearchResult>('/transactions/search', { params });
+    return response.data;
+  }
+
   async getTransaction(orderId: string): Promise<Transaction> {
     const response = await this.client.get<Transaction>(`/transactions/${orderId}`);
     return response.data;
@@ -85,9 +90,57 @@ class ApiClient {
 
   // --- Insights ---
 
-  async getDailyRevenue(start?: string, end?: string): Promise<DailyRevenue[]> {
+  async getDailyRevenue(
+    start?: string,
+    end?: string,
+    granularity: Granularity = 'day',
+    tz = 'UTC'
+  ): Promise<DailyRevenue[]> {
     const response = await this.client.get<DailyRevenue[]>('/insights/revenue/daily', {
-      params: { start, end },
+      params: { start, end, granularity, tz },
+    });
+    return response.data;
+  }
+
+  async getRevenueBreakdown(
+    dimensions: BreakdownDimension[],
+    crosstabs: BreakdownDimension[][] = [],
+    start?: string,
+    end?: string,
+    limit = 50
+  ): Promise<RevenueBreakdown> {
+    const response = await this.client.get<RevenueBreakdown>('/insights/revenue/breakdown', {
+      params: {
+        dimensions: dimensions.join(','),
+        crosstabs: crosstabs.map((dims) => dims.join(':')).join(',') || undefined,
+        start,
+        end,
+        limit,
+      },
+    });
+    return response.data;
+  }
+
+  async getCustomerStats(
+    filters: { start?: string; end?: string; product_id?: string; channel?: string } = {},
+    by?: CustomerSplit
+  ): Promise<CustomerStats> {
+    const response = await this.client.get<CustomerStats>('/insights/customers', {
+      params: { ...filters, by },
+    });
+    return response.data;
+  }
+
+  async getForecast(products = 20, interval = 0.9): Promise<RevenueForecast> {
+    const response = await this.client.get<RevenueForecast>('/insights/forecast', {
+      params: { products, interval },
+    });
+    return response.data;
+  }
+
+  async getCohorts(metric: 'retention' | 'ltv', start?: string, end?: string, months = 12): Promise<CohortReport> {
+    const response = await this.client.get<CohortReport>(`/insights/cohorts/${metric}`, {
+      params: { start, end, months },
     });
     return response.data;
   }
@@ -111,6 +164,29 @@ class ApiClient {
     return response.data;
   }
 
+  async getSeriesAnomalies(
+    dimensions: SeriesAnomaly['dimension'][] = ['product_id', 'channel', 'region'],
+    lookbackDays = 30,
+    limit = 20
+  ): Promise<SeriesAnomaly[]> {
+    const response = await this.client.get<SeriesAnomaly[]>('/insights/anomalies/series', {
+      params: { dimensions: dimensions.join(','), lookback_days: lookbackDays, limit },
+    });
+    return response.data;
+  }
+
+  async getDashboard(sections: DashboardSection[], start?: string, end?: string): Promise<Dashboard> {
+    const response = await this.client.get<Dashboard>('/insights/dashboard', {
+      params: { sections: sections.join(','), start, end },
+    });
+    return response.data;
+  }
+
+  // Server-sent events stream of dataset changes (see useLiveUpdates)
+  getLiveUrl(): string {
+    return `${this.baseUrl}/insights/live`;
+  }
+
   async getNarrative(start?: string, end?: string): Promise<string> {
     const response = await this.client.get<{ narrative: string }>('/insights/narrative', {
       params: { start, end },
@@ -1,11 +1,14 @@
 import { ReactNode } from 'react';
 import { Sidebar } from './Sidebar';
+import { useLiveUpdates } from '@/hooks/useLiveUpdates';
 
 interface LayoutProps {
   children: ReactNode;
 }
 
 export function Layout({ children }: LayoutProps) {
+  useLiveUpdates();
+
   return (
     <div className="min-h-screen bg-background">
       <Sidebar />
@@ -0,0 +1,47 @@
+import { useEffect, useRef } from 'react';
+import { useQueryClient } from '@tanstack/react-query';
+import { apiClient } from '@/api/client';
+import type { LiveUpdate, RevenueSummary } from '@/types';
+
+// Query keys to refresh for each changed field reported by the server
+const KEYS_BY_FIELD: Record<string, string[][]> = {
+  transactions: [['transactions'], ['daily-revenue'], ['dashboard']],
+  top_products: [['revenue-summary'], ['top-products']],
+  anomalies: [['revenue-summary'], ['anomalies']],
+};
+
+/**
+ * Subscribes to /insights/live and keeps cached queries in step with the
+ * dataset: headline KPIs are patched in place, and only queries for fields
+ * that changed are invalidated (inactive ones just go stale, so there is no
+ * refetch burst). EventSource reconnects on its own.
+ */
+export function useLiveUpdates() {
+  const queryClient = useQueryClient();
+  const versionRef = useRef<number | null>(null);
+
+  useEffect(() => {
+    const source = new EventSource(apiClient.getLiveUrl());
+
+    source.addEventListener('update', (message) => {
+      const update: LiveUpdate = JSON.parse((message as MessageEvent).data);
+      const first = versionRef.current === null;
+      versionRef.current = update.version;
+      if (first) return; // state on connect; the queries fetched it themselves
+
+      queryClient.setQueryData<RevenueSummary>(['revenue-summary'], (old) =>
+        old ? { ...old, ...update.kpis } : old
+      );
+      const keys = update.changed.flatMap((field) => KEYS_BY_FIELD[field] ?? []);
+      const seen = new Set<string>();
+      keys.forEach((queryKey) => {
+        const id = queryKey.join('/');
+        if (seen.has(id)) return;
+        seen.add(id);
+        queryClient.invalidateQueries({ queryKey });
+      });
+    });
+
+    return () => source.close();
+  }, [queryClient]);
+}
@@ -48,12 +48,9 @@ export default function Overview() {
       queryClient.invalidateQueries({ queryKey: ['daily-revenue'] });
       queryClient.invalidateQueries({ queryKey: ['top-products'] });
       queryClient.invalidateQueries({ queryKey: ['anomalies'] });
-      
-      // Force immediate refetch
-      setTimeout(() => {
-        queryClient.refetchQueries({ queryKey: ['transactions'] });
-        queryClient.refetchQueries({ queryKey: ['revenue-summary'] });
-      }, 500);
+      queryClient.invalidateQueries({ queryKey: ['dashboard'] });
+
+      // Other open dashboards are refreshed by the live update push (useLiveUpdates)
     },
     onError: (error) => {
       const errorMsg = error instanceof Error ? error.message : 'Import failed';
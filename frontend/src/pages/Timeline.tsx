@@ -1,19 +1,23 @@
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { useQuery } from '@tanstack/react-query';
 import { apiClient } from '@/api/client';
-import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, ReferenceDot } from 'recharts';
+import { ComposedChart, Line, Area, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, ReferenceDot } from 'recharts';
 import { Badge } from '@/components/ui/badge';
 
 export default function Timeline() {
-  const { data: dailyRevenue = [] } = useQuery({
-    queryKey: ['daily-revenue'],
-    queryFn: () => apiClient.getDailyRevenue(),
+  // Daily series and anomalies come from one dashboard request (a single pass server-side)
+  const { data: dashboard } = useQuery({
+    queryKey: ['dashboard', 'timeline'],
+    queryFn: () => apiClient.getDashboard(['daily', 'anomalies']),
   });
-
-  const { data: anomalies = [] } = useQuery({
-    queryKey: ['anomalies'],
-    queryFn: () => apiClient.getAnomalies(),
+  const dailyRevenue = dashboard?.daily ?? [];
+  const anomalies = dashboard?.anomalies ?? [];
+  // Total only: the per-product forecasts aren't charted here
+  const { data: forecast } = useQuery({
+    queryKey: ['forecast', 'timeline'],
+    queryFn: () => apiClient.getForecast(0),
   });
+  const FORECAST_CHART_DAYS = 30;
 
   const formatCurrency = (value: number) => {
     return new Intl.NumberFormat('en-US', {
@@ -36,13 +40,38 @@ export default function Timeline() {
   const ma7 = calculateMA(dailyRevenue, 7);
   const ma30 = calculateMA(dailyRevenue, 30);
 
-  const chartData = dailyRevenue.map((item, idx) => ({
+  const displayDay = (day: string) => new Date(day).toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
+
+  type ChartRow = {
+    day: string;
+    displayDay: string;
+    revenue?: number;
+    orders?: number;
+    ma7?: number | null;
+    ma30?: number | null;
+    forecast?: number;
+    band?: [number, number];
+  };
+
+  const chartData: ChartRow[] = dailyRevenue.map((item, idx) => ({
     ...item,
     ma7: ma7[idx],
     ma30: ma30[idx],
-    displayDay: new Date(item.day).toLocaleDateString('en-US', { month: 'short', day: 'numeric' }),
+    displayDay: displayDay(item.day),
   }));
 
+  // The forecast starts today: it shares today's row (a partial actual) and continues past it
+  const rowsByDay = new Map(chartData.map((row) => [row.day, row]));
+  (forecast?.daily ?? []).slice(0, FORECAST_CHART_DAYS).forEach((point) => {
+    const fields = { forecast: point.revenue, band: [point.lower, point.upper] as [number, number] };
+    const row = rowsByDay.get(point.day);
+    if (row) {
+      Object.assign(row, fields);
+    } else {
+      chartData.push({ day: point.day, displayDay: displayDay(point.day), ...fields });
+    }
+  });
+
   const anomalySet = new Set(anomalies.map(a => a.day));
 
   return (
@@ -68,6 +97,12 @@ export default function Timeline() {
           <div className="w-8 h-1 bg-chart-3 rounded" />
           <span className="text-sm text-muted-foreground">30-Day MA</span>
         </div>
+        <div className="flex items-center gap-2">
+          <div className="w-8 h-1 bg-chart-4 rounded" />
+          <span className="text-sm text-muted-foreground">
+            Forecast ({Math.round((forecast?.interval ?? 0.9) * 100)}% interval)
+          </span>
+        </div>
         <Badge variant="destructive">Anomaly</Badge>
       </div>
 
@@ -75,12 +110,12 @@ export default function Timeline() {
       <Card>
         <CardHeader>
           <CardTitle>90-Day Revenue Trend</CardTitle>
-          <CardDescription>Daily revenue with 7-day and 30-day moving averages</CardDescription>
+          <CardDescription>Daily revenue with 7-day and 30-day moving averages, and the next 30 days' forecast</CardDescription>
         </CardHeader>
         <CardContent>
           <div className="h-[400px]">
             <ResponsiveContainer width="100%" height="100%">
-              <LineChart data={chartData}>
+              <ComposedChart data={chartData}>
                 <CartesianGrid strokeDasharray="3 3" stroke="hsl(var(--border))" />
                 <XAxis 
                   dataKey="displayDay" 
@@ -99,7 +134,11 @@ export default function Timeline() {
                     border: '1px solid hsl(var(--border))',
                     borderRadius: '8px',
                   }}
-                  formatter={(value: number) => formatCurrency(value)}
+                  formatter={(value: number | [number, number]) =>
+                    Array.isArray(value)
+                      ? `${formatCurrency(value[0])} – ${formatCurrency(value[1])}`
+                      : formatCurrency(value)
+                  }
                 />
                 <Line 
                   type="monotone" 
@@ -124,6 +163,22 @@ export default function Timeline() {
                   dot={false}
                   strokeDasharray="5 5"
                 />
+                <Area
+                  type="monotone"
+                  dataKey="band"
+                  stroke="none"
+                  fill="hsl(var(--chart-4))"
+                  fillOpacity={0.15}
+                  isAnimationActive={false}
+                />
+                <Line
+                  type="monotone"
+                  dataKey="forecast"
+                  stroke="hsl(var(--chart-4))"
+                  strokeWidth={2}
+                  dot={false}
+                  strokeDasharray="3 3"
+                />
                 {anomalies.map((anomaly) => {
                   const dataPoint = chartData.find(d => d.day === anomaly.day);
                   if (!dataPoint) return null;
@@ -139,7 +194,7 @@ export default function Timeline() {
                     />
                   );
                 })}
-              </LineChart>
+              </ComposedChart>
             </ResponsiveContainer>
           </div>
         </CardContent>
@@ -176,6 +231,26 @@ export default function Timeline() {
           </CardContent>
         </Card>
       </div>
+
+      {/* Forecast vs the same number of days just past */}
+      {forecast && (
+        <div className="grid gap-4 md:grid-cols-3">
+          {forecast.total.horizons.map((horizon) => (
+            <Card key={horizon.days}>
+              <CardHeader className="pb-3">
+                <CardTitle className="text-sm font-medium">Next {horizon.days} Days (forecast)</CardTitle>
+              </CardHeader>
+              <CardContent>
+                <p className="text-2xl font-bold text-foreground">{formatCurrency(horizon.revenue)}</p>
+                <p className="text-xs text-muted-foreground mt-1">
+                  {formatCurrency(horizon.lower)} – {formatCurrency(horizon.upper)}
+                  {' · '}last {horizon.days} days {formatCurrency(horizon.previous)}
+                </p>
+              </CardContent>
+            </Card>
+          ))}
+        </div>
+      )}
     </div>
   );
 }
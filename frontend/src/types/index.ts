@@ -17,6 +17,29 @@ export interface Transaction {
   attribution_campaign?: string;
 }
 
+export interface TransactionSearchParams {
+  status?: string;
+  channel?: string;
+  region?: string;
+  product_id?: string;
+  campaign?: string;
+  order_id?: string;
+  user_id?: string;
+  start?: string;
+  end?: string;
+  min_amount?: number;
+  max_amount?: number;
+  sort?: 'date' | 'amount';
+  order?: 'asc' | 'desc';
+  limit?: number;
+  cursor?: string;
+}
+
+export interface TransactionSearchResult {
+  items: Transaction[];
+  next_cursor: string | null;
+}
+
 export interface Product {
   product_id: string;
   name: string;
@@ -25,20 +48,117 @@ export interface Product {
   category?: string;
 }
 
+export type Granularity = 'hour' | 'day' | 'week' | 'month';
+
 export interface DailyRevenue {
+  // Bucket start: YYYY-MM-DD, or an ISO timestamp with offset for hourly series
   day: string;
   revenue: number;
   orders: number;
 }
 
+export type BreakdownDimension = 'channel' | 'region' | 'attribution_campaign' | 'product_id';
+
+export interface BreakdownRow {
+  key: Partial<Record<BreakdownDimension, string>>;
+  revenue: number;
+  orders: number;
+  refund_rate: number;
+  average_order_value: number;
+}
+
+export interface RevenueBreakdown {
+  start: string;
+  end: string;
+  total: BreakdownRow;
+  // "channel" for a split, "channel:region" for a cross-tab
+  groups: Record<string, BreakdownRow[]>;
+}
+
+export type CustomerSplit = 'day' | 'product_id' | 'channel';
+
+export interface CustomerRow {
+  key?: string | null;
+  orders: number;
+  // Approximate: merged per-day sketches
+  unique_users: number;
+  p50: number | null;
+  p90: number | null;
+  p99: number | null;
+}
+
+export interface CustomerStats {
+  start: string;
+  end: string;
+  unique_users_error: number;
+  value_accuracy: number;
+  total: CustomerRow;
+  rows: CustomerRow[];
+}
+
+export interface ForecastHorizon {
+  days: number;
+  revenue: number;
+  lower: number;
+  upper: number;
+  // Actual revenue of the same number of days before the forecast
+  previous: number;
+}
+
+export interface SeriesForecast {
+  product_id: string | null; // null for the total
+  horizons: ForecastHorizon[];
+}
+
+export interface ForecastPoint {
+  day: string;
+  revenue: number;
+  lower: number;
+  upper: number;
+}
+
+export interface RevenueForecast {
+  as_of: string;
+  interval: number;
+  total: SeriesForecast;
+  daily: ForecastPoint[];
+  products: SeriesForecast[];
+}
+
+export interface CohortRow {
+  cohort: string; // YYYY-MM
+  customers: number;
+  repeat_rate: number;
+  // Per month after acquisition; null until that month is reached
+  values: (number | null)[];
+}
+
+export interface CohortReport {
+  metric: 'retention' | 'ltv';
+  months: number;
+  cohorts: CohortRow[];
+  average: (number | null)[];
+}
+
 export interface Anomaly {
   day: string;
   revenue: number;
   z: number;
+  expected?: number;
   direction: 'spike' | 'drop';
   possible_causes: string[];
 }
 
+export interface SeriesAnomaly {
+  dimension: 'product_id' | 'channel' | 'region';
+  value: string;
+  day: string;
+  revenue: number;
+  expected: number;
+  z: number;
+  direction: 'spike' | 'drop';
+}
+
 export interface RevenueSummary {
   today: number;
   mtd: number;
@@ -49,6 +169,22 @@ export interface RevenueSummary {
   narrative: string;
 }
 
+export type DashboardSection = 'summary' | 'daily' | 'products' | 'anomalies' | 'transactions';
+
+export interface Dashboard {
+  summary?: RevenueSummary;
+  daily?: DailyRevenue[];
+  products?: Product[];
+  anomalies?: Anomaly[];
+  transactions?: Transaction[];
+}
+
+export interface LiveUpdate {
+  version: number;
+  kpis: Pick<RevenueSummary, 'today' | 'mtd' | 'ytd' | 'rhi'>;
+  changed: string[];
+}
+
 export interface ApiSettings {
   baseUrl: string;
   apiKey: string;
@@ -0,0 +1,66 @@
+"""
+Tests import the backend the way server.py runs it (backend/ on sys.path) and
+build their datasets with benchmarks/generate_data.py (the `generated`
+fixture: small, seeded, ending on a fixed day).
+
+Tests that need MongoDB take the `motor_db` fixture: a throwaway database on
+MONGO_URL (default mongodb://localhost:27017), dropped afterwards. They are
+skipped when no server answers, so CI gates on them by providing one.
+"""
+import os
+import sys
+import uuid
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'backend'))
+sys.path.insert(0, str(ROOT / 'backend' / 'benchmarks'))
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+GENERATED_END = date(2025, 6, 30)
+
+
+@pytest.fixture
+def generated():
+    """Factory for generated transactions shaped like ImportService output (revenue_date naive UTC)."""
+    from generate_data import TransactionGenerator
+
+    def make(rows: int = 2_000, seed: int = 7, days: int = 120, **kwargs):
+        generator = TransactionGenerator(rows, seed=seed, days=days, end=GENERATED_END, **kwargs)
+        return [doc for chunk in generator.chunks() for doc in generator.documents(chunk)]
+
+    return make
+
+
+@pytest.fixture
+def motor_db():
+    """
+    Factory for the test's database. Call it inside the test's event loop
+    (Motor binds its client to the running loop).
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    probe = MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+    try:
+        probe.admin.command('ping')
+    except PyMongoError as e:
+        probe.close()
+        pytest.skip(f"MongoDB unreachable at {MONGO_URL}: {e}")
+    name = f'revenue_hub_test_{uuid.uuid4().hex[:8]}'
+    clients = []
+
+    def connect():
+        client = AsyncIOMotorClient(MONGO_URL)
+        clients.append(client)
+        return client[name]
+
+    yield connect
+    for client in clients:
+        client.close()
+    probe.drop_database(name)
+    probe.close()
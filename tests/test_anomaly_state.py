@@ -0,0 +1,44 @@
+"""SeriesState folded a day at a time ends where the batch build over the same days does."""
+from datetime import date, timedelta
+
+import pytest
+
+from services.analytics_service import REVENUE_STATUSES
+from services.anomaly_service import BASELINES, SeriesState, baseline_config
+from services.fx_service import base_amount
+
+
+def daily_revenue(docs):
+    daily = {}
+    for doc in docs:
+        if doc['status'] in REVENUE_STATUSES:
+            day = doc['revenue_date'].strftime('%Y-%m-%d')
+            daily[day] = daily.get(day, 0.0) + base_amount(doc)
+    return daily
+
+
+@pytest.mark.parametrize('method', BASELINES)
+def test_fold_matches_build(generated, method):
+    config = baseline_config(method)
+    daily = daily_revenue(generated(rows=3_000, days=150))
+    # Leading days without sales are not observations
+    since = date.fromisoformat(min(daily)) - timedelta(days=10)
+    through = date.fromisoformat(max(daily))
+
+    folded = SeriesState(config, since.isoformat())
+    day = since
+    while day <= through:
+        folded.fold(day.isoformat(), daily.get(day.isoformat(), 0.0))
+        day += timedelta(days=1)
+    built = SeriesState.build(config, since, through, daily)
+
+    assert (folded.since, folded.through, folded.started) == (built.since, built.through, built.started)
+    assert len(folded.history) == len(built.history)
+    for ours, theirs in zip(folded.history, built.history):
+        assert ours == pytest.approx(theirs, rel=1e-9, abs=1e-6)
+    if method == 'ewma':
+        assert folded.moments == pytest.approx(built.moments, rel=1e-9)
+    else:
+        for ours, theirs in zip(folded.rings, built.rings):
+            assert ours['values'] == pytest.approx(theirs['values'])
+            assert (ours['sum'], ours['sumsq']) == pytest.approx((theirs['sum'], theirs['sumsq']), rel=1e-9)
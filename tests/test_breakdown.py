@@ -0,0 +1,42 @@
+"""Breakdown groups add up to the period's revenue, with and without archived history (needs MongoDB, see conftest)."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.analytics_service import AnalyticsService
+from services.archive_service import ArchiveService
+from services.index_service import IndexService
+from services.storage_service import add_meta, transactions_collection
+
+END = datetime(2025, 6, 30, 23, 59, 59, tzinfo=timezone.utc)
+GROUPS = [('channel',), ('region',), ('attribution_campaign',), ('product_id',), ('channel', 'region')]
+
+
+async def check(analytics):
+    breakdown = await analytics.get_breakdown(GROUPS, '2025-03-01', '2025-06-30', limit=1_000)
+    daily = await analytics.get_daily_revenue('2025-03-01', '2025-06-30')
+    total = breakdown['total']
+    assert total['revenue'] == pytest.approx(sum(row['revenue'] for row in daily), abs=0.01)
+    assert total['orders'] == sum(row['orders'] for row in daily)
+    for name, rows in breakdown['groups'].items():
+        assert sum(row['revenue'] for row in rows) == pytest.approx(total['revenue'], abs=0.01 * len(rows)), name
+        assert sum(row['orders'] for row in rows) == total['orders'], name
+    return total['revenue'], total['orders'], total['refund_rate']
+
+
+def test_breakdown_totals_match_daily_revenue(motor_db, generated):
+    async def main():
+        db = motor_db()
+        await IndexService(db).ensure_indexes()
+        await transactions_collection(db).insert_many([add_meta(dict(doc)) for doc in generated(rows=4_000)])
+        archive = ArchiveService(db)
+        hot_only = await check(AnalyticsService(db, archive=archive))
+        assert hot_only[1]
+
+        # The window now starts in compacted months, merged from the archive summaries
+        result = await archive.compact(now=END, older_than_days=60)
+        assert result['archived']
+        assert await check(AnalyticsService(db, archive=archive)) == pytest.approx(hot_only)
+
+    asyncio.run(main())
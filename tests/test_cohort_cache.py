@@ -0,0 +1,41 @@
+"""Cached cohort matrices are rebuilt when the month turns over, even if the data hasn't changed."""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from services import cohort_service
+from services.cohort_service import CohortService, _month_number
+
+
+class Versions:
+    async def current(self):
+        return 3
+
+
+def test_matrices_follow_the_current_month(monkeypatch):
+    now = [datetime(2025, 6, 30, 23, 0, tzinfo=timezone.utc)]
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now[0]
+
+    monkeypatch.setattr(cohort_service, 'datetime', Clock)
+    service = CohortService(defaultdict(object), Versions())
+    built = []
+
+    async def compute(current):
+        built.append(current)
+        return {'current': current}
+
+    monkeypatch.setattr(service, '_compute', compute)
+
+    async def main():
+        first = await service._matrices()
+        now[0] = datetime(2025, 6, 30, 23, 59, tzinfo=timezone.utc)
+        assert await service._matrices() is first
+        now[0] = datetime(2025, 7, 1, 0, 5, tzinfo=timezone.utc)
+        assert (await service._matrices())['current'] == _month_number(now[0])
+
+    asyncio.run(main())
+    assert built == [_month_number(datetime(2025, 6, 1)), _month_number(datetime(2025, 7, 1))]
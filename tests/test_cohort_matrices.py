@@ -0,0 +1,46 @@
+"""Cohort matrices and curves on a hand-built case."""
+import numpy as np
+
+from services.cohort_matrices import cohort_matrices, cohort_report, month_index
+
+
+def matrices():
+    # a: Jan (two orders) and Mar; b: Jan and Mar; c: Feb only. The last row
+    # repeats (a, Jan), as when both storage tiers hold part of a month.
+    users = ['a', 'a', 'b', 'c', 'a', 'b', 'a']
+    months = month_index(['2025-01', '2025-01', '2025-01', '2025-02', '2025-03', '2025-03', '2025-01'])
+    revenue = [10.0, 5.0, 20.0, 7.0, 3.0, 4.0, 1.0]
+    orders = [1, 1, 1, 1, 1, 1, 1]
+    return cohort_matrices(users, months, revenue, orders, int(month_index(['2025-04'])[0]))
+
+
+def test_cohort_matrices():
+    result = matrices()
+    assert result['first'] == month_index(['2025-01'])[0]
+    assert result['customers'].tolist() == [[2, 0, 2, 0], [1, 0, 0, 0]]
+    assert np.allclose(result['revenue'], [[36.0, 0, 7.0, 0], [7.0, 0, 0, 0]])
+    # a and b ordered more than once, c didn't
+    assert result['repeat'].tolist() == [2, 0]
+
+
+def test_retention_and_ltv_curves():
+    result = matrices()
+    first = result['first']
+    retention = cohort_report(result, first, first + 1, 3, 'retention')
+    assert [(c['cohort'], c['customers'], c['repeat_rate']) for c in retention['cohorts']] == [
+        ('2025-01', 2, 1.0), ('2025-02', 1, 0.0)
+    ]
+    # 2025-02 + 3 months is after the current month (2025-04): not observed yet
+    assert [c['values'] for c in retention['cohorts']] == [[1.0, 0.0, 1.0, 0.0], [1.0, 0.0, 0.0, None]]
+    assert retention['average'] == [1.0, 0.0, 0.6667, 0.0]
+
+    ltv = cohort_report(result, first, first + 1, 3, 'ltv')
+    assert [c['values'] for c in ltv['cohorts']] == [[18.0, 18.0, 21.5, 21.5], [7.0, 7.0, 7.0, None]]
+    assert ltv['average'] == [14.33, 14.33, 16.67, 21.5]
+
+
+def test_no_rows():
+    result = cohort_matrices([], month_index([]), [], [], 660)
+    assert cohort_report(result, 650, 660, 3, 'retention') == {
+        'metric': 'retention', 'months': 3, 'cohorts': [], 'average': [None, None, None, None]
+    }
@@ -0,0 +1,41 @@
+"""A daily-revenue window without rows falls back to the full date range (needs MongoDB, see conftest)."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.analytics_service import AnalyticsService
+from services.archive_service import ArchiveService
+from services.index_service import IndexService
+from services.storage_service import add_meta, transactions_collection
+
+END = datetime(2025, 6, 30, 23, 59, 59, tzinfo=timezone.utc)
+
+
+def test_empty_window_falls_back_to_full_range(motor_db, generated):
+    async def main():
+        db = motor_db()
+        await IndexService(db).ensure_indexes()
+        await transactions_collection(db).insert_many([add_meta(dict(doc)) for doc in generated(rows=2_000)])
+        archive = ArchiveService(db)
+        analytics = AnalyticsService(db, archive=archive)
+
+        everything = await analytics.get_daily_revenue('2024-01-01', '2025-12-31')
+        active = [row for row in everything if row['orders']]
+        assert active
+
+        window = await analytics.get_daily_revenue('2025-05-01', '2025-05-31')
+        assert [row['day'] for row in window] == [f'2025-05-{day:02d}' for day in range(1, 32)]
+
+        async def check(analytics):
+            empty = await analytics.get_daily_revenue('2030-01-01', '2030-01-31')
+            assert empty[0]['day'] == active[0]['day'] and empty[-1]['day'] == active[-1]['day']
+            assert sum(row['revenue'] for row in empty) == pytest.approx(sum(row['revenue'] for row in active))
+            assert sum(row['orders'] for row in empty) == sum(row['orders'] for row in active)
+
+        await check(analytics)
+        # Again with the older months in cold storage
+        await archive.compact(now=END, older_than_days=60)
+        await check(AnalyticsService(db, archive=archive))
+
+    asyncio.run(main())
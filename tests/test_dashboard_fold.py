@@ -0,0 +1,49 @@
+"""Rows folded into a cached dashboard by finish_write match a fresh aggregation (needs MongoDB, see conftest)."""
+import asyncio
+
+import pytest
+
+from services.analytics_service import AnalyticsService, _parse_bound
+from services.index_service import IndexService
+from services.storage_service import add_meta, transactions_collection
+from services.version_service import VersionService
+
+# Explicit end: the period is fixed, so the fresh pass sees the same windows as the cached one
+PERIODS = [(None, '2025-06-30'), ('2025-05-01', '2025-06-30')]
+
+
+def assert_same_totals(ours, theirs):
+    assert set(ours) == set(theirs)
+    for key, counters in theirs.items():
+        assert ours[key] == pytest.approx(counters), key
+
+
+def test_finish_write_matches_recompute(motor_db, generated):
+    async def main():
+        db = motor_db()
+        await IndexService(db).ensure_indexes()
+        collection = transactions_collection(db)
+        docs = generated(rows=4_000)
+        first, rest = docs[:2_500], docs[2_500:]
+        await collection.insert_many([add_meta(dict(doc)) for doc in first])
+
+        versions = VersionService(db)
+        analytics = AnalyticsService(db, versions)
+        version = await versions.bump()
+        for start, end in PERIODS:
+            await analytics._get_intermediate(start, end)
+
+        analytics.begin_write()
+        await collection.insert_many([add_meta(dict(doc)) for doc in rest])
+        version = await versions.bump()
+        analytics.finish_write(rest, version)
+        assert {key[0] for key in analytics._cache} == {version}
+
+        for start, end in PERIODS:
+            folded = await analytics._get_intermediate(start, end)
+            assert folded is analytics._cache[(version, start, end)][1]
+            fresh = await AnalyticsService(db)._compute_intermediate(_parse_bound(start), _parse_bound(end, upper=True))
+            for section in ('days', 'products', 'rhi'):
+                assert_same_totals(folded[section], fresh[section])
+
+    asyncio.run(main())
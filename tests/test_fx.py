@@ -0,0 +1,49 @@
+"""As-of FX lookups, cross rates through the base currency, and rows without a rate."""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from services import fx_service
+from services.fx_rates import RateTable
+from services.fx_service import apply_amount_base, base_amount
+
+# Units per USD: EUR fixes on Thursday and Monday, GBP once
+ROWS = [('2025-01-02', 'EUR', 0.90), ('2025-01-06', 'eur', 0.95), ('2025-01-02', 'GBP', 0.80)]
+
+
+def test_rates_as_of_a_day():
+    table = RateTable(ROWS, base='USD')
+    days = np.array(['2025-01-01', '2025-01-02', '2025-01-04', '2025-01-06', '2025-02-01', '2025-01-04', '2025-01-04'],
+                    dtype='datetime64[D]')
+    currencies = np.array(['EUR', 'EUR', 'EUR', 'EUR', 'EUR', 'USD', 'JPY'], dtype=object)
+    rates = table.rates(currencies, days)
+    # Before the first fixing: the first; weekends and later days: the latest on or before
+    assert rates[:6].tolist() == [0.90, 0.90, 0.90, 0.95, 0.95, 1.0]
+    assert np.isnan(rates[6])
+    assert table.currencies == ['EUR', 'GBP', 'USD']
+
+
+def test_cross_rates_go_through_the_base():
+    table = RateTable(ROWS, base='USD')
+    days = [datetime(2025, 1, 3)] * 4
+    converted = table.to_reporting([90.0, 80.0, 100.0, 5.0], ['EUR', ' gbp ', 'USD', 'JPY'], days, reporting='GBP')
+    assert converted[:3].tolist() == pytest.approx([80.0, 80.0, 80.0])
+    assert np.isnan(converted[3])
+
+
+def test_rows_without_a_rate_keep_amount_base_empty(tmp_path, monkeypatch):
+    path = tmp_path / 'fx_rates.csv'
+    path.write_text('date,currency,rate\n' + ''.join(f'{day},{currency},{rate}\n' for day, currency, rate in ROWS))
+    monkeypatch.setattr(fx_service, 'FX_RATES_PATH', str(path))
+    monkeypatch.setattr(fx_service, '_table', None)
+    docs = [
+        {'amount': 90.0, 'currency': 'EUR', 'revenue_date': datetime(2025, 1, 7)},
+        {'amount': 10.0, 'currency': 'USD', 'revenue_date': datetime(2025, 1, 7)},
+        {'amount': 500.0, 'currency': 'JPY', 'revenue_date': datetime(2025, 1, 7)},
+    ]
+    # The reporting currency is the file's base (USD) by default
+    assert apply_amount_base(docs) == 1
+    assert [doc['amount_base'] for doc in docs] == pytest.approx([90.0 / 0.95, 10.0, None])
+    # ... and such rows count at face value
+    assert base_amount(docs[2]) == 500.0
@@ -0,0 +1,40 @@
+"""Holt-Winters fit and projection on series with a known weekly pattern."""
+import numpy as np
+import pytest
+
+from services import holt_winters
+from services.holt_winters import fit, project
+
+PATTERN = np.array([0.0, 10.0, 20.0, 30.0, -10.0, -20.0, -30.0])
+
+
+def series(rows: int = 3, days: int = 140, noise: float = 1.0):
+    rng = np.random.default_rng(3)
+    levels = np.linspace(100, 300, rows)[:, None]
+    return levels + PATTERN[np.arange(days) % 7] + rng.normal(0, noise, (rows, days))
+
+
+def test_projection_follows_level_and_season():
+    values = series()
+    state = fit(values)
+    projected = project(state, 14, z=1.645)
+
+    expected = values[:, -70:].mean(axis=1)[:, None] + PATTERN[(values.shape[1] + np.arange(14)) % 7]
+    assert projected['mean'] == pytest.approx(expected, rel=0.05)
+    assert (projected['lower'] <= projected['mean']).all() and (projected['mean'] <= projected['upper']).all()
+    # Intervals widen with the horizon
+    assert (np.diff(projected['upper'] - projected['lower'], axis=1) >= 0).all()
+    assert projected['total'] == pytest.approx(np.cumsum(projected['mean'], axis=1))
+    assert (projected['total_lower'] <= projected['total']).all()
+    assert (projected['total'] <= projected['total_upper']).all()
+    assert state['sigma'] == pytest.approx(1.0, rel=0.5)
+
+
+def test_blocks_fit_like_one_pass(monkeypatch):
+    values = series(rows=7, noise=5.0)
+    whole = fit(values)
+    monkeypatch.setattr(holt_winters, 'FIT_BLOCK_ROWS', 3)
+    blocked = fit(values)
+    assert blocked['days'] == whole['days']
+    for key in ('level', 'trend', 'season', 'alpha', 'beta', 'gamma', 'sigma'):
+        assert np.array_equal(blocked[key], whole[key]), key
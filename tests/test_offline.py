@@ -0,0 +1,88 @@
+"""Offline analysis of an export: chunking and workers don't change the report, and both output formats."""
+import asyncio
+import csv
+import json
+
+import pytest
+
+from services import offline_service
+from services.import_service import map_columns
+
+END = '2025-06-30T23:59:59+00:00'
+FIELDS = ['order_id', 'user_id', 'product_id', 'amount', 'currency', 'status', 'channel', 'region',
+          'created_at', 'paid_at', 'refunded', 'attribution_campaign']
+
+
+def assert_close(ours, theirs, where=()):
+    """Equal reports up to float summation order (a rounded figure may then differ by a cent)."""
+    if isinstance(theirs, dict):
+        assert set(ours) == set(theirs), where
+        for key in theirs:
+            assert_close(ours[key], theirs[key], where + (key,))
+    elif isinstance(theirs, list):
+        assert len(ours) == len(theirs), where
+        for index, (a, b) in enumerate(zip(ours, theirs)):
+            assert_close(a, b, where + (index,))
+    elif isinstance(theirs, float):
+        assert ours == pytest.approx(theirs, abs=0.011), where
+    else:
+        assert ours == theirs, where
+
+
+@pytest.fixture
+def export(tmp_path, generated):
+    """A CSV export of generated transactions, and the number of rows in it."""
+    docs = generated(rows=3_000)
+    path = tmp_path / 'export.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows({**doc, 'paid_at': doc['paid_at'] or ''} for doc in docs)
+    return path, len(docs)
+
+
+def test_chunks_and_workers_match_one_pass(export):
+    path, rows = export
+    # One chunk folded directly, without merge_offline
+    [frame] = offline_service.read_chunks(path, rows)
+    columns = map_columns(list(frame.columns))
+    whole, whole_counts = offline_service.fold_chunk(frame, columns, 2, None, END)
+    whole_counts['files'] = 1
+    chunked, chunked_counts = offline_service.fold_files([path], None, END, workers=2, chunk_rows=250)
+    assert chunked_counts == whole_counts
+    assert whole_counts['rows'] == rows
+    assert sum(day['orders'] for day in whole['days'].values())
+    assert_close(chunked, whole)
+
+    one_pass = asyncio.run(offline_service.analyze([str(path)], None, END, workers=1, chunk_rows=rows))
+    merged = asyncio.run(offline_service.analyze([str(path.parent)], None, END, workers=2, chunk_rows=250))
+    assert_close(merged, one_pass)
+
+
+def test_write_report(export, tmp_path):
+    path, rows = export
+    report = asyncio.run(offline_service.analyze([str(path)], '2025-05-01', END, workers=1))
+
+    offline_service.write_report(report, 'json', tmp_path / 'report.json')
+    assert json.loads((tmp_path / 'report.json').read_text()) == json.loads(json.dumps(report, default=str))
+
+    out = tmp_path / 'report'
+    offline_service.write_report(report, 'csv', out)
+    assert sorted(p.name for p in out.iterdir()) == ['anomalies.csv', 'daily.csv', 'products.csv', 'summary.csv']
+
+    def read(name):
+        with open(out / f'{name}.csv', newline='') as f:
+            return list(csv.DictReader(f))
+
+    [summary] = read('summary')
+    assert summary['start'] == '2025-05-01' and summary['end'] == END and int(summary['rows']) == rows
+    daily = read('daily')
+    assert [row['day'] for row in daily] == [row['day'] for row in report['daily']]
+    assert sum(float(row['revenue']) for row in daily) == pytest.approx(sum(row['revenue'] for row in report['daily']))
+    assert [row['product_id'] for row in read('products')] == [row['product_id'] for row in report['products']]
+    assert len(read('anomalies')) == len(report['anomalies'])
+
+    with pytest.raises(offline_service.OfflineError):
+        offline_service.write_report(report, 'csv')
+    with pytest.raises(offline_service.OfflineError):
+        offline_service.write_report(report, 'xml', out)
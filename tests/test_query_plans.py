@@ -0,0 +1,49 @@
+"""Every query shape the services declare is served by an index (needs MongoDB, see conftest)."""
+import asyncio
+
+from generate_data import TransactionGenerator
+from services.analytics_service import AnalyticsService
+from services.index_service import IndexService, _plan_stages
+from services.storage_service import StorageService, add_meta, transactions_collection
+
+ROWS = 5_000
+
+
+async def load_generated(db, rows: int = ROWS, seed: int = 7) -> None:
+    """Generated rows in the transactions collection (active layout), with the declared indexes."""
+    await StorageService(db).ensure_collection()
+    generator = TransactionGenerator(rows, seed=seed, days=120, products=200)
+    for chunk in generator.chunks():
+        await transactions_collection(db).insert_many([add_meta(doc) for doc in generator.documents(chunk)])
+    await IndexService(db).ensure_indexes()
+
+
+def test_no_query_shape_scans_the_collection(motor_db):
+    async def main():
+        db = motor_db()
+        await load_generated(db)
+        # min_docs=0: the planner only falls back to COLLSCAN when no index applies, whatever the size
+        report = await IndexService(db).verify_query_plans(min_docs=0, strict=True)
+        verified = {row['name'] for row in report if row['service'] == 'AnalyticsService'}
+        assert {shape['name'] for shape in AnalyticsService(db).query_shapes()} <= verified
+
+    asyncio.run(main())
+
+
+def test_search_shapes_return_rows_in_index_order(motor_db):
+    async def main():
+        db = motor_db()
+        await load_generated(db)
+        indexes = IndexService(db)
+        searches = [shape for shape in AnalyticsService(db).query_shapes() if shape['name'].startswith('search_')]
+        for shape in searches:
+            stages = set(_plan_stages(await indexes.explain(shape)))
+            assert 'IXSCAN' in stages and 'COLLSCAN' not in stages, (shape['name'], stages)
+            if shape['kind'] == 'find' and not shape['bounded_sort']:
+                # The walk stops after `limit` matches only if nothing sorts them
+                assert 'SORT' not in stages, (shape['name'], stages)
+        # Every in-memory sort is preceded by a count bounding it
+        names = {shape['name'] for shape in searches}
+        assert all(f"{shape['name']}_bound" in names for shape in searches if shape.get('bounded_sort'))
+
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+"""Search cursors round-trip the last row's sort key and _id; every planned index is declared."""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from services.analytics_service import AnalyticsService
+
+
+@pytest.mark.parametrize('value, last_id', [
+    (datetime(2025, 6, 30, 23, 59, 59, 999000), ObjectId()),
+    (149.99, ObjectId()),
+    (0, 'imported-17'),
+    (None, ObjectId()),
+])
+def test_cursor_round_trip(value, last_id):
+    analytics = AnalyticsService(None)
+    decoded = analytics._decode_cursor(analytics._encode_cursor(value, last_id))
+    assert decoded == (value, last_id)
+    assert type(decoded[0]) is type(value) and type(decoded[1]) is type(last_id)
+
+
+@pytest.mark.parametrize('cursor', ['zz', 'bm90IGpzb24=', 'eyJ2IjogMX0='])
+def test_bad_cursor_is_a_value_error(cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        AnalyticsService(None)._decode_cursor(cursor)
+
+
+def test_search_shapes_use_declared_indexes():
+    analytics = AnalyticsService(None)
+    for shape in analytics.query_shapes():
+        if shape['name'].startswith('search_'):
+            assert shape['hint'] in AnalyticsService.INDEXES, shape['name']
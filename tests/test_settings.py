@@ -0,0 +1,71 @@
+"""Settings in backend/.env reach the modules that read them on import (server.py loads it first)."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+
+# Imports the app with load_dotenv pointed at the given file, then prints module attributes (dotted paths)
+SCRIPT = '''
+import functools, json, sys
+import dotenv
+load_dotenv = dotenv.load_dotenv
+dotenv.load_dotenv = lambda *args, **kwargs: load_dotenv(sys.argv[1], **kwargs)
+import importlib
+import server
+module = importlib.import_module(sys.argv[2])
+print(json.dumps({name: functools.reduce(getattr, name.split('.'), module) for name in sys.argv[3:]}, default=str))
+'''
+
+# (module, .env values, attributes they must set)
+CASES = [
+    ('profiling', {'PROFILING_ENABLED': '1', 'PROFILING_TOKEN': 's3cret', 'PROFILING_MODE': 'sampling'},
+     {'PROFILING_ENABLED': True, 'PROFILING_TOKEN': 's3cret', 'PROFILING_MODE': 'sampling'}),
+    ('services.storage_service', {'TRANSACTIONS_STORAGE': 'timeseries', 'TIMESERIES_COLLECTION': 'tx_ts'},
+     {'TRANSACTIONS_STORAGE': 'timeseries', 'TIMESERIES_COLLECTION': 'tx_ts'}),
+    # The app's services use that layout
+    ('server', {'TRANSACTIONS_STORAGE': 'timeseries', 'TIMESERIES_COLLECTION': 'tx_ts'},
+     {'storage_service.storage': 'timeseries', 'index_service.collection.name': 'tx_ts',
+      'analytics_service.collection.name': 'tx_ts'}),
+    ('services.ingest_service',
+     {'INGEST_ACK': 'durable', 'INGEST_BATCH_SIZE': '64', 'INGEST_FLUSH_MS': '5', 'INGEST_MAX_PENDING': '1000'},
+     {'INGEST_ACK': 'durable', 'INGEST_BATCH_SIZE': 64, 'INGEST_FLUSH_MS': 5.0, 'INGEST_MAX_PENDING': 1000}),
+    ('services.archive_service', {'ARCHIVE_SINK': 'parquet', 'ARCHIVE_DIR': '/tmp/cold', 'ARCHIVE_AFTER_DAYS': '400'},
+     {'ARCHIVE_SINK': 'parquet', 'ARCHIVE_DIR': '/tmp/cold', 'ARCHIVE_AFTER_DAYS': 400}),
+    ('services.fx_service', {'REPORTING_CURRENCY': 'eur', 'FX_RATES_PATH': '/tmp/rates.csv'},
+     {'REPORTING_CURRENCY': 'EUR', 'FX_RATES_BASE': 'EUR', 'FX_RATES_PATH': '/tmp/rates.csv'}),
+    ('services.anomaly_service',
+     {'ANOMALY_BASELINE': 'ewma', 'ANOMALY_WINDOW_DAYS': '14', 'ANOMALY_EWMA_ALPHA': '0.2',
+      'ANOMALY_SEASONAL_WEEKS': '6', 'ANOMALY_Z_THRESHOLD': '3'},
+     {'ANOMALY_BASELINE': 'ewma', 'ANOMALY_WINDOW_DAYS': 14, 'ANOMALY_EWMA_ALPHA': 0.2,
+      'ANOMALY_SEASONAL_WEEKS': 6, 'ANOMALY_Z_THRESHOLD': 3.0}),
+    ('services.live_service',
+     {'LIVE_POLL_SECONDS': '0.5', 'LIVE_HEARTBEAT_SECONDS': '10', 'LIVE_MIN_INTERVAL_SECONDS': '3',
+      'LIVE_MAX_CONNECTIONS': '200'},
+     {'LIVE_POLL_SECONDS': 0.5, 'LIVE_HEARTBEAT_SECONDS': 10.0, 'LIVE_MIN_INTERVAL_SECONDS': 3.0,
+      'LIVE_MAX_CONNECTIONS': 200}),
+    ('services.version_service', {'DATASET_VERSION_TTL_SECONDS': '5'}, {'DATASET_VERSION_TTL_SECONDS': 5.0}),
+    ('http_cache', {'ETAG_TIME_BUCKET_SECONDS': '300', 'GZIP_MINIMUM_SIZE': '4096'},
+     {'ETAG_TIME_BUCKET_SECONDS': 300, 'GZIP_MINIMUM_SIZE': 4096}),
+    ('services.analytics_service', {'SUMMARY_CACHE_TTL_SECONDS': '15'}, {'SUMMARY_CACHE_TTL_SECONDS': 15.0}),
+    ('services.forecast_service', {'FORECAST_HISTORY_DAYS': '730'}, {'FORECAST_HISTORY_DAYS': 730}),
+]
+
+
+@pytest.mark.parametrize('module, values, expected', CASES, ids=[f'{case[0]}-{i}' for i, case in enumerate(CASES)])
+def test_env_file_settings_are_honored(tmp_path, module, values, expected):
+    env_file = tmp_path / '.env'
+    settings = {'MONGO_URL': 'mongodb://localhost:1', 'DB_NAME': 'settings_test', **values}
+    env_file.write_text(''.join(f'{key}={value}\n' for key, value in settings.items()))
+    # load_dotenv doesn't override variables already set
+    env = {key: value for key, value in os.environ.items() if key not in settings}
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT, str(env_file), module, *expected],
+        cwd=BACKEND, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == expected
@@ -0,0 +1,42 @@
+"""Shared-state entries map back to the tree that was written, arrays included."""
+import numpy as np
+import pytest
+
+from services.shared_state_service import SharedStateError, map_entry, write_entry
+
+
+def test_write_then_map(tmp_path):
+    path = tmp_path / 'forecast.state'
+    tree = {
+        'state': {'level': np.linspace(0, 1, 5), 'season': np.arange(35, dtype=np.float32).reshape(5, 7),
+                  'days': 365},
+        'products': ['SKU-1', None, 'SKU-3'],
+        'orders': np.int64(3),
+        'empty': np.zeros((0, 4), dtype=np.int64),
+    }
+    size = write_entry(path, [12, '2025-06-30'], tree)
+    assert size == path.stat().st_size
+
+    header, mapped = map_entry(path)
+    assert header['key'] == [12, '2025-06-30'] and header['size'] == size
+    assert mapped['products'] == ['SKU-1', None, 'SKU-3'] and mapped['orders'] == 3
+    assert mapped['state']['days'] == 365
+    for ours, theirs in ((mapped['state']['level'], tree['state']['level']),
+                         (mapped['state']['season'], tree['state']['season']),
+                         (mapped['empty'], tree['empty'])):
+        assert ours.dtype == theirs.dtype and ours.shape == theirs.shape
+        assert np.array_equal(ours, theirs)
+    # Views of the read-only mapping
+    assert not mapped['state']['level'].flags.writeable
+
+
+def test_object_arrays_are_rejected(tmp_path):
+    with pytest.raises(SharedStateError):
+        write_entry(tmp_path / 'bad.state', [1], {'ids': np.array(['a', None], dtype=object)})
+
+
+def test_other_files_are_not_entries(tmp_path):
+    path = tmp_path / 'notes.state'
+    path.write_bytes(b'not a shared-state entry')
+    with pytest.raises(SharedStateError):
+        map_entry(path)
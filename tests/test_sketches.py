@@ -0,0 +1,56 @@
+"""DaySketch merges exactly and stays within its stated error bounds."""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from services.analytics_service import REVENUE_STATUSES
+from services.fx_service import base_amount
+from services.sketch_service import ANY, HLL_ERROR, VALUE_ACCURACY, _summary
+from services.sketches import DaySketch, sketch_rows
+
+
+def assert_same_sketch(ours, theirs):
+    assert (ours.orders, ours.zeros) == (theirs.orders, theirs.zeros)
+    assert np.array_equal(ours.registers, theirs.registers)
+    assert np.array_equal(ours.keys, theirs.keys) and np.array_equal(ours.counts, theirs.counts)
+
+
+def test_merge_equals_one_sketch_of_all_rows(generated):
+    docs = generated(rows=3_000)
+    whole = sketch_rows(docs)
+    parts = [sketch_rows(docs[i::3]) for i in range(3)]
+    for key, sketch in whole.items():
+        assert_same_sketch(DaySketch.merged(part[key] for part in parts if key in part), sketch)
+        # Stored documents come back unchanged (a day's registers are stored sparse)
+        assert_same_sketch(DaySketch.from_doc(sketch.to_doc()), sketch)
+
+
+def test_estimates_within_error_bounds(generated):
+    docs = generated(rows=20_000)
+    revenue = [doc for doc in docs if doc['status'] in REVENUE_STATUSES]
+    merged = DaySketch.merged(sketch for (_, product, channel), sketch in sketch_rows(docs).items()
+                              if product == ANY and channel == ANY)
+    assert merged.orders == len(revenue)
+    # ... and thousands of users' registers dense
+    assert_same_sketch(DaySketch.from_doc(merged.to_doc()), merged)
+
+    users = len({doc['user_id'] for doc in revenue})
+    # Four standard errors
+    assert abs(merged.distinct() - users) <= 4 * HLL_ERROR * users
+
+    values = np.array([base_amount(doc) for doc in revenue])
+    qs = (0.01, 0.25, 0.5, 0.9, 0.99)
+    for estimate, exact in zip(merged.quantiles(qs), np.quantile(values, qs, method='lower')):
+        # Plus the estimate's rounding to cents
+        assert estimate == pytest.approx(exact, rel=VALUE_ACCURACY, abs=0.005)
+
+
+def test_unique_users_never_exceed_orders():
+    # Two orders of two users: small counts are where the estimate can overshoot
+    sketch = sketch_rows([
+        {'status': 'completed', 'revenue_date': datetime(2025, 6, 1), 'user_id': user, 'amount': 10.0,
+         'product_id': 'P', 'channel': 'web'}
+        for user in ('a', 'b')
+    ])[('2025-06-01', ANY, ANY)]
+    assert _summary(sketch)['unique_users'] <= sketch.orders == 2
@@ -0,0 +1,93 @@
+"""Calendar buckets and their labels in non-UTC timezones, across DST changes."""
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from services.time_buckets import bucket_labels, bucket_range, bucket_starts, localize
+
+NEW_YORK = 'America/New_York'
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def instants(*values):
+    return pd.DatetimeIndex([pd.Timestamp(value) for value in values])
+
+
+def test_hours_across_spring_forward():
+    # 2025-03-09 02:00 EST jumps to 03:00 EDT: no 02:00 bucket
+    buckets = bucket_range(utc(2025, 3, 9, 4, 30), utc(2025, 3, 9, 8, 0), 'hour', NEW_YORK)
+    assert bucket_labels(buckets, 'hour') == [
+        '2025-03-08T23:00:00-05:00',
+        '2025-03-09T00:00:00-05:00',
+        '2025-03-09T01:00:00-05:00',
+        '2025-03-09T03:00:00-04:00',
+        '2025-03-09T04:00:00-04:00',
+    ]
+
+
+def test_hours_across_fall_back():
+    # 2025-11-02 01:00-02:00 happens twice, once per offset
+    buckets = bucket_range(utc(2025, 11, 2, 5, 0), utc(2025, 11, 2, 6, 30), 'hour', NEW_YORK)
+    assert bucket_labels(buckets, 'hour') == ['2025-11-02T01:00:00-04:00', '2025-11-02T01:00:00-05:00']
+    starts = bucket_starts(instants('2025-11-02T05:59:59Z', '2025-11-02T06:00:00Z'), 'hour', NEW_YORK)
+    assert list(starts.tz_convert('UTC')) == list(buckets.tz_convert('UTC'))
+
+
+def test_hours_in_half_hour_zone():
+    # 15:40 IST starts at 15:00 IST, i.e. 09:30 UTC
+    start = bucket_starts(instants('2025-01-15T10:10:00Z'), 'hour', 'Asia/Kolkata')[0]
+    assert start == pd.Timestamp('2025-01-15T09:30:00Z')
+
+
+def test_days_start_at_local_midnight_across_fall_back():
+    buckets = bucket_range(utc(2025, 11, 1, 12), utc(2025, 11, 3, 12), 'day', NEW_YORK)
+    assert bucket_labels(buckets, 'day') == ['2025-11-01', '2025-11-02', '2025-11-03']
+    assert list(buckets.tz_convert('UTC')) == [
+        pd.Timestamp('2025-11-01T04:00:00Z'), pd.Timestamp('2025-11-02T04:00:00Z'), pd.Timestamp('2025-11-03T05:00:00Z'),
+    ]
+    # 23:30 local on the 25-hour day still belongs to it
+    start = bucket_starts(instants('2025-11-03T04:30:00Z'), 'day', NEW_YORK)[0]
+    assert start == pd.Timestamp('2025-11-02T04:00:00Z')
+
+
+def test_weeks_start_on_monday():
+    # Sunday 2025-03-09 (the DST change) is in the week of Monday 03-03
+    start = bucket_starts(instants('2025-03-09T12:00:00Z'), 'week', NEW_YORK)[0]
+    assert start == pd.Timestamp('2025-03-03T05:00:00Z')
+    buckets = bucket_range(utc(2025, 3, 1, 12), utc(2025, 3, 20, 12), 'week', NEW_YORK)
+    assert bucket_labels(buckets, 'week') == ['2025-02-24', '2025-03-03', '2025-03-10', '2025-03-17']
+    assert [bucket.utcoffset().total_seconds() / 3600 for bucket in buckets] == [-5, -5, -4, -4]
+
+
+def test_months_by_local_calendar():
+    # 23:00 local on March 31st is still March in New York (April 1st in UTC)
+    start = bucket_starts(instants('2025-04-01T03:00:00Z'), 'month', NEW_YORK)[0]
+    assert start == pd.Timestamp('2025-03-01T05:00:00Z')
+    buckets = bucket_range(utc(2025, 2, 15), utc(2025, 4, 15), 'month', NEW_YORK)
+    assert bucket_labels(buckets, 'month') == ['2025-02-01', '2025-03-01', '2025-04-01']
+    assert buckets[-1] == pd.Timestamp('2025-04-01T04:00:00Z')
+
+
+def test_localize_skipped_and_repeated_midnights():
+    # Santiago skips 2024-09-08 00:00 (clocks go to 01:00); New York repeats 2025-11-02 01:00
+    skipped = localize(pd.DatetimeIndex(['2024-09-08']), 'America/Santiago')[0]
+    assert skipped.isoformat() == '2024-09-08T01:00:00-03:00'
+    repeated = localize(pd.DatetimeIndex(['2025-11-02 01:00']), NEW_YORK)[0]
+    assert repeated == pd.Timestamp('2025-11-02T05:00:00Z')
+    buckets = bucket_range(utc(2024, 9, 7, 12), utc(2024, 9, 9, 12), 'day', 'America/Santiago')
+    assert bucket_labels(buckets, 'day') == ['2024-09-07', '2024-09-08', '2024-09-09']
+
+
+@pytest.mark.parametrize('granularity', ['hour', 'day', 'week', 'month'])
+def test_range_has_every_bucket_once(granularity):
+    # Every 15 minutes through both 2025 DST changes lands in exactly the buckets of the range, none skipped
+    since, until = utc(2025, 2, 20), utc(2025, 11, 20)
+    buckets = bucket_range(since, until, granularity, NEW_YORK)
+    assert buckets.is_monotonic_increasing and buckets.is_unique
+    assert bucket_starts(buckets, granularity, NEW_YORK).equals(buckets)
+    samples = pd.date_range(since, until, freq='15min')
+    assert bucket_starts(samples, granularity, NEW_YORK).unique().equals(buckets)